@@ -0,0 +1,64 @@
+"""
+میکروبنچمارک تبدیل تاریخ شمسی:
+مقایسه پیاده‌سازی قبلی (jdatetime برای هر مقدار) با مسیر سریع to_jalali_tehran.
+
+اجرا:
+    python -m Benchmark.bench_jalali --count 100000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import jdatetime
+
+from utils.base_model import to_jalali_tehran
+
+
+def legacy_to_jalali_tehran(dt: datetime | None) -> str:
+    """پیاده‌سازی قبلی TimestampMixin._to_jalali_tehran (مرجع صحت و سرعت)"""
+    if not dt:
+        return "-"
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+
+    tehran_tz = timezone(timedelta(hours=3, minutes=30))
+    dt_tehran = dt.astimezone(tehran_tz)
+    jdt = jdatetime.datetime.fromgregorian(datetime=dt_tehran)
+    return jdt.strftime("%Y/%m/%d %H:%M")
+
+
+def sample_timestamps(count: int, days: int, seed: int = 1) -> list:
+    # توزیع شبیه داده واقعی: رکوردهای ساخته شده در چند سال اخیر
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc) - timedelta(days=days)
+    return [start + timedelta(seconds=rng.randrange(days * 86400)) for _ in range(count)]
+
+
+def measure(func, values) -> float:
+    start = time.perf_counter()
+    for value in values:
+        func(value)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jalali formatting micro-benchmark")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=3 * 365, help="spread of the sample timestamps")
+    args = parser.parse_args()
+
+    values = sample_timestamps(args.count, args.days)
+    mismatches = sum(legacy_to_jalali_tehran(v) != to_jalali_tehran(v) for v in values)
+
+    legacy = measure(legacy_to_jalali_tehran, values)
+    fast = measure(to_jalali_tehran, values)
+
+    print(f"timestamps: {args.count} (spread over {args.days} days), mismatches: {mismatches}")
+    print(f"legacy: {legacy:.3f}s  ({legacy / args.count * 1e6:.2f} us/op)")
+    print(f"fast:   {fast:.3f}s  ({fast / args.count * 1e6:.2f} us/op)")
+    print(f"speedup: {legacy / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+میکروبنچمارک سریالایز پاسخ‌ها:
+مقایسه مسیر فعلی (ساخت مدل Pydantic برای هر ردیف + json.dumps)، dump_json خود Pydantic
+و سریالایزر سریع (utils.fast_json) روی آبجکت‌های ORM دانش‌آموز، والد و کلاس.
+
+اجرا:
+    python -m Benchmark.bench_serializer --rows 10000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+
+import main  # noqa: F401  (ثبت همه مدل‌ها قبل از ساخت آبجکت‌های ORM)
+from Class.model import Class
+from Class.serializer.ClassSchema import ClassResponse
+from Parent.model import Parent
+from Parent.serializer.ParentSchema import ParentResponse
+from Student.model import Student
+from Student.serializer.StudentSchema import StudentResponse
+from utils.fast_json import fast_encoder, fast_render, pydantic_render
+
+
+def sample_objects(rows: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def stamp():
+        return start + timedelta(seconds=rng.randrange(3 * 365 * 86400), microseconds=rng.randrange(10 ** 6))
+
+    common = lambda i: dict(id=i, is_active=True, is_deleted=False, created_at=stamp(), updated_at=stamp())
+    classes = [Class(name=f"کلاس {i}", teacher_name=f"معلم {i}", **common(i)) for i in range(1, 51)]
+    parents = [Parent(name=f"والد {i}", phone_number=f"09{i:09d}", **common(i)) for i in range(1, rows // 2 + 2)]
+    students = [
+        Student(name=f"دانش‌آموز {i}", age=rng.randint(6, 18), grade=rng.randint(1, 12),
+                parent=rng.choice(parents), class_=rng.choice(classes), **common(i))
+        for i in range(1, rows + 1)
+    ]
+    return students, parents, classes
+
+
+def pydantic_dump_json(adapter, items):
+    return adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+
+
+def measure(func, adapter, items, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(adapter, items)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main_():
+    parser = argparse.ArgumentParser(description="Response serialization micro-benchmark")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs")
+    args = parser.parse_args()
+
+    students, parents, classes = sample_objects(args.rows)
+    cases = [
+        ("students", TypeAdapter(List[StudentResponse]), students),
+        ("parents", TypeAdapter(List[ParentResponse]), parents),
+        ("classes", TypeAdapter(List[ClassResponse]), classes),
+    ]
+    paths = [
+        ("pydantic (current)", lambda adapter, items: pydantic_render(adapter, items)[1]),
+        ("pydantic dump_json", pydantic_dump_json),
+        ("fast", lambda adapter, items: fast_render(adapter, items)[1]),
+    ]
+
+    for name, adapter, items in cases:
+        assert fast_encoder(adapter) is not None, f"{name}: fast path not available"
+        reference = pydantic_render(adapter, items)[1]
+        print(f"{name}: {len(items)} rows, {len(reference) / 1024:.0f} KiB")
+        baseline = None
+        for label, func in paths:
+            identical = func(adapter, items) == reference
+            elapsed = measure(func, adapter, items, args.repeat)
+            baseline = baseline or elapsed
+            print(f"  {label:20} {elapsed * 1000:8.1f} ms  {elapsed / len(items) * 1e6:6.2f} us/row  "
+                  f"{baseline / elapsed:4.1f}x  identical={identical}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -1,46 +1,211 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select, update
 from typing import List
 from ..model import Class
 from Student.model import Student
-from ..serializer.ClassSchema import ClassCreate, ClassUpdate, ClassResponse
-from Database.database import get_db
+from ..serializer.ClassSchema import ClassCreate, ClassUpdate, ClassResponse, ClassBatchUpdate
+from Database.database import get_db, get_read_db
 from sqlalchemy.orm import selectinload
+from utils.pagination import PageParams, paginate
+from utils.fields import FieldSelection, Projection
+from utils.filters import StatusFilter
+from utils.export import ExportFormat, export_response
+from utils.cache import list_tag, response_cache, tags_for
+from utils.batch import (
+    BATCH_REQUEST_BODY, BatchDelete, BatchItemResult, batch_soft_delete, chunked, existing_ids,
+    null_required_fields, read_batch_items, resume_items, validate_items,
+)
+from Jobs.runner import JOBS_BATCH_THRESHOLD, JOBS_EXPORT_THRESHOLD, JobContext, accepted, exceeds, job_runner
+from Jobs.tasks import cascade_is_large, export_to_file, import_items
 
 router = APIRouter(prefix="/classes", tags=["classes"])
 
+# students فقط در صورت درخواست (یا بدون fields/include) لود می‌شود
+CLASS_PROJECTION = Projection(Class, ClassResponse, {"students": selectinload})
+
+
+async def get_class_with_students(db: AsyncSession, class_id: int):
+    """
+    کلاس را به همراه لیست دانش‌آموزانش لود می‌کند تا پاسخ بعد از عملیات نوشتن
+    بدون Lazy Load (و خطای MissingGreenlet) سریالایز شود.
+    """
+    result = await db.execute(
+        select(Class)
+        .options(selectinload(Class.students))
+        .where(Class.id == class_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
 
 @router.post("/", response_model=ClassResponse, status_code=201)
 async def create_class(payload: ClassCreate, db: AsyncSession = Depends(get_db)):
     db_class = Class(**payload.model_dump())
     db.add(db_class)
     await db.commit()
-    await db.refresh(db_class)
-    return db_class
+    await response_cache.invalidate(list_tag(Class))
+    return await get_class_with_students(db, db_class.id)
 
 
 @router.get("/", response_model=List[ClassResponse])
-async def get_classes(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Class)
-        .options(selectinload(Class.students))
-        .order_by(Class.id.desc())
+async def get_classes(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        filters: StatusFilter = Depends(),
+        selection: FieldSelection = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+):
+    fields = CLASS_PROJECTION.select(selection)
+
+    stmt = filters.apply(select(Class), Class)
+
+    async def load():
+        return await paginate(db, stmt.options(*CLASS_PROJECTION.options(fields)), Class.id, page, response)
+
+    async def version():
+        return await CLASS_PROJECTION.version(fields).page(db, stmt, page)
+
+    return await response_cache.serve(
+        request, response, CLASS_PROJECTION.adapter(fields, many=True), load, version=version
     )
-    return result.scalars().all()
+
+
+def export_statement(filters: StatusFilter):
+    stmt = select(
+        Class.id, Class.name, Class.teacher_name, Class.is_active, Class.is_deleted,
+        Class.created_at, Class.updated_at, Class.deleted_at,
+    ).order_by(Class.id)
+    return filters.apply(stmt, Class)
+
+
+@router.get("/export")
+async def export_classes(
+        fmt: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+        filters: StatusFilter = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+        write_db: AsyncSession = Depends(get_db),
+):
+    """
+    خروجی استریم کامل (NDJSON یا CSV) بدون بارگذاری همه ردیف‌ها در حافظه.
+    بیش از JOBS_EXPORT_THRESHOLD ردیف در کار پس‌زمینه در فایل نوشته می‌شود.
+    """
+    stmt = export_statement(filters)
+    if await exceeds(db, stmt, JOBS_EXPORT_THRESHOLD):
+        job = await job_runner.enqueue(write_db, "classes.export", {"format": fmt.value, "filters": vars(filters)})
+        return accepted(job)
+    return export_response(db, stmt, fmt, "classes")
+
+
+@job_runner.handler("classes.export")
+async def export_classes_job(ctx: JobContext) -> dict:
+    return await export_to_file(ctx, export_statement(StatusFilter(**ctx.params["filters"])), "classes")
+
+
+async def import_classes(db: AsyncSession, items: list, progress=None, start: int = 0) -> list:
+    """ساخت گروهی کلاس‌ها با INSERT چند ردیفی؛ progress و start مثل import_students"""
+    results = [None] * len(items)
+    valid = resume_items(validate_items(items, ClassCreate, results), results, start)
+
+    for chunk in chunked(valid):
+        result = await db.execute(
+            insert(Class).returning(Class.id, sort_by_parameter_order=True),
+            [cls.model_dump() for _, cls in chunk],
+        )
+        for (index, _), new_id in zip(chunk, result.scalars().all()):
+            results[index] = BatchItemResult(index=index, status="created", id=new_id)
+        if progress is not None:
+            await progress(chunk[-1][0] + 1)
+        await db.commit()
+        await response_cache.invalidate(list_tag(Class))
+
+    return results
+
+
+@router.post("/batch", response_model=List[BatchItemResult], openapi_extra=BATCH_REQUEST_BODY)
+async def create_classes_batch(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    ساخت گروهی کلاس‌ها (آرایه JSON یا NDJSON).
+    بیش از JOBS_BATCH_THRESHOLD آیتم در کار پس‌زمینه اجرا می‌شود.
+    """
+    items = await read_batch_items(request)
+    if len(items) > JOBS_BATCH_THRESHOLD:
+        return accepted(await job_runner.enqueue(db, "classes.import", {"items": items}))
+    return await import_classes(db, items)
+
+
+@job_runner.handler("classes.import")
+async def import_classes_job(ctx: JobContext) -> list:
+    return await import_items(ctx, import_classes)
+
+
+@router.patch("/batch", response_model=List[BatchItemResult], openapi_extra=BATCH_REQUEST_BODY)
+async def update_classes_batch(request: Request, db: AsyncSession = Depends(get_db)):
+    """آپدیت جزئی گروهی کلاس‌ها با UPDATE دسته‌ای بر اساس کلید اصلی"""
+    items = await read_batch_items(request)
+    results = [None] * len(items)
+    valid = validate_items(items, ClassBatchUpdate, results)
+
+    for chunk in chunked(valid):
+        class_ids = await existing_ids(db, Class, (c.id for _, c in chunk))
+
+        params = []
+        for index, cls in chunk:
+            data = cls.model_dump(exclude_unset=True)
+            nulls = null_required_fields(data, ("name", "teacher_name"))
+            if cls.id not in class_ids:
+                error = "Class not found"
+            elif nulls:
+                error = f"Field '{nulls[0]}' cannot be null."
+            else:
+                error = None
+
+            if error:
+                results[index] = BatchItemResult(index=index, status="error", id=cls.id, detail=error)
+                continue
+            if len(data) > 1:
+                params.append(data)
+            results[index] = BatchItemResult(index=index, status="updated", id=cls.id)
+
+        if params:
+            await db.execute(update(Class), params)
+        await db.commit()
+        await response_cache.invalidate(list_tag(Class), *tags_for(Class, *(row["id"] for row in params)))
+
+    return results
+
+
+@router.post("/batch/delete", response_model=List[BatchItemResult])
+async def delete_classes_batch(payload: BatchDelete, db: AsyncSession = Depends(get_db)):
+    return await batch_soft_delete(db, Class, payload.ids, cascades=[(Student, Student.class_id)])
 
 
 @router.get("/{class_id}", response_model=ClassResponse)
-async def get_class(class_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Class)
-        .options(selectinload(Class.students))
-        .where(Class.id == class_id)
-    )
-    cls = result.scalar_one_or_none()
-    if not cls:
-        raise HTTPException(status_code=404, detail="Class not found")
-    return cls
+async def get_class(
+        class_id: int,
+        request: Request,
+        response: Response,
+        selection: FieldSelection = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+):
+    fields = CLASS_PROJECTION.select(selection)
+
+    async def load():
+        result = await db.execute(
+            select(Class)
+            .options(*CLASS_PROJECTION.options(fields))
+            .where(Class.id == class_id)
+        )
+        cls = result.scalar_one_or_none()
+        if not cls:
+            raise HTTPException(status_code=404, detail="Class not found")
+        return cls
+
+    async def version():
+        return await CLASS_PROJECTION.version(fields).item(db, class_id)
+
+    return await response_cache.serve(request, response, CLASS_PROJECTION.adapter(fields), load, version=version)
 
 
 @router.patch("/{class_id}", response_model=ClassResponse)
@@ -56,8 +221,8 @@ async def update_class_partial(class_id: int, payload: ClassUpdate, db: AsyncSes
         setattr(db_class, key, value)
 
     await db.commit()
-    await db.refresh(db_class)
-    return db_class
+    await response_cache.invalidate(list_tag(Class), *tags_for(Class, class_id))
+    return await get_class_with_students(db, class_id)
 
 
 @router.put("/{class_id}", response_model=ClassResponse)
@@ -79,30 +244,27 @@ async def update_class_full(class_id: int, payload: ClassUpdate, db: AsyncSessio
         setattr(db_class, key, value)
 
     await db.commit()
-    await db.refresh(db_class)
-    return db_class
+    await response_cache.invalidate(list_tag(Class), *tags_for(Class, class_id))
+    return await get_class_with_students(db, class_id)
 
 
 @router.delete("/{class_id}", status_code=204)
 async def soft_delete_class(class_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Class).where(Class.id == class_id, Class.is_deleted.is_(False))
-    )
-    cls = result.scalar_one_or_none()
+    # کلاس با دانش‌آموزان زیاد: حذف آبشاری در کار پس‌زمینه با chunkهای جدا (202)
+    if await cascade_is_large(db, "classes", class_id, deleted=False):
+        if not await existing_ids(db, Class, [class_id]):
+            raise HTTPException(status_code=404, detail="Class not found")
+        return accepted(await job_runner.enqueue(db, "cascade.delete", {"table": "classes", "id": class_id}))
 
-    if not cls:
+    if not await Class.bulk_soft_delete(db, Class.id == class_id):
         raise HTTPException(status_code=404, detail="Class not found")
 
-    await cls.soft_delete(db)
-
-    # Cascade Soft Delete
-    students_result = await db.execute(
-        select(Student).where(Student.class_id == class_id, Student.is_deleted.is_(False))
+    # Cascade Soft Delete (یک UPDATE برای همه دانش‌آموزان و یک تراکنش)
+    student_ids = await Student.bulk_soft_delete(db, Student.class_id == class_id)
+    await db.commit()
+    await response_cache.invalidate(
+        list_tag(Class), *tags_for(Class, class_id), list_tag(Student), *tags_for(Student, *student_ids)
     )
-    students = students_result.scalars().all()
-
-    for student in students:
-        await student.soft_delete(db)
 
     return None
 
@@ -110,29 +272,26 @@ async def soft_delete_class(class_id: int, db: AsyncSession = Depends(get_db)):
 @router.post("/{class_id}/restore", response_model=ClassResponse)
 async def restore_class(class_id: int, db: AsyncSession = Depends(get_db)):
     result = await db.execute(
-        select(Class)
-        .options(selectinload(Class.students))  # لود کردن برای پاسخ نهایی
-        .where(Class.id == class_id)
+        select(Class.is_deleted).where(Class.id == class_id)
     )
-    cls = result.scalar_one_or_none()
+    is_deleted = result.scalar_one_or_none()
 
-    if not cls:
+    if is_deleted is None:
         raise HTTPException(status_code=404, detail="Class not found")
 
-    if cls.is_deleted:
+    if is_deleted and await cascade_is_large(db, "classes", class_id, deleted=True):
+        return accepted(await job_runner.enqueue(db, "cascade.restore", {"table": "classes", "id": class_id}))
+
+    if is_deleted:
         # 1. بازیابی کلاس
-        await cls.restore(db)
+        await Class.bulk_restore(db, Class.id == class_id)
 
         # 2. بازیابی خودکار دانش‌آموزان زیرمجموعه (Cascading Restore)
-        students_result = await db.execute(
-            select(Student).where(Student.class_id == class_id, Student.is_deleted.is_(True))
-        )
-        deleted_students = students_result.scalars().all()
-
-        for student in deleted_students:
-            await student.restore(db)
+        student_ids = await Student.bulk_restore(db, Student.class_id == class_id)
 
         await db.commit()  # کامیت نهایی برای کلاس و همه دانش‌آموزان
-        await db.refresh(cls)
+        await response_cache.invalidate(
+            list_tag(Class), *tags_for(Class, class_id), list_tag(Student), *tags_for(Student, *student_ids)
+        )
 
-    return cls
+    return await get_class_with_students(db, class_id)
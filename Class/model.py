@@ -1,6 +1,7 @@
 from sqlalchemy import Column, String, Integer
 from sqlalchemy.orm import relationship
-from utils.base_model import TimestampMixin, SoftDeleteMixin
+from utils.base_model import TimestampMixin, SoftDeleteMixin, changed_at_index
+from utils.text_search import search_index
 from Database.database import Base
 
 
@@ -17,3 +18,10 @@ class Class(Base, TimestampMixin, SoftDeleteMixin):
         cascade="all, delete-orphan",
         passive_deletes=True,
     )
+
+
+# فید تغییرات /sync: WHERE (changed_at, id) > (:since, :id) ORDER BY changed_at, id
+changed_at_index(Class)
+
+# جستجوی /search روی کلمات نرمال شده (فقط PostgreSQL)
+search_index(Class, Class.name, Class.teacher_name)
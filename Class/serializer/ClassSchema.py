@@ -22,6 +22,11 @@ class ClassUpdate(BaseModel):
     teacher_name: Optional[str] = Field(None, min_length=3, max_length=100)
 
 
+# --- آیتم‌های درخواست batch آپدیت (شناسه + فیلدهای Update) ---
+class ClassBatchUpdate(ClassUpdate):
+    id: int
+
+
 # --- مدل ساده برای استفاده در داخل StudentResponse ---
 class ClassResponseSimple(BaseModel):
     id: int
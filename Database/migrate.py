@@ -0,0 +1,102 @@
+"""
+ساخت و به‌روزرسانی schema با alembic (منبع schema در production).
+
+دیتابیس‌هایی که قبلاً با create_all در lifespan برنامه ساخته شده‌اند جداول را دارند ولی جدول
+alembic_version ندارند، پس upgrade head از همان migration اول با «relation already exists» شکست می‌خورد.
+این دستور برای چنین دیتابیسی revision معادل schema موجود را از روی جداول و ایندکس‌های هر migration
+تشخیص می‌دهد، آن را stamp می‌کند و بعد migrationهای باقیمانده را اجرا می‌کند.
+روی دیتابیس خالی یا دیتابیسی که alembic_version دارد همان alembic upgrade head است.
+
+اجرا:
+    python -m Database.migrate
+    python -m Database.migrate --dry-run
+    DATABASE_URL=postgresql+asyncpg://... python -m Database.migrate
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from Database.database import DATABASE_URL
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# نشانه هر revision به ترتیب زنجیره: (revision, جدول, ایندکس یا None برای خود جدول)
+REVISION_MARKERS = [
+    ("c46db45642cf", "students", None),
+    ("5d2f8a9c1b7e", "students", "ix_students_class_id_not_deleted"),
+    ("8e4b7c2d9a13", "students", "ix_students_changed_at"),
+    ("b7a1e5f3c820", "students", "ix_students_search"),
+    ("d3f6a8b2c415", "jobs", None),
+]
+
+logger = logging.getLogger("school_api.migrate")
+
+
+def alembic_config(url: str = DATABASE_URL) -> Config:
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    # env.py این آدرس را بر DATABASE_URL ترجیح می‌دهد
+    config.attributes["database_url"] = url
+    return config
+
+
+def _existing_revision(sync_conn) -> tuple:
+    """(alembic_version وجود دارد؟، آخرین revision که همه نشانه‌هایش تا آن‌جا موجود است)"""
+    inspector = inspect(sync_conn)
+    if inspector.has_table("alembic_version"):
+        return True, None
+    revision = None
+    for candidate, table, index in REVISION_MARKERS:
+        if not inspector.has_table(table):
+            break
+        if index is not None and index not in {ix["name"] for ix in inspector.get_indexes(table)}:
+            break
+        revision = candidate
+    return False, revision
+
+
+async def detect_unversioned(url: str = DATABASE_URL) -> Optional[str]:
+    """revision قابل stamp برای دیتابیس ساخته شده با create_all؛ None برای دیتابیس خالی یا نسخه‌دار"""
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            versioned, revision = await conn.run_sync(_existing_revision)
+    finally:
+        await engine.dispose()
+    return None if versioned else revision
+
+
+def upgrade(url: str = DATABASE_URL, dry_run: bool = False):
+    """stamp دیتابیس‌های بدون نسخه و سپس upgrade head (در event loop جدا، پس نه از داخل async)"""
+    config = alembic_config(url)
+    revision = asyncio.run(detect_unversioned(url))
+    if revision is not None:
+        logger.warning("database has tables but no alembic_version; stamping %s", revision)
+        if not dry_run:
+            command.stamp(config, revision)
+    if dry_run:
+        logger.info("dry run: would run alembic upgrade head")
+        return
+    command.upgrade(config, "head")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Stamp databases created by create_all, then upgrade to head")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--dry-run", action="store_true", help="only report the revision that would be stamped")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    upgrade(args.database_url, args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from utils.config import env_bool, env_float, env_int
+
+# پروفایل کوئری‌ها اختیاری است (DB_PROFILE=true)
+DB_PROFILE = env_bool("DB_PROFILE", False)
+# کوئری‌های کندتر از این مقدار (میلی‌ثانیه) همراه با EXPLAIN لاگ می‌شوند
+DB_SLOW_QUERY_MS = env_float("DB_SLOW_QUERY_MS", 200.0)
+DB_EXPLAIN_SLOW = env_bool("DB_EXPLAIN_SLOW", True)
+# تعداد کندترین کوئری‌هایی که برای هر درخواست نگه داشته می‌شود
+DB_PROFILE_TOP_STATEMENTS = env_int("DB_PROFILE_TOP_STATEMENTS", 3)
+
+logger = logging.getLogger("school_api.db")
+
+
+class RequestProfile:
+    """آمار کوئری‌های یک درخواست HTTP (تعداد، زمان کل و کندترین دستورها)"""
+
+    def __init__(self, top: int = DB_PROFILE_TOP_STATEMENTS):
+        self.top = top
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = []  # [(elapsed, statement)] به ترتیب نزولی
+
+    def record(self, elapsed: float, statement: str):
+        self.queries += 1
+        self.db_time += elapsed
+        if len(self.slowest) < self.top or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.top:]
+
+
+# پروفایل درخواست جاری؛ توسط middleware مقداردهی می‌شود
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def explain_prefix(dialect_name: str) -> str:
+    return "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
+
+
+class QueryProfiler:
+    """
+    شمارش و زمان‌سنجی همه کوئری‌های engine با رویدادهای before/after_cursor_execute.
+    زمان هر کوئری به پروفایل درخواست جاری (contextvar) نسبت داده می‌شود.
+    """
+
+    def __init__(self, slow_threshold_ms: float = DB_SLOW_QUERY_MS, explain: bool = DB_EXPLAIN_SLOW):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.explain = explain
+        self.queries = 0
+        self.db_time = 0.0
+        self.slow_queries = 0
+        self.recent_slow = deque(maxlen=20)
+        self._engines = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._engines)
+
+    def install(self, engine):
+        sync_engine = getattr(engine, "sync_engine", engine)
+        if sync_engine in self._engines:
+            return
+        event.listen(sync_engine, "before_cursor_execute", self._before_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_execute)
+        self._engines.append(sync_engine)
+
+    def uninstall(self, engine):
+        sync_engine = getattr(engine, "sync_engine", engine)
+        if sync_engine not in self._engines:
+            return
+        event.remove(sync_engine, "before_cursor_execute", self._before_execute)
+        event.remove(sync_engine, "after_cursor_execute", self._after_execute)
+        self._engines.remove(sync_engine)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+
+        self.queries += 1
+        self.db_time += elapsed
+        profile = current_profile.get()
+        if profile is not None:
+            profile.record(elapsed, statement)
+
+        if elapsed * 1000 >= self.slow_threshold_ms:
+            self._log_slow(conn, statement, parameters, executemany, elapsed)
+
+    def _log_slow(self, conn, statement, parameters, executemany, elapsed):
+        self.slow_queries += 1
+        plan = None
+        if self.explain and not executemany and statement.split(None, 1)[0].upper() in ("SELECT", "WITH"):
+            plan = self._explain(conn, statement, parameters)
+        self.recent_slow.append({
+            "duration_ms": round(elapsed * 1000, 3),
+            "statement": statement,
+            "plan": plan,
+        })
+        logger.warning("slow query (%.1f ms): %s%s", elapsed * 1000, statement, f"\n{plan}" if plan else "")
+
+    def _explain(self, conn, statement, parameters) -> Optional[str]:
+        # EXPLAIN روی یک cursor جداگانه از همان اتصال اجرا می‌شود تا رویدادهای engine دوباره فراخوانی نشوند
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(explain_prefix(conn.dialect.name) + statement, parameters)
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+        except Exception as exc:
+            logger.debug("explain failed: %s", exc)
+            return None
+        finally:
+            cursor.close()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queries": self.queries,
+            "db_time_total_ms": round(self.db_time * 1000, 3),
+            "slow_queries": self.slow_queries,
+            "slow_threshold_ms": self.slow_threshold_ms,
+        }
+
+
+query_profiler = QueryProfiler()
+
+
+def server_timing(profile: RequestProfile, total: float, auth_time: Optional[float] = None) -> str:
+    """مقدار هدر Server-Timing (میلی‌ثانیه)"""
+    parts = [f'db;dur={profile.db_time * 1000:.3f};desc="{profile.queries} queries"']
+    if auth_time is not None:
+        parts.append(f"auth;dur={auth_time * 1000:.3f}")
+    parts.append(f"app;dur={total * 1000:.3f}")
+    return ", ".join(parts)
@@ -0,0 +1,42 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..model import Job
+from ..serializer.JobSchema import JobResponse, JobStatus
+from ..tasks import export_path
+from Database.database import get_db
+from utils.export import ExportFormat
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+async def get_job_or_404(db: AsyncSession, job_id: int) -> Job:
+    # وضعیت کار از Primary و همیشه تازه خوانده می‌شود (worker آن را در Session دیگری تغییر می‌دهد)
+    result = await db.execute(select(Job).where(Job.id == job_id).execution_options(populate_existing=True))
+    job = result.scalar_one_or_none()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """وضعیت، تعداد تلاش‌ها، پیشرفت (progress_done از progress_total) و نتیجه یا خطای کار پس‌زمینه"""
+    return await get_job_or_404(db, job_id)
+
+
+@router.get("/{job_id}/download")
+async def download_job_result(job_id: int, db: AsyncSession = Depends(get_db)):
+    """فایل خروجی کارهای export بعد از پایان موفق"""
+    job = await get_job_or_404(db, job_id)
+    result = job.result or {}
+    if job.status != JobStatus.succeeded.value or "format" not in result:
+        raise HTTPException(status_code=409, detail="Job has no downloadable result yet")
+    path = export_path(job.id, ExportFormat(result["format"]))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export file is no longer available")
+    return FileResponse(path, media_type=result["media_type"], filename=result["filename"])
@@ -0,0 +1,31 @@
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text, func
+from Database.database import Base
+
+
+class Job(Base):
+    """کار پس‌زمینه (حذف/بازیابی آبشاری بزرگ، ورود گروهی و خروجی کامل) و وضعیت و پیشرفت آن"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # برداشتن قدیمی‌ترین کار آماده: WHERE status = 'queued' AND run_after <= now() ORDER BY id
+        Index("ix_jobs_status_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")
+    params = Column(JSON, nullable=False)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    progress_done = Column(Integer, nullable=False, default=0)
+    progress_total = Column(Integer, nullable=True)
+
+    # زمان مجاز اجرای بعدی (برای تاخیر بین تلاش‌های مجدد)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # هر گزارش پیشرفت آن را به‌روز می‌کند؛ کار running بدون به‌روزرسانی طولانی رها شده فرض می‌شود
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
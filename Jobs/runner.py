@@ -0,0 +1,253 @@
+"""
+صف کارهای پس‌زمینه داخل پروسه (asyncio) با جدول پایدار jobs در همان دیتابیس.
+
+درخواستی که از آستانه اندازه بیشتر است به جای اجرای درجا یک ردیف jobs می‌سازد و 202 برمی‌گرداند.
+workerها (JOBS_CONCURRENCY کار همزمان در هر پروسه) کارهای آماده را با یک UPDATE اتمیک برمی‌دارند،
+پس چند پروسه uvicorn هم یک کار را دو بار اجرا نمی‌کنند. خطای هر تلاش با تاخیر نمایی تا max_attempts
+دوباره صف می‌شود و کارهای running که مدت طولانی پیشرفتی گزارش نکرده‌اند (پروسه از کار افتاده) دوباره صف می‌شوند.
+handlerها باید تکرارپذیر باشند (یا از resume_from ادامه دهند) و پیشرفت را در همان تراکنش هر chunk ثبت کنند.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Database.database import AsyncSessionLocal
+from utils.config import env_float, env_int
+from .model import Job
+from .serializer.JobSchema import JobResponse, JobStatus
+
+# تعداد کارهای همزمان هر پروسه و تعداد تلاش هر کار
+JOBS_CONCURRENCY = env_int("JOBS_CONCURRENCY", 2)
+JOBS_MAX_ATTEMPTS = env_int("JOBS_MAX_ATTEMPTS", 3)
+# تاخیر تلاش مجدد: JOBS_RETRY_BACKOFF * 2^(تلاش - 1) ثانیه
+JOBS_RETRY_BACKOFF = env_float("JOBS_RETRY_BACKOFF", 2.0)
+# workerها با هر enqueue بیدار می‌شوند؛ این فاصله فقط برای کارهای پروسه‌های دیگر و تلاش‌های مجدد است
+JOBS_POLL_INTERVAL = env_float("JOBS_POLL_INTERVAL", 1.0)
+JOBS_STALE_SECONDS = env_float("JOBS_STALE_SECONDS", 300.0)
+# اندازه هر chunk (و تراکنش) در handlerها
+JOBS_CHUNK_SIZE = env_int("JOBS_CHUNK_SIZE", 1000)
+# آستانه‌های اجرای پس‌زمینه: تعداد دانش‌آموزان Cascade، آیتم‌های ورود گروهی و ردیف‌های خروجی
+JOBS_CASCADE_THRESHOLD = env_int("JOBS_CASCADE_THRESHOLD", 1000)
+JOBS_BATCH_THRESHOLD = env_int("JOBS_BATCH_THRESHOLD", 5000)
+JOBS_EXPORT_THRESHOLD = env_int("JOBS_EXPORT_THRESHOLD", 100000)
+
+logger = logging.getLogger("school_api.jobs")
+
+Handler = Callable[["JobContext"], Awaitable]
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def exceeds(db: AsyncSession, stmt, threshold: int) -> bool:
+    """آیا stmt بیش از threshold ردیف دارد؟ (بدون شمارش کامل: OFFSET روی ایندکس و LIMIT 1)"""
+    result = await db.execute(stmt.offset(threshold).limit(1))
+    return result.first() is not None
+
+
+def accepted(job: Job) -> JSONResponse:
+    """پاسخ 202 با وضعیت کار و آدرس پیگیری آن"""
+    return JSONResponse(
+        jsonable_encoder(JobResponse.model_validate(job)), status_code=202, headers={"Location": f"/jobs/{job.id}"}
+    )
+
+
+class JobContext:
+    """پارامترها و Session هر تلاش؛ progress بدون commit نوشته می‌شود تا با همان chunk ثبت شود"""
+
+    def __init__(self, job: Job, db: AsyncSession, session_factory):
+        self.job_id = job.id
+        self.params = job.params
+        self.attempt = job.attempts
+        self.db = db
+        self.session_factory = session_factory
+        # پیشرفت ثبت شده تلاش قبلی؛ handlerهای غیرتکرارپذیر (مثل INSERT) از همین نقطه ادامه می‌دهند
+        self.resume_from = job.progress_done
+
+    @staticmethod
+    def _values(done: int, total: Optional[int]) -> dict:
+        values = {"progress_done": done, "updated_at": utcnow()}
+        if total is not None:
+            values["progress_total"] = total
+        return values
+
+    async def progress(self, done: int, total: Optional[int] = None):
+        """ثبت پیشرفت در تراکنش جاری handler (همراه با commit همان chunk)"""
+        await self.db.execute(update(Job).where(Job.id == self.job_id).values(**self._values(done, total)))
+
+    async def report(self, done: int, total: Optional[int] = None):
+        """ثبت پیشرفت در تراکنش جداگانه (برای handlerهای فقط خواندنی با یک تراکنش طولانی مثل خروجی)"""
+        async with self.session_factory() as db:
+            await db.execute(update(Job).where(Job.id == self.job_id).values(**self._values(done, total)))
+            await db.commit()
+
+
+class JobRunner:
+    def __init__(self, session_factory=AsyncSessionLocal, concurrency: int = JOBS_CONCURRENCY):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.max_attempts = JOBS_MAX_ATTEMPTS
+        self.retry_backoff = JOBS_RETRY_BACKOFF
+        self.handlers = {}
+        self.enqueued = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.running = 0
+        self._workers = []
+        self._wake = asyncio.Event()
+
+    def handler(self, kind: str):
+        """ثبت handler یک نوع کار: async def handler(ctx: JobContext) -> نتیجه قابل JSON"""
+        def register(func: Handler) -> Handler:
+            self.handlers[kind] = func
+            return func
+        return register
+
+    async def enqueue(self, db: AsyncSession, kind: str, params: dict) -> Job:
+        """ثبت کار در تراکنش جاری و commit آن؛ workerهای همین پروسه بلافاصله بیدار می‌شوند"""
+        if kind not in self.handlers:
+            raise ValueError(f"unknown job kind: {kind}")
+        job = Job(kind=kind, status=JobStatus.queued.value, params=jsonable_encoder(params),
+                  max_attempts=self.max_attempts, run_after=utcnow())
+        db.add(job)
+        await db.commit()
+        self.enqueued += 1
+        self._wake.set()
+        return job
+
+    async def claim(self) -> Optional[Job]:
+        """برداشتن اتمیک قدیمی‌ترین کار آماده (در چند پروسه هم فقط یکی موفق می‌شود)"""
+        now = utcnow()
+        async with self.session_factory() as db:
+            candidate = (
+                select(Job.id)
+                .where(Job.status == JobStatus.queued.value, Job.run_after <= now)
+                .order_by(Job.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == candidate, Job.status == JobStatus.queued.value)
+                .values(status=JobStatus.running.value, attempts=Job.attempts + 1, started_at=now, updated_at=now)
+                .returning(Job)
+                .execution_options(synchronize_session=False)
+            )
+            job = result.scalar_one_or_none()
+            await db.commit()
+            return job
+
+    async def _finish(self, job_id: int, **values):
+        async with self.session_factory() as db:
+            await db.execute(update(Job).where(Job.id == job_id).values(updated_at=utcnow(), **values))
+            await db.commit()
+
+    async def run(self, job: Job):
+        handler = self.handlers.get(job.kind)
+        self.running += 1
+        try:
+            if handler is None:
+                raise LookupError(f"no handler for job kind {job.kind}")
+            async with self.session_factory() as db:
+                result = await handler(JobContext(job, db, self.session_factory))
+                await db.commit()
+        except asyncio.CancelledError:
+            # خاموش شدن پروسه: کار برای اجرای دوباره (توسط همین یا پروسه دیگر) به صف برمی‌گردد
+            await asyncio.shield(self._finish(job.id, status=JobStatus.queued.value, attempts=job.attempts - 1))
+            raise
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if job.attempts < job.max_attempts:
+                self.retried += 1
+                delay = self.retry_backoff * 2 ** (job.attempts - 1)
+                logger.warning("job %s (%s) attempt %d failed, retrying in %.1fs: %s",
+                               job.id, job.kind, job.attempts, delay, error)
+                await self._finish(job.id, status=JobStatus.queued.value, error=error,
+                                   run_after=utcnow() + timedelta(seconds=delay))
+            else:
+                self.failed += 1
+                logger.exception("job %s (%s) failed", job.id, job.kind)
+                await self._finish(job.id, status=JobStatus.failed.value, error=error, finished_at=utcnow())
+        else:
+            self.succeeded += 1
+            await self._finish(job.id, status=JobStatus.succeeded.value, result=jsonable_encoder(result),
+                               error=None, finished_at=utcnow())
+        finally:
+            self.running -= 1
+
+    async def drain(self) -> int:
+        """اجرای همه کارهای آماده در همین task (برای اسکریپت‌ها و تست‌ها)؛ تعداد کارهای اجرا شده"""
+        count = 0
+        while (job := await self.claim()) is not None:
+            await self.run(job)
+            count += 1
+        return count
+
+    async def recover(self) -> int:
+        """کارهای running بدون پیشرفت در JOBS_STALE_SECONDS اخیر (پروسه از کار افتاده) دوباره صف می‌شوند"""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(Job)
+                .where(Job.status == JobStatus.running.value,
+                       Job.updated_at < utcnow() - timedelta(seconds=JOBS_STALE_SECONDS))
+                .values(status=JobStatus.queued.value, run_after=utcnow())
+                .returning(Job.id)
+            )
+            ids = result.scalars().all()
+            await db.commit()
+        if ids:
+            logger.warning("requeued %d stale job(s): %s", len(ids), ids)
+        return len(ids)
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self.claim()
+            except Exception:
+                logger.exception("claiming a job failed")
+                job = None
+            if job is not None:
+                await self.run(job)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), JOBS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def start(self):
+        if self._workers:
+            return
+        try:
+            await self.recover()
+        except Exception:
+            logger.exception("recovering stale jobs failed")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "running": self.running,
+            "enqueued": self.enqueued,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+job_runner = JobRunner()
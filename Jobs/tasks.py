@@ -0,0 +1,103 @@
+"""
+handlerهای مشترک کارهای پس‌زمینه: حذف/بازیابی آبشاری والد یا کلاس و خروجی کامل در فایل.
+handlerهای ورود گروهی کنار منطق همان batch در ماژول API هر موجودیت ثبت می‌شوند.
+"""
+import os
+import tempfile
+
+from sqlalchemy import func, select
+
+from Class.model import Class
+from Parent.model import Parent
+from Student.model import Student
+from utils.cache import list_tag, response_cache, tags_for
+from utils.export import MEDIA_TYPES, ExportFormat, export_filename, write_export
+from .runner import JOBS_CASCADE_THRESHOLD, JOBS_CHUNK_SIZE, JobContext, exceeds, job_runner
+
+# فایل‌های خروجی کارهای پس‌زمینه (job_<id>.<format>)
+JOBS_EXPORT_DIR = os.getenv("JOBS_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "school_api_exports"))
+
+# جدول -> (مدل، ستون کلید خارجی دانش‌آموزان)
+CASCADES = {
+    "parents": (Parent, Student.parent_id),
+    "classes": (Class, Student.class_id),
+}
+
+
+def export_path(job_id: int, fmt: ExportFormat) -> str:
+    return os.path.join(JOBS_EXPORT_DIR, f"job_{job_id}.{fmt.value}")
+
+
+def cascade_students(table: str, item_id: int, deleted: bool):
+    """دانش‌آموزانی که حذف (deleted=False) یا بازیابی (deleted=True) آبشاری روی آن‌ها اثر دارد"""
+    _, fk_column = CASCADES[table]
+    return select(Student.id).where(fk_column == item_id, Student.is_deleted.is_(deleted)).order_by(Student.id)
+
+
+async def cascade_is_large(db, table: str, item_id: int, deleted: bool) -> bool:
+    return await exceeds(db, cascade_students(table, item_id, deleted), JOBS_CASCADE_THRESHOLD)
+
+
+async def _cascade(ctx: JobContext, restore: bool) -> dict:
+    """
+    ابتدا خود والد/کلاس و سپس دانش‌آموزانش در chunkهای JOBS_CHUNK_SIZE تایی (هر کدام یک تراکنش) تغییر می‌کنند.
+    هر دو مرحله فقط ردیف‌های تغییر نکرده را لمس می‌کنند، پس اجرای دوباره بعد از خطا از همان‌جا ادامه می‌دهد.
+    """
+    db = ctx.db
+    table, item_id = ctx.params["table"], ctx.params["id"]
+    model, _ = CASCADES[table]
+    apply = Student.bulk_restore if restore else Student.bulk_soft_delete
+    await (model.bulk_restore if restore else model.bulk_soft_delete)(db, model.id == item_id)
+
+    remaining = cascade_students(table, item_id, deleted=restore)
+    total = (await db.execute(select(func.count()).select_from(remaining.subquery()))).scalar_one()
+    await ctx.progress(0, total)
+    await db.commit()
+    await response_cache.invalidate(list_tag(model), *tags_for(model, item_id))
+
+    done = 0
+    while ids := (await db.execute(remaining.limit(JOBS_CHUNK_SIZE))).scalars().all():
+        changed = await apply(db, Student.id.in_(ids))
+        done += len(changed)
+        await ctx.progress(done)
+        await db.commit()
+        await response_cache.invalidate(list_tag(Student), *tags_for(Student, *changed))
+    return {"table": table, "id": item_id, "students": done}
+
+
+@job_runner.handler("cascade.delete")
+async def cascade_delete(ctx: JobContext) -> dict:
+    return await _cascade(ctx, restore=False)
+
+
+@job_runner.handler("cascade.restore")
+async def cascade_restore(ctx: JobContext) -> dict:
+    return await _cascade(ctx, restore=True)
+
+
+async def export_to_file(ctx: JobContext, stmt, name: str) -> dict:
+    """خروجی کامل stmt در فایل؛ پیشرفت در تراکنش جداگانه گزارش می‌شود چون خواندن یک تراکنش طولانی است"""
+    fmt = ExportFormat(ctx.params["format"])
+    total = (await ctx.db.execute(select(func.count()).select_from(stmt.subquery()))).scalar_one()
+    await ctx.report(0, total)
+    os.makedirs(JOBS_EXPORT_DIR, exist_ok=True)
+    rows = await write_export(ctx.db, stmt, fmt, export_path(ctx.job_id, fmt), on_progress=ctx.report)
+    return {
+        "rows": rows,
+        "format": fmt.value,
+        "filename": export_filename(name, fmt),
+        "media_type": MEDIA_TYPES[fmt],
+        "download": f"/jobs/{ctx.job_id}/download",
+    }
+
+
+async def import_items(ctx: JobContext, importer) -> list:
+    """
+    ورود گروهی پس‌زمینه با همان تابع batch درخواست‌های کوچک.
+    importer پیشرفت (اندیس آیتم بعدی) را با هر chunk ثبت می‌کند و تلاش مجدد از resume_from ادامه می‌دهد.
+    """
+    items = ctx.params["items"]
+    await ctx.progress(ctx.resume_from, len(items))
+    results = await importer(ctx.db, items, start=ctx.resume_from, progress=ctx.progress)
+    await ctx.progress(len(items))
+    return results
@@ -1,22 +1,174 @@
-from fastapi import Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from logging.handlers import QueueHandler, QueueListener
+from utils.pagination import NEXT_CURSOR_HEADER
+from Database.profiling import RequestProfile, current_profile, query_profiler, server_timing
+from collections import defaultdict
+import atexit
+import queue
 import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("school_api")
+db_logger = logging.getLogger("school_api.db")
 
+# مرزهای هیستوگرام زمان پاسخ (ثانیه)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
 
-class LogMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        logger.info(
-            f"{request.client.host} - {request.method} {request.url.path} - {response.status_code} - {process_time:.4f}s")
-        return response
+
+class HttpMetrics:
+    """هیستوگرام زمان پاسخ، تعداد وضعیت‌ها و حجم پاسخ به تفکیک مسیر"""
+
+    def __init__(self):
+        self.buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self.duration_sum = defaultdict(float)
+        self.requests = defaultdict(int)
+        self.response_bytes = defaultdict(int)
+
+    def observe(self, method: str, route: str, status_code: int, elapsed_ns: int, size: int):
+        key = (method, route)
+        elapsed = elapsed_ns / 1e9
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                index = i
+                break
+        self.buckets[key][index] += 1
+        self.duration_sum[key] += elapsed
+        self.requests[(method, route, status_code)] += 1
+        self.response_bytes[key] += size
+
+    def render(self) -> str:
+        """خروجی با فرمت متنی Prometheus"""
+        lines = [
+            "# HELP http_request_duration_seconds HTTP request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), counts in sorted(self.buckets.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {self.duration_sum[(method, route)]:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+        lines += ["# HELP http_requests_total HTTP responses by route and status.",
+                  "# TYPE http_requests_total counter"]
+        for (method, route, status_code), count in sorted(self.requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status_code}"}} {count}')
+
+        lines += ["# HELP http_response_size_bytes_total Uncompressed response body bytes by route.",
+                  "# TYPE http_response_size_bytes_total counter"]
+        for (method, route), size in sorted(self.response_bytes.items()):
+            lines.append(f'http_response_size_bytes_total{{method="{method}",route="{route}"}} {size}')
+        return "\n".join(lines) + "\n"
+
+
+http_metrics = HttpMetrics()
+
+
+def route_label(scope) -> str:
+    # از الگوی مسیر (مثل /students/{student_id}) استفاده می‌شود تا تعداد برچسب‌ها محدود بماند
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+
+
+class LogMiddleware:
+    """
+    Middleware خالص ASGI (بدون سربار BaseHTTPMiddleware).
+    زمان را با perf_counter_ns اندازه می‌گیرد و لاگ را به صف پس‌زمینه می‌سپارد.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter_ns()
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed_ns = time.perf_counter_ns() - start
+            http_metrics.observe(scope["method"], route_label(scope), status_code, elapsed_ns, size)
+            client = scope.get("client")
+            logger.info(
+                "%s - %s %s - %d - %.4fs",
+                client[0] if client else "-", scope["method"], scope["path"], status_code, elapsed_ns / 1e9,
+            )
+
+
+class QueryProfileMiddleware:
+    """
+    پروفایل کوئری‌های هر درخواست را در contextvar قرار می‌دهد و نتیجه را
+    در هدر Server-Timing برمی‌گرداند (فقط وقتی پروفایلر روی engine نصب شده باشد).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not query_profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                auth_time = scope.get("state", {}).get("auth_time")
+                value = server_timing(profile, time.perf_counter() - start, auth_time)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            if profile.queries:
+                db_logger.info(
+                    "%s %s - %d queries - %.1f ms db - slowest: %s",
+                    scope["method"], scope["path"], profile.queries, profile.db_time * 1000,
+                    " | ".join(f"{elapsed * 1000:.1f} ms {sql[:120]}" for elapsed, sql in profile.slowest),
+                )
+
+
+_log_listener = None
+
+
+def setup_queue_logging():
+    """
+    رکوردهای لاگ از طریق QueueHandler در یک thread جداگانه نوشته می‌شوند
+    تا I/O لاگ هرگز event loop را مسدود نکند.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    handlers = logging.getLogger().handlers or [logging.StreamHandler()]
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.propagate = False
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
 
 
 def add_cors(app):
@@ -26,6 +178,8 @@ def add_cors(app):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, "Server-Timing", "ETag", "Last-Modified", "Retry-After",
+                        "X-Search-Truncated"],
     )
 
 
@@ -34,6 +188,8 @@ def add_gzip(app):
 
 
 def setup_middlewares(app):
+    setup_queue_logging()
+    app.add_middleware(QueryProfileMiddleware)
     app.add_middleware(LogMiddleware)
     add_cors(app)
     add_gzip(app)
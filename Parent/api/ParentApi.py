@@ -1,16 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import func, select, update
 from typing import List
 from ..model import Parent
 from Student.model import Student
 from ..serializer import ParentSchema
-from ..serializer.ParentSchema import ParentCreate, ParentUpdate, ParentResponse
-from Database.database import get_db
+from ..serializer.ParentSchema import ParentCreate, ParentUpdate, ParentResponse, ParentBatchUpdate
+from Database.database import get_db, get_read_db
 from sqlalchemy.orm import selectinload
+from utils.pagination import PageParams, paginate
+from utils.fields import FieldSelection, Projection
+from utils.filters import StatusFilter
+from utils.export import ExportFormat, export_response
+from utils.cache import list_tag, response_cache, tags_for
+from utils.batch import (
+    BATCH_REQUEST_BODY, BatchDelete, BatchItemResult, batch_soft_delete, chunked, dialect_insert,
+    existing_ids, null_required_fields, read_batch_items, resume_items, validate_items,
+)
+from Jobs.runner import JOBS_BATCH_THRESHOLD, JOBS_EXPORT_THRESHOLD, JobContext, accepted, exceeds, job_runner
+from Jobs.tasks import cascade_is_large, export_to_file, import_items
 
 router = APIRouter(prefix="/parents", tags=["parents"])
 
+# students فقط در صورت درخواست (یا بدون fields/include) لود می‌شود
+PARENT_PROJECTION = Projection(Parent, ParentResponse, {"students": selectinload})
+
+
+async def get_parent_with_students(db: AsyncSession, parent_id: int):
+    """
+    والد را به همراه لیست دانش‌آموزانش لود می‌کند تا پاسخ بعد از عملیات نوشتن
+    بدون Lazy Load (و خطای MissingGreenlet) سریالایز شود.
+    """
+    result = await db.execute(
+        select(Parent)
+        .options(selectinload(Parent.students))
+        .where(Parent.id == parent_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
 
 @router.post("/", response_model=ParentSchema.ParentResponse, status_code=status.HTTP_201_CREATED)
 async def create_parent(parent: ParentSchema.ParentCreate, db: AsyncSession = Depends(get_db)):
@@ -20,31 +48,222 @@ async def create_parent(parent: ParentSchema.ParentCreate, db: AsyncSession = De
     )
     db.add(new_parent)
     await db.commit()
-    await db.refresh(new_parent)  # or using select instead of refresh
-    return new_parent
+    await response_cache.invalidate(list_tag(Parent))
+    return await get_parent_with_students(db, new_parent.id)
 
 
 @router.get("/", response_model=List[ParentResponse])
-async def get_parents(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Parent)
-        .options(selectinload(Parent.students))
-        .order_by(Parent.id.desc())
+async def get_parents(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        filters: StatusFilter = Depends(),
+        selection: FieldSelection = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+):
+    fields = PARENT_PROJECTION.select(selection)
+
+    stmt = filters.apply(select(Parent), Parent)
+
+    async def load():
+        return await paginate(db, stmt.options(*PARENT_PROJECTION.options(fields)), Parent.id, page, response)
+
+    async def version():
+        return await PARENT_PROJECTION.version(fields).page(db, stmt, page)
+
+    return await response_cache.serve(
+        request, response, PARENT_PROJECTION.adapter(fields, many=True), load, version=version
     )
-    return result.scalars().all()
+
+
+def export_statement(filters: StatusFilter):
+    stmt = select(
+        Parent.id, Parent.name, Parent.phone_number, Parent.is_active, Parent.is_deleted,
+        Parent.created_at, Parent.updated_at, Parent.deleted_at,
+    ).order_by(Parent.id)
+    return filters.apply(stmt, Parent)
+
+
+@router.get("/export")
+async def export_parents(
+        fmt: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+        filters: StatusFilter = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+        write_db: AsyncSession = Depends(get_db),
+):
+    """
+    خروجی استریم کامل (NDJSON یا CSV) بدون بارگذاری همه ردیف‌ها در حافظه.
+    بیش از JOBS_EXPORT_THRESHOLD ردیف در کار پس‌زمینه در فایل نوشته می‌شود.
+    """
+    stmt = export_statement(filters)
+    if await exceeds(db, stmt, JOBS_EXPORT_THRESHOLD):
+        job = await job_runner.enqueue(write_db, "parents.export", {"format": fmt.value, "filters": vars(filters)})
+        return accepted(job)
+    return export_response(db, stmt, fmt, "parents")
+
+
+@job_runner.handler("parents.export")
+async def export_parents_job(ctx: JobContext) -> dict:
+    return await export_to_file(ctx, export_statement(StatusFilter(**ctx.params["filters"])), "parents")
+
+
+async def import_parents(db: AsyncSession, items: list, progress=None, start: int = 0) -> list:
+    """
+    ساخت گروهی والدین با INSERT چند ردیفی و ON CONFLICT روی phone_number؛
+    والد موجود با همان شماره، آپدیت می‌شود. والد حذف شده (نرم) آپدیت یا بازیابی نمی‌شود و
+    آیتم آن خطا می‌گیرد (بازیابی با POST /parents/{id}/restore). progress و start مثل import_students.
+    """
+    results = [None] * len(items)
+    valid = resume_items(validate_items(items, ParentCreate, results), results, start)
+
+    for chunk in chunked(valid):
+        # شماره تکراری در یک chunk باعث خطای ON CONFLICT می‌شود؛ آخرین مورد معتبر است
+        latest = {}
+        for index, parent in chunk:
+            if parent.phone_number in latest:
+                duplicate = latest[parent.phone_number]
+                results[duplicate] = BatchItemResult(
+                    index=duplicate, status="error", detail="duplicate phone_number in batch"
+                )
+            latest[parent.phone_number] = index
+        rows = [(index, parent) for index, parent in chunk if latest[parent.phone_number] == index]
+
+        existing = await db.execute(
+            select(Parent.phone_number, Parent.id, Parent.is_deleted).where(Parent.phone_number.in_(latest.keys()))
+        )
+        existing_phones, deleted_ids = set(), {}
+        for phone, parent_id, is_deleted in existing.all():
+            if is_deleted:
+                deleted_ids[phone] = parent_id
+            else:
+                existing_phones.add(phone)
+
+        phone_ids = {}
+        inserts = [parent.model_dump() for _, parent in rows if parent.phone_number not in deleted_ids]
+        if inserts:
+            stmt = dialect_insert(db, Parent)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Parent.phone_number],
+                set_={"name": stmt.excluded.name, "updated_at": func.now()},
+                # والدی که بین SELECT بالا و این INSERT حذف شده هم دست نمی‌خورد (و ردیفی برنمی‌گرداند)
+                where=Parent.is_deleted.is_(False),
+            ).returning(Parent.phone_number, Parent.id)
+            result = await db.execute(stmt, inserts)
+            # phone_number در هر chunk یکتاست، پس شناسه‌ها بر اساس آن به آیتم‌ها نگاشت می‌شوند
+            phone_ids = dict(result.all())
+
+        for index, parent in rows:
+            if parent.phone_number in phone_ids:
+                results[index] = BatchItemResult(
+                    index=index,
+                    status="updated" if parent.phone_number in existing_phones else "created",
+                    id=phone_ids[parent.phone_number],
+                )
+            else:
+                results[index] = BatchItemResult(
+                    index=index, status="error", id=deleted_ids.get(parent.phone_number),
+                    detail="Parent is deleted",
+                )
+        if progress is not None:
+            await progress(chunk[-1][0] + 1)
+        await db.commit()
+        await response_cache.invalidate(
+            list_tag(Parent), *tags_for(Parent, *(phone_ids[phone] for phone in existing_phones & phone_ids.keys()))
+        )
+
+    return results
+
+
+@router.post("/batch", response_model=List[BatchItemResult], openapi_extra=BATCH_REQUEST_BODY)
+async def upsert_parents_batch(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    ساخت یا آپدیت گروهی والدین (آرایه JSON یا NDJSON) بر اساس phone_number.
+    بیش از JOBS_BATCH_THRESHOLD آیتم در کار پس‌زمینه اجرا می‌شود.
+    """
+    items = await read_batch_items(request)
+    if len(items) > JOBS_BATCH_THRESHOLD:
+        return accepted(await job_runner.enqueue(db, "parents.import", {"items": items}))
+    return await import_parents(db, items)
+
+
+@job_runner.handler("parents.import")
+async def import_parents_job(ctx: JobContext) -> list:
+    return await import_items(ctx, import_parents)
+
+
+@router.patch("/batch", response_model=List[BatchItemResult], openapi_extra=BATCH_REQUEST_BODY)
+async def update_parents_batch(request: Request, db: AsyncSession = Depends(get_db)):
+    """آپدیت جزئی گروهی والدین با UPDATE دسته‌ای بر اساس کلید اصلی"""
+    items = await read_batch_items(request)
+    results = [None] * len(items)
+    valid = validate_items(items, ParentBatchUpdate, results)
+
+    for chunk in chunked(valid):
+        parent_ids = await existing_ids(db, Parent, (p.id for _, p in chunk))
+        phones = {p.phone_number for _, p in chunk if p.phone_number}
+        owners = await db.execute(
+            select(Parent.phone_number, Parent.id).where(Parent.phone_number.in_(phones))
+        )
+        phone_owner = dict(owners.all())
+
+        params = []
+        for index, parent in chunk:
+            data = parent.model_dump(exclude_unset=True)
+            nulls = null_required_fields(data, ("name", "phone_number"))
+            if parent.id not in parent_ids:
+                error = "Parent not found"
+            elif nulls:
+                error = f"Field '{nulls[0]}' cannot be null."
+            elif parent.phone_number and phone_owner.setdefault(parent.phone_number, parent.id) != parent.id:
+                error = "phone_number already exists"
+            else:
+                error = None
+
+            if error:
+                results[index] = BatchItemResult(index=index, status="error", id=parent.id, detail=error)
+                continue
+            if len(data) > 1:
+                params.append(data)
+            results[index] = BatchItemResult(index=index, status="updated", id=parent.id)
+
+        if params:
+            await db.execute(update(Parent), params)
+        await db.commit()
+        await response_cache.invalidate(list_tag(Parent), *tags_for(Parent, *(row["id"] for row in params)))
+
+    return results
+
+
+@router.post("/batch/delete", response_model=List[BatchItemResult])
+async def delete_parents_batch(payload: BatchDelete, db: AsyncSession = Depends(get_db)):
+    return await batch_soft_delete(db, Parent, payload.ids, cascades=[(Student, Student.parent_id)])
 
 
 @router.get("/{parent_id}", response_model=ParentResponse)
-async def get_parent(parent_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Parent)
-        .options(selectinload(Parent.students))
-        .where(Parent.id == parent_id)
-    )
-    parent = result.scalar_one_or_none()
-    if not parent:
-        raise HTTPException(status_code=404, detail="Parent not found")
-    return parent
+async def get_parent(
+        parent_id: int,
+        request: Request,
+        response: Response,
+        selection: FieldSelection = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+):
+    fields = PARENT_PROJECTION.select(selection)
+
+    async def load():
+        result = await db.execute(
+            select(Parent)
+            .options(*PARENT_PROJECTION.options(fields))
+            .where(Parent.id == parent_id)
+        )
+        parent = result.scalar_one_or_none()
+        if not parent:
+            raise HTTPException(status_code=404, detail="Parent not found")
+        return parent
+
+    async def version():
+        return await PARENT_PROJECTION.version(fields).item(db, parent_id)
+
+    return await response_cache.serve(request, response, PARENT_PROJECTION.adapter(fields), load, version=version)
 
 
 @router.patch("/{parent_id}", response_model=ParentResponse)
@@ -60,8 +279,8 @@ async def update_parent_partial(parent_id: int, payload: ParentUpdate, db: Async
         setattr(parent, key, value)
 
     await db.commit()
-    await db.refresh(parent)
-    return parent
+    await response_cache.invalidate(list_tag(Parent), *tags_for(Parent, parent_id))
+    return await get_parent_with_students(db, parent_id)
 
 
 @router.put("/{parent_id}", response_model=ParentResponse)
@@ -83,29 +302,27 @@ async def update_parent_full(parent_id: int, payload: ParentUpdate, db: AsyncSes
         setattr(parent, key, value)
 
     await db.commit()
-    await db.refresh(parent)
-    return parent
+    await response_cache.invalidate(list_tag(Parent), *tags_for(Parent, parent_id))
+    return await get_parent_with_students(db, parent_id)
 
 
 @router.delete("/{parent_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def soft_delete_parent(parent_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Parent).where(Parent.id == parent_id, Parent.is_deleted.is_(False))
-    )
-    parent = result.scalar_one_or_none()
+    # والد با دانش‌آموزان زیاد: حذف آبشاری در کار پس‌زمینه با chunkهای جدا (202)
+    if await cascade_is_large(db, "parents", parent_id, deleted=False):
+        if not await existing_ids(db, Parent, [parent_id]):
+            raise HTTPException(status_code=404, detail="Parent not found")
+        return accepted(await job_runner.enqueue(db, "cascade.delete", {"table": "parents", "id": parent_id}))
 
-    if not parent:
+    if not await Parent.bulk_soft_delete(db, Parent.id == parent_id):
         raise HTTPException(status_code=404, detail="Parent not found")
 
-    await parent.soft_delete(db)
-
-    students_result = await db.execute(
-        select(Student).where(Student.parent_id == parent_id, Student.is_deleted.is_(False))
+    # Cascade Soft Delete (یک UPDATE برای همه دانش‌آموزان و یک تراکنش)
+    student_ids = await Student.bulk_soft_delete(db, Student.parent_id == parent_id)
+    await db.commit()
+    await response_cache.invalidate(
+        list_tag(Parent), *tags_for(Parent, parent_id), list_tag(Student), *tags_for(Student, *student_ids)
     )
-    students = students_result.scalars().all()
-
-    for student in students:
-        await student.soft_delete(db)
 
     return None
 
@@ -114,30 +331,27 @@ async def soft_delete_parent(parent_id: int, db: AsyncSession = Depends(get_db))
 async def restore_parent(parent_id: int, db: AsyncSession = Depends(get_db)):
     # Include deleted to find it
     result = await db.execute(
-        select(Parent)
-        .options(selectinload(Parent.students))  # لود می‌کنیم تا در ریسپانس نهایی باشد
-        .where(Parent.id == parent_id)
+        select(Parent.is_deleted).where(Parent.id == parent_id)
     )
-    parent = result.scalar_one_or_none()
+    is_deleted = result.scalar_one_or_none()
 
-    if not parent:
+    if is_deleted is None:
         raise HTTPException(status_code=404, detail="Parent not found")
 
-    if parent.is_deleted:
+    if is_deleted and await cascade_is_large(db, "parents", parent_id, deleted=True):
+        return accepted(await job_runner.enqueue(db, "cascade.restore", {"table": "parents", "id": parent_id}))
+
+    if is_deleted:
         # 1. بازیابی والد
-        await parent.restore(db)
+        await Parent.bulk_restore(db, Parent.id == parent_id)
 
         # 2. بازیابی خودکار دانش‌آموزان زیرمجموعه (Cascading Restore)
         # پیدا کردن دانش‌آموزان حذف شده‌ی این والد
-        students_result = await db.execute(
-            select(Student).where(Student.parent_id == parent_id, Student.is_deleted.is_(True))
-        )
-        deleted_students = students_result.scalars().all()
-
-        for student in deleted_students:
-            await student.restore(db)
+        student_ids = await Student.bulk_restore(db, Student.parent_id == parent_id)
 
         await db.commit()
-        await db.refresh(parent)
+        await response_cache.invalidate(
+            list_tag(Parent), *tags_for(Parent, parent_id), list_tag(Student), *tags_for(Student, *student_ids)
+        )
 
-    return parent
+    return await get_parent_with_students(db, parent_id)
@@ -1,6 +1,7 @@
 from sqlalchemy import Column, String, Integer
 from sqlalchemy.orm import relationship
-from utils.base_model import TimestampMixin, SoftDeleteMixin
+from utils.base_model import TimestampMixin, SoftDeleteMixin, changed_at_index
+from utils.text_search import search_index
 from Database.database import Base
 
 
@@ -14,3 +15,10 @@ class Parent(Base, TimestampMixin, SoftDeleteMixin):
     students = relationship(
         "Student", back_populates="parent", cascade="all, delete-orphan"
     )
+
+
+# فید تغییرات /sync: WHERE (changed_at, id) > (:since, :id) ORDER BY changed_at, id
+changed_at_index(Parent)
+
+# جستجوی /search روی کلمات نرمال شده (فقط PostgreSQL)
+search_index(Parent, Parent.name, Parent.phone_number)
@@ -21,6 +21,11 @@ class ParentUpdate(BaseModel):
     phone_number: Optional[str] = Field(None, pattern=r"^09\d{9}$")
 
 
+# --- آیتم‌های درخواست batch آپدیت (شناسه + فیلدهای Update) ---
+class ParentBatchUpdate(ParentUpdate):
+    id: int
+
+
 # --- مدل ساده برای استفاده در داخل StudentResponse ---
 class ParentResponseSimple(BaseModel):
     id: int
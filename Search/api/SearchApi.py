@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from pydantic import TypeAdapter
+from ..query import SEARCH_TRUNCATED_HEADER, decode_offset, encode_offset, search
+from ..serializer.SearchSchema import SearchHit, SearchType
+from Class.model import Class
+from Parent.model import Parent
+from Student.model import Student
+from Database.database import get_read_db
+from utils.cache import list_tag, response_cache
+from utils.pagination import NEXT_CURSOR_HEADER
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+SEARCH_ADAPTER = TypeAdapter(List[SearchHit])
+
+# هر نوشتن روی یکی از جداول نتایج جستجوی کش شده را باطل می‌کند
+SEARCH_CACHE_TAGS = {list_tag(Student), list_tag(Parent), list_tag(Class)}
+
+
+@router.get("", response_model=List[SearchHit])
+async def search_names(
+        request: Request,
+        response: Response,
+        q: str = Query(..., min_length=1, max_length=100, description="Name, teacher name or phone prefix"),
+        type: Optional[List[SearchType]] = Query(None, description="Limit results to these types"),
+        cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+        limit: int = Query(20, ge=1, le=100),
+        db: AsyncSession = Depends(get_read_db),
+):
+    """
+    جستجوی پیشوندی نام دانش‌آموزان، نام و تلفن والدین و نام کلاس و معلم.
+    متن فارسی نرمال می‌شود (ی/ک عربی، نیم‌فاصله، ارقام فارسی) و نتایج بر اساس امتیاز مرتب می‌شوند.
+    هدر X-Search-Truncated یعنی منطبق‌های بیشتری وجود دارد که با این عبارت قابل صفحه‌بندی نیستند.
+    """
+    offset = decode_offset(cursor)
+
+    async def load():
+        hits, more, truncated = await search(db, q, set(type or ()), offset, limit)
+        if more:
+            response.headers[NEXT_CURSOR_HEADER] = encode_offset(offset + limit)
+        if truncated:
+            response.headers[SEARCH_TRUNCATED_HEADER] = "true"
+        return hits
+
+    return await response_cache.serve(request, response, SEARCH_ADAPTER, load, tags=SEARCH_CACHE_TAGS)
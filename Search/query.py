@@ -0,0 +1,148 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import String, and_, cast, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import TSQUERY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Class.model import Class
+from Parent.model import Parent
+from Student.model import Student
+from utils.config import env_int
+from utils.text_search import normalize_text, normalized, prefix_query, search_document
+from .serializer.SearchSchema import SearchHit, SearchType
+
+# حداکثر تعداد ردیف منطبق خوانده شده از هر جدول برای رتبه‌بندی (و عمیق‌ترین صفحه قابل دسترس)
+SEARCH_CANDIDATES = env_int("SEARCH_CANDIDATES", 200)
+# وقتی منطبق‌های یک جدول بیش از SEARCH_CANDIDATES باشند، آخرین صفحه این هدر را دارد (عبارت دقیق‌تری لازم است)
+SEARCH_TRUNCATED_HEADER = "X-Search-Truncated"
+
+
+class SearchTarget:
+    """یک جدول قابل جستجو؛ ترتیب ستون‌ها باید با سند جستجوی ایندکس ix_<table>_search یکی باشد"""
+
+    def __init__(self, type_: SearchType, model, columns: tuple, detail: Optional[str] = None):
+        self.type = type_
+        self.model = model
+        self.columns = columns
+        self.detail = detail
+
+    def condition(self, dialect: str, tokens: list):
+        attributes = [getattr(self.model, name) for name in self.columns]
+        if dialect == "postgresql":
+            return search_document(*attributes).op("@@")(cast(literal(prefix_query(tokens)), TSQUERY))
+        # بدون ایندکس (SQLite): هر کلمه باید پیشوند یکی از کلمات یکی از ستون‌ها باشد
+        words = [literal(" ", String) + normalized(attribute) for attribute in attributes]
+        return and_(*[or_(*[word.like(f"% {token}%") for word in words]) for token in tokens])
+
+    def relevance(self, dialect: str) -> tuple:
+        """
+        ترتیب ارزان SQL قبل از LIMIT تا بهترین نتایج در کاندیداها باشند (رتبه نهایی با match_score):
+        کوتاه‌ترین مقدار ستون‌ها اول. تطابق کامل (بیشترین امتیاز) کوتاه‌ترین منطبق ممکن است، پس همیشه
+        در کاندیداهاست؛ مقایسه مستقیم با متن نرمال شده (replace تو در تو برای هر ردیف) روی میلیون‌ها
+        منطبق یک عبارت رایج ده‌ها برابر کندتر بود.
+        """
+        lengths = [func.length(getattr(self.model, name)) for name in self.columns]
+        if len(lengths) > 1:
+            lengths = [(func.least if dialect == "postgresql" else func.min)(*lengths)]
+        return lengths[0], self.model.id
+
+    async def candidates(self, db: AsyncSession, tokens: list, limit: int):
+        dialect = db.bind.dialect.name
+        stmt = (
+            select(self.model.id, *[getattr(self.model, name) for name in self.columns])
+            .where(self.condition(dialect, tokens), self.model.is_deleted.is_(False))
+            .order_by(*self.relevance(dialect))
+            .limit(limit)
+        )
+        return (await db.execute(stmt)).all()
+
+    def hit(self, row, query: str, tokens: list) -> SearchHit:
+        score, matched = max(
+            (match_score(normalize_text(getattr(row, name)), query, tokens), name) for name in self.columns
+        )
+        if not score:
+            # کلمات عبارت در ستون‌های مختلف آمده‌اند (مثلاً نام کلاس و نام معلم)
+            score, matched = 0.3, self.columns[0]
+        return SearchHit(
+            type=self.type, id=row.id, name=row.name, matched=matched, score=score,
+            detail=getattr(row, self.detail) if self.detail else None,
+        )
+
+
+TARGETS = [
+    SearchTarget(SearchType.student, Student, ("name",)),
+    SearchTarget(SearchType.parent, Parent, ("name", "phone_number"), detail="phone_number"),
+    SearchTarget(SearchType.class_, Class, ("name", "teacher_name"), detail="teacher_name"),
+]
+TYPE_ORDER = {target.type: index for index, target in enumerate(TARGETS)}
+
+
+def match_score(value: str, query: str, tokens: list) -> float:
+    """امتیاز 0 تا 1: تطابق کامل، کلمات کامل (در ابتدا یا هر جا)، پیشوند کل مقدار، پیشوند کلمات، زیررشته"""
+    if not value:
+        return 0.0
+    words = value.split()
+    whole_words = all(token in words for token in tokens)
+    if value == query:
+        base = 1.0
+    elif whole_words and value.startswith(query):
+        base = 0.9
+    elif whole_words:
+        base = 0.8
+    elif value.startswith(query):
+        base = 0.7
+    elif all(any(word.startswith(token) for word in words) for token in tokens):
+        base = 0.6
+    elif all(token in value for token in tokens):
+        base = 0.4
+    else:
+        return 0.0
+    # هر چه عبارت بخش بزرگ‌تری از مقدار را پوشش دهد رتبه بالاتر است
+    return round(base * (0.8 + 0.2 * min(len(query) / len(value), 1.0)), 4)
+
+
+def encode_offset(offset: int) -> str:
+    raw = json.dumps({"offset": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_offset(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded))["offset"]
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError
+        return offset
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+async def search(db: AsyncSession, q: str, types: Optional[set], offset: int, limit: int):
+    """
+    نتایج رتبه‌بندی شده از همه جداول: (صفحه نتایج، صفحه بعد وجود دارد؟، نتایج بریده شده‌اند؟).
+    از هر جدول حداکثر SEARCH_CANDIDATES ردیف منطبق (با ایندکس و مرتب با relevance) خوانده و در پایتون
+    رتبه‌بندی می‌شود؛ اگر جدولی بیشتر از آن منطبق داشته باشد، صفحه‌ای که به انتهای کاندیداها برسد
+    به جای «صفحه بعد وجود ندارد» بریده شدن نتایج را گزارش می‌کند.
+    """
+    query = normalize_text(q)
+    tokens = query.split()
+    if not tokens:
+        return [], False, False
+
+    hits = []
+    truncated = False
+    for target in TARGETS:
+        if types and target.type not in types:
+            continue
+        rows = await target.candidates(db, tokens, SEARCH_CANDIDATES + 1)
+        truncated |= len(rows) > SEARCH_CANDIDATES
+        hits.extend(target.hit(row, query, tokens) for row in rows[:SEARCH_CANDIDATES])
+
+    hits.sort(key=lambda hit: (-hit.score, len(hit.name), TYPE_ORDER[hit.type], hit.id))
+    more = len(hits) > offset + limit
+    return hits[offset:offset + limit], more, truncated and not more
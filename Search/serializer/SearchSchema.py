@@ -0,0 +1,21 @@
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class SearchType(str, Enum):
+    student = "student"
+    parent = "parent"
+    class_ = "class"
+
+
+class SearchHit(BaseModel):
+    type: SearchType
+    id: int
+    name: str
+    # توضیح کوتاه: نام معلم کلاس یا شماره تلفن والد
+    detail: Optional[str] = None
+    # ستونی که بهترین تطابق را داشته است (name، phone_number، teacher_name)
+    matched: str
+    score: float
@@ -0,0 +1,166 @@
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Integer, cast, func, select
+from typing import List, Optional
+from pydantic import TypeAdapter
+from ..summary import CLASS_VIEW, PARENT_VIEW, STATS_TAG, stats_summary
+from ..serializer.StatsSchema import AgeCount, ClassCount, GradeCount, ParentCount, StatsOverview, StatusCounts
+from Class.model import Class
+from Parent.model import Parent
+from Student.model import Student
+from Database.database import get_read_db
+from utils.pagination import PageParams, paginate
+from utils.cache import list_tag, response_cache
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+OVERVIEW_ADAPTER = TypeAdapter(StatsOverview)
+CLASS_COUNT_ADAPTER = TypeAdapter(List[ClassCount])
+PARENT_COUNT_ADAPTER = TypeAdapter(List[ParentCount])
+GRADE_COUNT_ADAPTER = TypeAdapter(List[GradeCount])
+AGE_COUNT_ADAPTER = TypeAdapter(List[AgeCount])
+
+# هر نوشتن روی یکی از جداول (یا بازسازی view) پاسخ‌های آماری کش شده را باطل می‌کند
+STATS_CACHE_TAGS = {STATS_TAG, list_tag(Student), list_tag(Parent), list_tag(Class)}
+
+
+def total(column):
+    # sum روی bigint در PostgreSQL مقدار numeric برمی‌گرداند
+    return cast(func.coalesce(func.sum(column), 0), Integer)
+
+
+def status_counts(rows) -> StatusCounts:
+    """تبدیل ردیف‌های (is_deleted, is_active, count) به شمارش وضعیت‌ها"""
+    counts = StatusCounts()
+    for is_deleted, is_active, count in rows:
+        if is_deleted:
+            counts.deleted += count
+        elif is_active:
+            counts.active += count
+        else:
+            counts.inactive += count
+        counts.total += count
+    return counts
+
+
+async def model_status_counts(db: AsyncSession, model) -> StatusCounts:
+    is_deleted = func.coalesce(model.is_deleted, False)
+    result = await db.execute(select(is_deleted, model.is_active, func.count()).group_by(is_deleted, model.is_active))
+    return status_counts(result.all())
+
+
+@router.get("/overview", response_model=StatsOverview)
+async def stats_overview(request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
+    """تعداد فعال / غیرفعال / حذف شده دانش‌آموزان، والدین و کلاس‌ها"""
+
+    async def load():
+        source = stats_summary.source(PARENT_VIEW)
+        result = await db.execute(
+            select(source.c.is_deleted, source.c.is_active, total(source.c.students))
+            .group_by(source.c.is_deleted, source.c.is_active)
+        )
+        return StatsOverview(
+            students=status_counts(result.all()),
+            parents=await model_status_counts(db, Parent),
+            classes=await model_status_counts(db, Class),
+        )
+
+    return await response_cache.serve(request, response, OVERVIEW_ADAPTER, load, tags=STATS_CACHE_TAGS)
+
+
+@router.get("/students/by-class", response_model=List[ClassCount])
+async def students_by_class(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+):
+    """تعداد دانش‌آموزان (حذف نشده) هر کلاس، شامل کلاس‌های خالی"""
+
+    async def load():
+        source = stats_summary.source(CLASS_VIEW)
+        counts = (
+            select(source.c.class_id, total(source.c.students).label("students"))
+            .where(source.c.is_deleted.is_(False))
+            .group_by(source.c.class_id)
+            .subquery()
+        )
+        stmt = (
+            select(Class.id, Class.name, func.coalesce(counts.c.students, 0).label("students"))
+            .outerjoin(counts, counts.c.class_id == Class.id)
+            .where(Class.is_deleted.is_(False))
+        )
+        return await paginate(db, stmt, Class.id, page, response, scalars=False)
+
+    return await response_cache.serve(request, response, CLASS_COUNT_ADAPTER, load, tags=STATS_CACHE_TAGS)
+
+
+@router.get("/students/by-parent", response_model=List[ParentCount])
+async def students_by_parent(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+):
+    """تعداد فرزندان (حذف نشده) هر والد"""
+
+    async def load():
+        source = stats_summary.source(PARENT_VIEW)
+        counts = (
+            select(source.c.parent_id, total(source.c.students).label("students"))
+            .where(source.c.is_deleted.is_(False))
+            .group_by(source.c.parent_id)
+            .subquery()
+        )
+        stmt = (
+            select(Parent.id, Parent.name, func.coalesce(counts.c.students, 0).label("students"))
+            .outerjoin(counts, counts.c.parent_id == Parent.id)
+            .where(Parent.is_deleted.is_(False))
+        )
+        return await paginate(db, stmt, Parent.id, page, response, scalars=False)
+
+    return await response_cache.serve(request, response, PARENT_COUNT_ADAPTER, load, tags=STATS_CACHE_TAGS)
+
+
+async def class_distribution(db: AsyncSession, key: str, class_id: Optional[int]):
+    source = stats_summary.source(CLASS_VIEW)
+    column = source.c[key]
+    stmt = (
+        select(column, total(source.c.students).label("students"))
+        .where(source.c.is_deleted.is_(False))
+        .group_by(column)
+        .order_by(column)
+    )
+    if class_id is not None:
+        stmt = stmt.where(source.c.class_id == class_id)
+    return (await db.execute(stmt)).all()
+
+
+@router.get("/students/by-grade", response_model=List[GradeCount])
+async def students_by_grade(
+        request: Request,
+        response: Response,
+        class_id: Optional[int] = None,
+        db: AsyncSession = Depends(get_read_db),
+):
+    """توزیع پایه تحصیلی دانش‌آموزان (کل مدرسه یا یک کلاس)"""
+
+    async def load():
+        return await class_distribution(db, "grade", class_id)
+
+    return await response_cache.serve(request, response, GRADE_COUNT_ADAPTER, load, tags=STATS_CACHE_TAGS)
+
+
+@router.get("/students/by-age", response_model=List[AgeCount])
+async def students_by_age(
+        request: Request,
+        response: Response,
+        class_id: Optional[int] = None,
+        db: AsyncSession = Depends(get_read_db),
+):
+    """هیستوگرام سنی دانش‌آموزان (کل مدرسه یا یک کلاس)"""
+
+    async def load():
+        return await class_distribution(db, "age", class_id)
+
+    return await response_cache.serve(request, response, AGE_COUNT_ADAPTER, load, tags=STATS_CACHE_TAGS)
@@ -0,0 +1,45 @@
+from pydantic import BaseModel, ConfigDict
+
+
+class StatusCounts(BaseModel):
+    # active: فعال و حذف نشده | inactive: غیرفعال و حذف نشده | deleted: حذف نرم شده
+    active: int = 0
+    inactive: int = 0
+    deleted: int = 0
+    total: int = 0
+
+
+class StatsOverview(BaseModel):
+    students: StatusCounts
+    parents: StatusCounts
+    classes: StatusCounts
+
+
+class ClassCount(BaseModel):
+    id: int
+    name: str
+    students: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ParentCount(BaseModel):
+    id: int
+    name: str
+    students: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class GradeCount(BaseModel):
+    grade: int
+    students: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AgeCount(BaseModel):
+    age: int
+    students: int
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy import column, func, literal, select, table, text
+
+from Database.database import engine
+from Student.model import Student
+from utils.cache import list_tag, response_cache
+from utils.config import env_float
+
+# live: GROUP BY مستقیم روی جدول students | materialized: خواندن از materialized view (فقط PostgreSQL)
+STATS_SOURCE = os.getenv("STATS_SOURCE", "live")
+# فاصله بین آخرین نوشتن و بازسازی view (چند نوشتن پشت سر هم یک بار بازسازی می‌شوند)
+STATS_REFRESH_DELAY = env_float("STATS_REFRESH_DELAY", 2.0)
+# برچسب کش پاسخ‌های آماری؛ بعد از هر بازسازی view باطل می‌شود
+STATS_TAG = "stats"
+
+logger = logging.getLogger("school_api.stats")
+
+CLASS_VIEW = "student_class_stats"
+PARENT_VIEW = "student_parent_stats"
+
+# ستون‌های گروه‌بندی هر view؛ ستون students تعداد دانش‌آموزان هر گروه است
+VIEW_COLUMNS = {
+    CLASS_VIEW: ("class_id", "grade", "age", "is_active"),
+    PARENT_VIEW: ("parent_id", "is_active"),
+}
+
+
+def view_ddl(name: str) -> list:
+    columns = ", ".join(VIEW_COLUMNS[name])
+    return [
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS "
+        f"SELECT {columns}, COALESCE(is_deleted, false) AS is_deleted, count(*) AS students "
+        f"FROM students GROUP BY {columns}, COALESCE(is_deleted, false)",
+        # REFRESH ... CONCURRENTLY به یک ایندکس یکتا روی همه ستون‌های گروه‌بندی نیاز دارد
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{name} ON {name} ({columns}, is_deleted)",
+    ]
+
+
+class StatsSummary:
+    """
+    منبع داده endpointهای آماری.
+    در حالت materialized، هر نوشتن روی دانش‌آموزان (که کش را باطل می‌کند) view را کهنه علامت می‌زند
+    و بازسازی با تاخیر و به صورت CONCURRENTLY (بدون قفل کردن خواندن‌ها) انجام می‌شود.
+    """
+
+    def __init__(self, engine, enabled: bool, delay: float = STATS_REFRESH_DELAY):
+        self.engine = engine
+        self.enabled = enabled
+        self.delay = delay
+        self.stale = False
+        self.refreshes = 0
+        self.refresh_time_total = 0.0
+        self._task = None
+
+    def source(self, view: str):
+        """زیرکوئری با ستون‌های گروه‌بندی view به همراه is_deleted و students"""
+        if self.enabled:
+            return table(view, *[column(name) for name in VIEW_COLUMNS[view]], column("is_deleted"), column("students"))
+        return select(
+            *[getattr(Student, name) for name in VIEW_COLUMNS[view]],
+            func.coalesce(Student.is_deleted, False).label("is_deleted"),
+            literal(1).label("students"),
+        ).subquery()
+
+    async def create(self, conn):
+        for name in VIEW_COLUMNS:
+            for ddl in view_ddl(name):
+                await conn.execute(text(ddl))
+
+    async def drop(self, conn):
+        for name in VIEW_COLUMNS:
+            await conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {name}"))
+
+    def on_invalidate(self, tags: set):
+        if self.enabled and list_tag(Student) in tags:
+            self.mark_stale()
+
+    def mark_stale(self):
+        self.stale = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_later())
+
+    async def _refresh_later(self):
+        # اگر در حین بازسازی نوشتن جدیدی انجام شود، حلقه یک بار دیگر اجرا می‌شود
+        while self.stale:
+            await asyncio.sleep(self.delay)
+            self.stale = False
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("refreshing stats views failed")
+
+    async def refresh(self):
+        start = time.perf_counter()
+        async with self.engine.begin() as conn:
+            for name in VIEW_COLUMNS:
+                await conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+        self.refreshes += 1
+        self.refresh_time_total += time.perf_counter() - start
+        await response_cache.invalidate(STATS_TAG)
+
+    async def wait(self):
+        """منتظر ماندن برای پایان بازسازی زمان‌بندی شده"""
+        if self._task is not None:
+            await self._task
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "source": "materialized" if self.enabled else "live",
+            "stale": self.stale,
+            "refreshes": self.refreshes,
+            "refresh_time_avg_ms": round(self.refresh_time_total / self.refreshes * 1000, 3) if self.refreshes else 0.0,
+        }
+
+
+stats_summary = StatsSummary(
+    engine,
+    enabled=STATS_SOURCE == "materialized" and engine.dialect.name == "postgresql",
+)
+if STATS_SOURCE == "materialized" and not stats_summary.enabled:
+    logger.warning("STATS_SOURCE=materialized requires PostgreSQL; falling back to live GROUP BY queries")
+
+response_cache.on_invalidate(stats_summary.on_invalidate)
@@ -1,33 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from typing import List
+from sqlalchemy import exists, insert, select, update
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
 from ..model import Student
 from ..serializer import StudentSchema
-from ..serializer.StudentSchema import StudentCreate, StudentUpdate, StudentResponse
-from Database.database import get_db
+from ..serializer.StudentSchema import StudentCreate, StudentUpdate, StudentResponse, StudentBatchUpdate
+from Database.database import get_db, get_read_db
 from Parent.model import Parent
 from Class.model import Class
+from utils.pagination import PageParams, paginate
+from utils.fields import FieldSelection, Projection
+from utils.export import ExportFormat, export_response
+from utils.cache import list_tag, response_cache, tags_for
+from utils.batch import (
+    BATCH_REQUEST_BODY, BatchDelete, BatchItemResult, batch_soft_delete, chunked, existing_ids,
+    null_required_fields, read_batch_items, resume_items, validate_items,
+)
+from Jobs.runner import JOBS_BATCH_THRESHOLD, JOBS_EXPORT_THRESHOLD, JobContext, accepted, exceeds, job_runner
+from Jobs.tasks import export_to_file, import_items
 
 router = APIRouter(prefix="/students", tags=["students"])
 
 
+# StudentResponse فقط نسخه Simple والد و کلاس را سریالایز می‌کند،
+# پس والد و کلاس با یک JOIN لود می‌شوند و لیست students آن‌ها هرگز لود نمی‌شود.
+# raiseload جلوی هر Lazy Load ناخواسته (و خطای MissingGreenlet) را می‌گیرد.
+STUDENT_RELATIONS = (
+    joinedload(Student.parent).raiseload("*"),
+    joinedload(Student.class_).raiseload("*"),
+)
+
+
+def join_simple(relation):
+    return joinedload(relation).raiseload("*")
+
+
+# والد و کلاس فقط در صورت درخواست (یا بدون fields/include) JOIN می‌شوند
+STUDENT_PROJECTION = Projection(Student, StudentResponse, {"parent": join_simple, "class_": join_simple})
+
+
 async def get_student_with_relations(db: AsyncSession, student_id: int):
     """
-    این تابع دانش‌آموز را به همراه والد و کلاس لود می‌کند.
-    نکته مهم: از Deep Loading استفاده شده تا لیست دانش‌آموزانِ والد و کلاس
-    نیز بارگذاری شوند تا از خطای MissingGreenlet در Pydantic جلوگیری شود.
+    این تابع دانش‌آموز را به همراه والد و کلاس در یک کوئری (JOIN) لود می‌کند.
     """
     result = await db.execute(
         select(Student)
-        .options(
-            # لود کردن والد و سپس لود کردن لیست دانش‌آموزان آن والد
-            selectinload(Student.parent).selectinload(Parent.students),
-            # لود کردن کلاس و سپس لود کردن لیست دانش‌آموزان آن کلاس
-            selectinload(Student.class_).selectinload(Class.students)
-        )
+        .options(*STUDENT_RELATIONS)
         .where(Student.id == student_id)
+        # بعد از UPDATE مستقیم، آبجکت موجود در Session با مقادیر جدید دیتابیس جایگزین می‌شود
+        .execution_options(populate_existing=True)
     )
     return result.scalar_one_or_none()
 
@@ -47,6 +69,9 @@ async def create_student(student: StudentSchema.StudentCreate, db: AsyncSession
     new_id = new_student.id
 
     await db.commit()
+    await response_cache.invalidate(
+        list_tag(Student), *tags_for(Parent, student.parent_id), *tags_for(Class, student.class_id)
+    )
 
     # بازیابی مجدد با روابط کامل
     fetched_student = await get_student_with_relations(db, new_id)
@@ -54,68 +79,297 @@ async def create_student(student: StudentSchema.StudentCreate, db: AsyncSession
     return fetched_student
 
 
+class StudentFilter:
+    """فیلترهای سمت سرور لیست و خروجی دانش‌آموزان که همگی در خود کوئری SQL اعمال می‌شوند"""
+
+    def __init__(
+            self,
+            grade: Optional[int] = Query(None, ge=1, le=12),
+            min_age: Optional[int] = Query(None, ge=0),
+            max_age: Optional[int] = Query(None, ge=0),
+            class_id: Optional[int] = None,
+            parent_id: Optional[int] = None,
+            is_deleted: bool = False,
+            is_active: Optional[bool] = None,
+    ):
+        self.grade = grade
+        self.min_age = min_age
+        self.max_age = max_age
+        self.class_id = class_id
+        self.parent_id = parent_id
+        self.is_deleted = is_deleted
+        self.is_active = is_active
+
+    def apply(self, stmt):
+        stmt = stmt.where(Student.is_deleted.is_(self.is_deleted))
+        if self.grade is not None:
+            stmt = stmt.where(Student.grade == self.grade)
+        if self.min_age is not None:
+            stmt = stmt.where(Student.age >= self.min_age)
+        if self.max_age is not None:
+            stmt = stmt.where(Student.age <= self.max_age)
+        if self.class_id is not None:
+            stmt = stmt.where(Student.class_id == self.class_id)
+        if self.parent_id is not None:
+            stmt = stmt.where(Student.parent_id == self.parent_id)
+        if self.is_active is not None:
+            stmt = stmt.where(Student.is_active.is_(self.is_active))
+        return stmt
+
+
 @router.get("/", response_model=List[StudentResponse])
-async def get_students(db: AsyncSession = Depends(get_db)):
+async def get_students(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        filters: StudentFilter = Depends(),
+        selection: FieldSelection = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+):
     """
-    لیست همه دانش‌آموزان را برمی‌گرداند.
-    روابط والد و کلاس به صورت Deep Load بارگذاری می‌شوند.
+    لیست دانش‌آموزان را به صورت صفحه‌بندی شده (Keyset) برمی‌گرداند.
+    روابط والد و کلاس در همان کوئری با JOIN بارگذاری می‌شوند.
+    با fields/include فقط ستون‌ها و روابط درخواست شده خوانده و سریالایز می‌شوند.
     """
-    result = await db.execute(
-        select(Student)
-        .options(
-            selectinload(Student.parent).selectinload(Parent.students),
-            selectinload(Student.class_).selectinload(Class.students)
-        )
-        .where(Student.is_deleted.is_(False))
-        .order_by(Student.id.desc())
+    fields = STUDENT_PROJECTION.select(selection)
+
+    stmt = filters.apply(select(Student))
+
+    async def load():
+        return await paginate(db, stmt.options(*STUDENT_PROJECTION.options(fields)), Student.id, page, response)
+
+    async def version():
+        return await STUDENT_PROJECTION.version(fields).page(db, stmt, page)
+
+    return await response_cache.serve(
+        request, response, STUDENT_PROJECTION.adapter(fields, many=True), load, version=version
     )
-    return result.scalars().all()
+
+
+def export_statement(filters: StudentFilter):
+    stmt = select(
+        Student.id, Student.name, Student.age, Student.grade, Student.parent_id, Student.class_id,
+        Student.is_active, Student.is_deleted, Student.created_at, Student.updated_at, Student.deleted_at,
+    ).order_by(Student.id)
+    return filters.apply(stmt)
+
+
+@router.get("/export")
+async def export_students(
+        fmt: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+        filters: StudentFilter = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+        write_db: AsyncSession = Depends(get_db),
+):
+    """
+    خروجی استریم کامل (NDJSON یا CSV) بدون بارگذاری همه ردیف‌ها در حافظه.
+    بیش از JOBS_EXPORT_THRESHOLD ردیف در کار پس‌زمینه در فایل نوشته می‌شود (202 و /jobs/{id}/download).
+    """
+    stmt = export_statement(filters)
+    if await exceeds(db, stmt, JOBS_EXPORT_THRESHOLD):
+        job = await job_runner.enqueue(write_db, "students.export", {"format": fmt.value, "filters": vars(filters)})
+        return accepted(job)
+    return export_response(db, stmt, fmt, "students")
+
+
+@job_runner.handler("students.export")
+async def export_students_job(ctx: JobContext) -> dict:
+    return await export_to_file(ctx, export_statement(StudentFilter(**ctx.params["filters"])), "students")
+
+
+def _relation_error(payload, parent_ids: set, class_ids: set):
+    if payload.parent_id is not None and payload.parent_id not in parent_ids:
+        return "Parent not found"
+    if payload.class_id is not None and payload.class_id not in class_ids:
+        return "Class not found"
+    return None
+
+
+async def import_students(db: AsyncSession, items: list, progress=None, start: int = 0) -> list:
+    """
+    ساخت گروهی دانش‌آموزان با INSERT چند ردیفی؛ وجود والد و کلاس برای هر chunk فقط با یک کوئری بررسی می‌شود.
+    progress (در کار پس‌زمینه) با اندیس آیتم بعدی در تراکنش هر chunk ثبت می‌شود و آیتم‌های قبل از start
+    (ثبت شده در تلاش قبلی) دوباره ساخته نمی‌شوند.
+    """
+    results = [None] * len(items)
+    valid = resume_items(validate_items(items, StudentCreate, results), results, start)
+
+    for chunk in chunked(valid):
+        parent_ids = await existing_ids(db, Parent, (s.parent_id for _, s in chunk))
+        class_ids = await existing_ids(db, Class, (s.class_id for _, s in chunk))
+
+        rows = []
+        for index, student in chunk:
+            error = _relation_error(student, parent_ids, class_ids)
+            if error:
+                results[index] = BatchItemResult(index=index, status="error", detail=error)
+            else:
+                rows.append((index, student.model_dump()))
+
+        if rows:
+            result = await db.execute(
+                insert(Student).returning(Student.id, sort_by_parameter_order=True),
+                [row for _, row in rows],
+            )
+            for (index, _), new_id in zip(rows, result.scalars().all()):
+                results[index] = BatchItemResult(index=index, status="created", id=new_id)
+        if progress is not None:
+            await progress(chunk[-1][0] + 1)
+        await db.commit()
+        await response_cache.invalidate(
+            list_tag(Student),
+            *tags_for(Parent, *{row["parent_id"] for _, row in rows}),
+            *tags_for(Class, *{row["class_id"] for _, row in rows}),
+        )
+
+    return results
+
+
+@router.post("/batch", response_model=List[BatchItemResult], openapi_extra=BATCH_REQUEST_BODY)
+async def create_students_batch(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    ساخت گروهی دانش‌آموزان (آرایه JSON یا NDJSON).
+    بیش از JOBS_BATCH_THRESHOLD آیتم در کار پس‌زمینه اجرا می‌شود (202 و وضعیت در /jobs/{id}).
+    """
+    items = await read_batch_items(request)
+    if len(items) > JOBS_BATCH_THRESHOLD:
+        return accepted(await job_runner.enqueue(db, "students.import", {"items": items}))
+    return await import_students(db, items)
+
+
+@job_runner.handler("students.import")
+async def import_students_job(ctx: JobContext) -> list:
+    return await import_items(ctx, import_students)
+
+
+@router.patch("/batch", response_model=List[BatchItemResult], openapi_extra=BATCH_REQUEST_BODY)
+async def update_students_batch(request: Request, db: AsyncSession = Depends(get_db)):
+    """آپدیت جزئی گروهی دانش‌آموزان با UPDATE دسته‌ای بر اساس کلید اصلی"""
+    items = await read_batch_items(request)
+    results = [None] * len(items)
+    valid = validate_items(items, StudentBatchUpdate, results)
+
+    for chunk in chunked(valid):
+        student_ids = await existing_ids(db, Student, (s.id for _, s in chunk))
+        parent_ids = await existing_ids(db, Parent, (s.parent_id for _, s in chunk))
+        class_ids = await existing_ids(db, Class, (s.class_id for _, s in chunk))
+
+        params = []
+        for index, student in chunk:
+            data = student.model_dump(exclude_unset=True)
+            nulls = null_required_fields(data, ("name", "age", "grade"))
+            if student.id not in student_ids:
+                error = "Student not found"
+            elif nulls:
+                error = f"Field '{nulls[0]}' cannot be null."
+            else:
+                error = _relation_error(student, parent_ids, class_ids)
+
+            if error:
+                results[index] = BatchItemResult(index=index, status="error", id=student.id, detail=error)
+                continue
+            if len(data) > 1:
+                params.append(data)
+            results[index] = BatchItemResult(index=index, status="updated", id=student.id)
+
+        if params:
+            await db.execute(update(Student), params)
+        await db.commit()
+        await response_cache.invalidate(
+            list_tag(Student),
+            *tags_for(Student, *(row["id"] for row in params)),
+            *tags_for(Parent, *{row.get("parent_id") for row in params}),
+            *tags_for(Class, *{row.get("class_id") for row in params}),
+        )
+
+    return results
+
+
+@router.post("/batch/delete", response_model=List[BatchItemResult])
+async def delete_students_batch(payload: BatchDelete, db: AsyncSession = Depends(get_db)):
+    return await batch_soft_delete(db, Student, payload.ids)
 
 
 @router.get("/{student_id}", response_model=StudentResponse)
-async def get_student(student_id: int, db: AsyncSession = Depends(get_db)):
-    student = await get_student_with_relations(db, student_id)
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    return student
+async def get_student(
+        student_id: int,
+        request: Request,
+        response: Response,
+        selection: FieldSelection = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+):
+    fields = STUDENT_PROJECTION.select(selection)
+
+    async def load():
+        result = await db.execute(
+            select(Student).options(*STUDENT_PROJECTION.options(fields)).where(Student.id == student_id)
+        )
+        student = result.scalar_one_or_none()
+        if not student:
+            raise HTTPException(status_code=404, detail="Student not found")
+        return student
 
+    async def version():
+        return await STUDENT_PROJECTION.version(fields).item(db, student_id)
 
-@router.patch("/{student_id}", response_model=StudentResponse)
-async def update_student_partial(student_id: int, payload: StudentUpdate, db: AsyncSession = Depends(get_db)):
-    student = await get_student_with_relations(db, student_id)
-    if not student or student.is_deleted:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
+    return await response_cache.serve(request, response, STUDENT_PROJECTION.adapter(fields), load, version=version)
 
-    update_data = payload.model_dump(exclude_unset=True)
 
-    if "parent_id" in update_data and update_data["parent_id"] is not None:
-        parent_result = await db.execute(
-            select(Parent).where(Parent.id == update_data["parent_id"], Parent.is_deleted.is_(False)))
-        if not parent_result.scalars().first():
-            raise HTTPException(status_code=404, detail="Parent not found")
+def _active(model, item_id):
+    return exists().where(model.id == item_id, model.is_deleted.is_(False))
 
-    if "class_id" in update_data and update_data["class_id"] is not None:
-        class_result = await db.execute(
-            select(Class).where(Class.id == update_data["class_id"], Class.is_deleted.is_(False)))
-        if not class_result.scalars().first():
-            raise HTTPException(status_code=404, detail="Class not found")
 
-    for key, value in update_data.items():
-        setattr(student, key, value)
+async def _write_error(db: AsyncSession, student_id: int, values: dict) -> Optional[HTTPException]:
+    """علت رد شدن نوشتن (دانش‌آموز، والد یا کلاس ناموجود) با یک کوئری EXISTS ترکیبی"""
+    checks = [("Student not found", _active(Student, student_id))]
+    if values.get("parent_id") is not None:
+        checks.append(("Parent not found", _active(Parent, values["parent_id"])))
+    if values.get("class_id") is not None:
+        checks.append(("Class not found", _active(Class, values["class_id"])))
+    row = (await db.execute(select(*[check for _, check in checks]))).one()
+    for (detail, _), found in zip(checks, row):
+        if not found:
+            return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+    return None
+
+
+async def write_student(db: AsyncSession, student_id: int, values: dict):
+    """
+    آپدیت دانش‌آموز با یک UPDATE ... RETURNING که وجود خود دانش‌آموز و والد و کلاس جدید در WHERE آن
+    بررسی می‌شود، سپس پاسخ با یک خواندن JOIN شده در همان تراکنش ساخته می‌شود.
+    فقط وقتی ردیفی آپدیت نشود، علت خطا با یک کوئری جداگانه مشخص می‌شود.
+    """
+    if values:
+        conditions = [Student.id == student_id, Student.is_deleted.is_(False)]
+        if values.get("parent_id") is not None:
+            conditions.append(_active(Parent, values["parent_id"]))
+        if values.get("class_id") is not None:
+            conditions.append(_active(Class, values["class_id"]))
+        stmt = update(Student).where(*conditions).values(**values).returning(Student.id)
+        updated = (await db.execute(stmt.execution_options(synchronize_session=False))).first()
+    else:
+        updated = None
+    if updated is None:
+        error = await _write_error(db, student_id, values)
+        if error:
+            raise error
 
+    student = await get_student_with_relations(db, student_id)
     await db.commit()
+    await response_cache.invalidate(
+        list_tag(Student), *tags_for(Student, student_id),
+        *tags_for(Parent, student.parent_id), *tags_for(Class, student.class_id),
+    )
+    return student
 
-    db.expire(student)
-    refreshed_student = await get_student_with_relations(db, student_id)
-    return refreshed_student
+
+@router.patch("/{student_id}", response_model=StudentResponse)
+async def update_student_partial(student_id: int, payload: StudentUpdate, db: AsyncSession = Depends(get_db)):
+    return await write_student(db, student_id, payload.model_dump(exclude_unset=True))
 
 
 @router.put("/{student_id}", response_model=StudentResponse)
 async def update_student_full(student_id: int, payload: StudentUpdate, db: AsyncSession = Depends(get_db)):
-    student = await get_student_with_relations(db, student_id)
-    if not student or student.is_deleted:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
-
     update_data = payload.model_dump(exclude_unset=False)
 
     required_fields = ["name", "age", "grade"]
@@ -126,39 +380,16 @@ async def update_student_full(student_id: int, payload: StudentUpdate, db: Async
                 detail=f"Field '{field}' cannot be null in a PUT request."
             )
 
-    if update_data.get("parent_id") is not None:
-        parent_result = await db.execute(
-            select(Parent).where(Parent.id == update_data["parent_id"], Parent.is_deleted.is_(False)))
-        if not parent_result.scalars().first():
-            raise HTTPException(status_code=404, detail="Parent not found")
-
-    if update_data.get("class_id") is not None:
-        class_result = await db.execute(
-            select(Class).where(Class.id == update_data["class_id"], Class.is_deleted.is_(False)))
-        if not class_result.scalars().first():
-            raise HTTPException(status_code=404, detail="Class not found")
-
-    for key, value in update_data.items():
-        setattr(student, key, value)
-
-    await db.commit()
-
-    db.expire(student)
-    refreshed_student = await get_student_with_relations(db, student_id)
-    return refreshed_student
+    return await write_student(db, student_id, update_data)
 
 
 @router.delete("/{student_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def soft_delete_student(student_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Student).where(Student.id == student_id, Student.is_deleted.is_(False))
-    )
-    student = result.scalar_one_or_none()
-
-    if not student:
+    if not await Student.bulk_soft_delete(db, Student.id == student_id):
         raise HTTPException(status_code=404, detail="Student not found")
 
-    await student.soft_delete(db)
+    await db.commit()
+    await response_cache.invalidate(list_tag(Student), *tags_for(Student, student_id))
     return None
 
 
@@ -176,7 +407,9 @@ async def restore_student(student_id: int, db: AsyncSession = Depends(get_db)):
         if student.class_ and student.class_.is_deleted:
             raise HTTPException(status_code=400, detail="Cannot restore student because their Class is deleted.")
 
-        await student.restore(db)
+        await Student.bulk_restore(db, Student.id == student_id)
+        await db.commit()
+        await response_cache.invalidate(list_tag(Student), *tags_for(Student, student_id))
 
         db.expire(student)
         return await get_student_with_relations(db, student_id)
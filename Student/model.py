@@ -1,19 +1,33 @@
 from sqlalchemy import Column, String, Integer, ForeignKey
 from sqlalchemy.orm import relationship
-from utils.base_model import TimestampMixin, SoftDeleteMixin
+from utils.base_model import TimestampMixin, SoftDeleteMixin, changed_at_index, not_deleted_index
+from utils.text_search import search_index
 from Database.database import Base
 
 
 class Student(Base, TimestampMixin, SoftDeleteMixin):
     __tablename__ = "students"
+    __table_args__ = (
+        # لیست‌ها و cascadeها روی ردیف‌های حذف نشده با مرتب‌سازی بر اساس id
+        not_deleted_index("ix_students_class_id_not_deleted", "class_id", "id"),
+        not_deleted_index("ix_students_parent_id_not_deleted", "parent_id", "id"),
+        not_deleted_index("ix_students_grade_not_deleted", "grade", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
     age = Column(Integer, nullable=False)
-    grade = Column(Integer, nullable=False)
+    grade = Column(Integer, nullable=False, index=True)
 
-    parent_id = Column(Integer, ForeignKey("parents.id", ondelete="CASCADE"))
-    class_id = Column(Integer, ForeignKey("classes.id", ondelete="CASCADE"))
+    parent_id = Column(Integer, ForeignKey("parents.id", ondelete="CASCADE"), index=True)
+    class_id = Column(Integer, ForeignKey("classes.id", ondelete="CASCADE"), index=True)
 
     parent = relationship("Parent", back_populates="students")
     class_ = relationship("Class", back_populates="students")
+
+
+# فید تغییرات /sync: WHERE (changed_at, id) > (:since, :id) ORDER BY changed_at, id
+changed_at_index(Student)
+
+# جستجوی /search روی کلمات نرمال شده (فقط PostgreSQL)
+search_index(Student, Student.name)
@@ -29,6 +29,11 @@ class StudentUpdate(BaseModel):
         return v
 
 
+# --- آیتم‌های درخواست batch آپدیت (شناسه + فیلدهای Update) ---
+class StudentBatchUpdate(StudentUpdate):
+    id: int
+
+
 class StudentResponse(BaseModel):
     id: int
     name: str
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from ..feed import SYNC_DEFAULT_LIMIT, SYNC_MAX_LIMIT, changes_since
+from ..serializer.SyncSchema import SyncResponse
+from Database.database import get_db
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.get("", response_model=SyncResponse)
+async def sync(
+        since: Optional[str] = Query(None, description="Token from the previous response's `next` field"),
+        limit: int = Query(SYNC_DEFAULT_LIMIT, ge=1, le=SYNC_MAX_LIMIT, description="Max rows per table"),
+        # از Primary: با Replica عقب مانده، horizon از ردیف‌های commit شده‌ای که هنوز نرسیده‌اند جلو می‌زد
+        db: AsyncSession = Depends(get_db),
+):
+    """
+    فید تغییرات (Delta Sync): ردیف‌های ساخته، ویرایش، حذف نرم یا بازیابی شده بعد از توکن since.
+    بدون since همه ردیف‌ها برگردانده می‌شوند. تا وقتی has_more برابر true است، درخواست بعدی
+    با توکن next بلافاصله ارسال شود؛ ممکن است چند ردیف اخیر دوباره ارسال شوند (اعمال با id تکرارپذیر است).
+    """
+    return await changes_since(db, since, limit)
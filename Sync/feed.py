@@ -0,0 +1,113 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, func, literal, select, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Class.model import Class
+from Parent.model import Parent
+from Student.model import Student
+from utils.base_model import changed_at
+from utils.config import env_float, env_int
+
+# تغییرات این چند ثانیه آخر در درخواست بعدی دوباره ارسال می‌شوند تا ردیف‌های تراکنش‌هایی که
+# قبل از خواندن شروع شده‌اند (now() زمان شروع تراکنش است) ولی بعد از آن commit شده‌اند از دست نروند.
+# horizon با ساعت خود دیتابیس (همان ساعتی که changed_at را می‌نویسد) و روی Primary محاسبه می‌شود،
+# پس اختلاف ساعت سرور برنامه یا تاخیر Replica تغییری را برای همیشه جا نمی‌اندازد
+SYNC_OVERLAP_SECONDS = env_float("SYNC_OVERLAP_SECONDS", 5.0)
+SYNC_DEFAULT_LIMIT = env_int("SYNC_DEFAULT_LIMIT", 500)
+SYNC_MAX_LIMIT = env_int("SYNC_MAX_LIMIT", 5000)
+
+# ترتیب جداول در پاسخ و توکن
+FEED_MODELS = (Class, Parent, Student)
+
+
+def encode_token(positions: dict) -> str:
+    data = {table: [ts.isoformat(), row_id] for table, (ts, row_id) in positions.items()}
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token: Optional[str]) -> dict:
+    """جایگاه هر جدول (changed_at, id)؛ توکن خالی یعنی همگام‌سازی کامل از ابتدا"""
+    if not token:
+        return {}
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        positions = {}
+        for model in FEED_MODELS:
+            if model.__tablename__ in data:
+                ts, row_id = data[model.__tablename__]
+                ts = datetime.fromisoformat(ts)
+                if ts.tzinfo is None or not isinstance(row_id, int):
+                    raise ValueError
+                positions[model.__tablename__] = (ts, row_id)
+        return positions
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid sync token")
+
+
+def as_utc(ts: datetime) -> datetime:
+    # SQLite زمان‌ها را (به UTC) بدون منطقه زمانی برمی‌گرداند
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+async def table_changes(db: AsyncSession, model, position: Optional[tuple], limit: int):
+    """
+    ردیف‌های تغییر کرده بعد از position به ترتیب (changed_at, id) با کوئری Keyset روی ایندکس
+    ix_<table>_changed_at. خروجی: (ردیف‌ها، جایگاه آخرین ردیف، تغییرات بیشتری مانده است؟)
+    """
+    changed = changed_at(model)
+    stmt = (
+        select(*model.__table__.columns, changed.label("changed_at"))
+        .order_by(changed, model.id)
+        .limit(limit + 1)
+    )
+    if position is not None:
+        ts, row_id = position
+        stmt = stmt.where(tuple_(changed, model.id) > tuple_(literal(ts, DateTime(timezone=True)), literal(row_id)))
+
+    rows = (await db.execute(stmt)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        position = (as_utc(rows[-1].changed_at), rows[-1].id)
+    return rows, position, more
+
+
+def next_position(position: Optional[tuple], more: bool, horizon: datetime) -> tuple:
+    """بعد از رسیدن به انتهای فید، جایگاه حداکثر تا horizon (اکنون منهای پنجره همپوشانی) جلو می‌رود"""
+    if more:
+        return position
+    if position is None or position[0] > horizon:
+        return horizon, 0
+    return position
+
+
+async def database_now(db: AsyncSession) -> datetime:
+    """زمان فعلی ساعت دیتابیس (clock_timestamp در PostgreSQL، نه زمان شروع تراکنش)"""
+    clock = func.clock_timestamp() if db.bind.dialect.name == "postgresql" else func.now()
+    # type_coerce نه CAST: در SQLite عبارت CAST(... AS DATETIME) فقط عدد سال را برمی‌گرداند
+    return as_utc(await db.scalar(select(type_coerce(clock, DateTime(timezone=True)))))
+
+
+async def changes_since(db: AsyncSession, token: Optional[str], limit: int) -> dict:
+    """db باید روی Primary باشد؛ ردیف‌های هنوز نرسیده به Replica زیر horizon برای همیشه جا می‌ماندند"""
+    positions = decode_token(token)
+    # قبل از خواندن جداول: هر ردیفی که بعد از آن commit شود changed_at بزرگ‌تر (یا در پنجره همپوشانی) دارد
+    horizon = await database_now(db) - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+    result = {"has_more": False}
+    for model in FEED_MODELS:
+        table = model.__tablename__
+        rows, position, more = await table_changes(db, model, positions.get(table), limit)
+        result[table] = rows
+        result["has_more"] |= more
+        positions[table] = next_position(position, more, horizon)
+
+    result["next"] = encode_token(positions)
+    return result
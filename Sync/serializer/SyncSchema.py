@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class ChangeRecord(BaseModel):
+    # ردیف کامل (بدون روابط تو در تو)؛ ردیف‌های حذف نرم شده با is_deleted=true برگردانده می‌شوند
+    id: int
+    is_active: bool
+    is_deleted: Optional[bool] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    deleted_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ClassChange(ChangeRecord):
+    name: str
+    teacher_name: str
+
+
+class ParentChange(ChangeRecord):
+    name: str
+    phone_number: str
+
+
+class StudentChange(ChangeRecord):
+    name: str
+    age: int
+    grade: int
+    parent_id: Optional[int] = None
+    class_id: Optional[int] = None
+
+
+class SyncResponse(BaseModel):
+    # ترتیب جداول طوری است که ردیف‌های مرجع (کلاس و والد) قبل از دانش‌آموزان اعمال شوند
+    classes: List[ClassChange]
+    parents: List[ParentChange]
+    students: List[StudentChange]
+    # توکن درخواست بعدی (پارامتر since)
+    next: str
+    # true یعنی تغییرات بیشتری باقی مانده و درخواست بعدی باید بلافاصله ارسال شود
+    has_more: bool
@@ -1,3 +1,4 @@
+import json
 import pytest
 import random
 import string
@@ -237,3 +238,1066 @@ async def test_10_full_restore_cycle(auth_client: AsyncClient):
     assert res_s.status_code == 200
     assert res_s.json()["is_deleted"] is False
     assert res_s.json()["is_active"] is True
+
+
+@pytest.mark.asyncio
+async def test_11_students_keyset_pagination(auth_client: AsyncClient):
+    """
+    تست صفحه‌بندی Keyset:
+    صفحه‌ها بدون هم‌پوشانی و به ترتیب نزولی id برگردانده می‌شوند
+    و کرسر صفحه بعد در هدر X-Next-Cursor قرار می‌گیرد.
+    """
+    ids = []
+    for i in range(5):
+        s_res = await auth_client.post("/students/", json={"name": f"Page_{i}", "age": 10, "grade": 3})
+        ids.append(s_res.json()["id"])
+
+    first = await auth_client.get("/students/", params={"limit": 2})
+    assert first.status_code == 200
+    assert [s["id"] for s in first.json()] == sorted(ids, reverse=True)[:2]
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = await auth_client.get("/students/", params={"limit": 2, "cursor": cursor})
+    assert [s["id"] for s in second.json()] == sorted(ids, reverse=True)[2:4]
+
+    last = await auth_client.get("/students/", params={"limit": 2, "cursor": second.headers["X-Next-Cursor"]})
+    assert len(last.json()) == 1
+    assert "X-Next-Cursor" not in last.headers
+
+    bad = await auth_client.get("/students/", params={"cursor": "not-a-cursor"})
+    assert bad.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_12_students_list_filters(auth_client: AsyncClient):
+    """تست فیلترهای سمت سرور روی لیست دانش‌آموزان (پایه، بازه سنی، کلاس)"""
+    c_res = await auth_client.post("/classes/", json={"name": "Filter_Class", "teacher_name": "Teacher_F"})
+    class_id = c_res.json()["id"]
+
+    await auth_client.post("/students/", json={"name": "Filter_A", "age": 8, "grade": 2, "class_id": class_id})
+    await auth_client.post("/students/", json={"name": "Filter_B", "age": 14, "grade": 8, "class_id": class_id})
+    await auth_client.post("/students/", json={"name": "Filter_C", "age": 14, "grade": 8})
+
+    by_class = await auth_client.get("/students/", params={"class_id": class_id})
+    assert {s["name"] for s in by_class.json()} == {"Filter_A", "Filter_B"}
+
+    by_grade_age = await auth_client.get("/students/", params={"grade": 8, "min_age": 12, "max_age": 15})
+    assert {s["name"] for s in by_grade_age.json()} == {"Filter_B", "Filter_C"}
+
+
+@pytest.mark.asyncio
+async def test_13_internal_pool_stats(auth_client: AsyncClient):
+    """تست endpoint داخلی آمار Connection Pool"""
+    response = await auth_client.get("/internal/db/pool")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["pool_class"] == "InstrumentedQueuePool"
+    for key in ("size", "checked_out", "overflow", "waiting", "connect_time_avg_ms"):
+        assert key in data
+
+    # فقط اتصال‌گیری‌ای که با پر بودن Pool و overflow منتظر می‌ماند انتظار شمرده می‌شود
+    import asyncio
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from Database.database import InstrumentedQueuePool, pool_stats
+    from Test.conftest import TEST_DATABASE_URL
+
+    engine = create_async_engine(TEST_DATABASE_URL, poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0)
+    checkouts, waits = pool_stats.checkouts, pool_stats.waits
+    try:
+        for _ in range(3):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        assert (pool_stats.checkouts - checkouts, pool_stats.waits - waits) == (3, 0)
+
+        async def hold():
+            async with engine.connect():
+                await asyncio.sleep(0.05)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        async with engine.connect():
+            assert pool_stats.waits - waits == 1 and pool_stats.waiting == 0
+        await holder
+        assert pool_stats.wait_time_max >= 0.03
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_14_student_loading_does_not_grow_with_class_size(auth_client: AsyncClient, async_db, query_counter):
+    """
+    بنچمارک رگرسیون:
+    تعداد کوئری‌ها و ردیف‌های لود شده برای دریافت دانش‌آموز نباید با بزرگ شدن
+    کلاس یا تعداد فرزندان والد افزایش یابد (بدون لود همکلاسی‌ها و خواهر/برادرها).
+    """
+    p_res = await auth_client.post("/parents/", json={"name": "Bench_Parent", "phone_number": random_phone()})
+    c_res = await auth_client.post("/classes/", json={"name": "Bench_Class", "teacher_name": "Bench_Teacher"})
+    student = {"age": 10, "grade": 4, "parent_id": p_res.json()["id"], "class_id": c_res.json()["id"]}
+    s_res = await auth_client.post("/students/", json={"name": "Bench_Student", **student})
+    student_id = s_res.json()["id"]
+    # یک همکلاسی تا صفحه لیست (limit + 1 ردیف) در هر دو اندازه پر باشد
+    await auth_client.post("/students/", json={"name": "Bench_Mate", **student})
+
+    async def measure(url, **params):
+        async_db.expunge_all()
+        query_counter.reset()
+        response = await auth_client.get(url, params=params)
+        assert response.status_code == 200
+        return query_counter.queries, query_counter.rows
+
+    small_detail = await measure(f"/students/{student_id}")
+    small_list = await measure("/students/", class_id=c_res.json()["id"], limit=1)
+
+    for i in range(25):
+        await auth_client.post("/students/", json={"name": f"Bench_Mate_{i}", **student})
+
+    assert await measure(f"/students/{student_id}") == small_detail
+    assert await measure("/students/", class_id=c_res.json()["id"], limit=1) == small_list
+    assert small_detail == (1, 3)
+    assert small_list == (1, 4)
+
+
+@pytest.mark.asyncio
+async def test_15_class_cascade_is_set_based(auth_client: AsyncClient, query_counter):
+    """
+    تست حذف و بازیابی آبشاری کلاس:
+    همه دانش‌آموزان با یک UPDATE تغییر می‌کنند و تعداد کوئری‌ها به اندازه کلاس وابسته نیست.
+    """
+    async def cascade_queries(size):
+        c_res = await auth_client.post("/classes/", json={"name": f"Cascade_{size}", "teacher_name": "Teacher_C"})
+        class_id = c_res.json()["id"]
+        for i in range(size):
+            await auth_client.post("/students/", json={"name": f"Cascade_S{i}", "age": 9, "grade": 3,
+                                                       "class_id": class_id})
+
+        query_counter.reset()
+        assert (await auth_client.delete(f"/classes/{class_id}")).status_code == 204
+        delete_queries = query_counter.queries
+
+        deleted = await auth_client.get("/students/", params={"class_id": class_id, "is_deleted": True})
+        assert len(deleted.json()) == size
+
+        query_counter.reset()
+        restored = await auth_client.post(f"/classes/{class_id}/restore")
+        assert restored.status_code == 200
+        assert restored.json()["is_deleted"] is False
+        assert len(restored.json()["students"]) == size
+        assert all(not s["is_deleted"] for s in
+                   (await auth_client.get("/students/", params={"class_id": class_id})).json())
+        return delete_queries, query_counter.queries
+
+    assert await cascade_queries(2) == await cascade_queries(20)
+    assert (await auth_client.delete("/classes/999999")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_16_batch_create_update_delete(auth_client: AsyncClient):
+    """
+    تست endpointهای batch:
+    ساخت گروهی (با upsert روی شماره والد)، آپدیت گروهی و حذف گروهی با نتیجه برای هر آیتم.
+    """
+    phone = random_phone()
+    p_res = await auth_client.post("/parents/batch", json=[
+        {"name": "Batch_Parent", "phone_number": phone},
+        {"name": "Batch_Parent_2", "phone_number": random_phone()},
+        {"name": "x", "phone_number": "123"},
+    ])
+    assert p_res.status_code == 200
+    parents = p_res.json()
+    assert [r["status"] for r in parents] == ["created", "created", "error"]
+
+    upsert = await auth_client.post("/parents/batch", json=[{"name": "Batch_Renamed", "phone_number": phone}])
+    assert upsert.json()[0] == {"index": 0, "status": "updated", "id": parents[0]["id"], "detail": None}
+
+    ndjson = "\n".join([
+        '{"name": "Batch_S1", "age": 10, "grade": 4, "parent_id": %d}' % parents[0]["id"],
+        '{"name": "Batch_S2", "age": 11, "grade": 5, "parent_id": 999999}',
+        '{"name": "Batch_S3", "age": 12, "grade": 6}',
+    ])
+    s_res = await auth_client.post("/students/batch", content=ndjson,
+                                   headers={"Content-Type": "application/x-ndjson"})
+    students = s_res.json()
+    assert [r["status"] for r in students] == ["created", "error", "created"]
+    assert students[1]["detail"] == "Parent not found"
+
+    u_res = await auth_client.patch("/students/batch", json=[
+        {"id": students[0]["id"], "grade": 7},
+        {"id": students[2]["id"], "name": None},
+        {"id": 999999, "grade": 7},
+    ])
+    assert [r["status"] for r in u_res.json()] == ["updated", "error", "error"]
+
+    d_res = await auth_client.post("/parents/batch/delete", json={"ids": [parents[0]["id"], 999999]})
+    assert [r["status"] for r in d_res.json()] == ["deleted", "not_found"]
+
+    deleted = await auth_client.get("/students/", params={"parent_id": parents[0]["id"], "is_deleted": True})
+    assert [s["id"] for s in deleted.json()] == [students[0]["id"]]
+
+    # upsert روی والد حذف شده آن را آپدیت (یا بی‌صدا بازیابی) نمی‌کند
+    again = await auth_client.post("/parents/batch", json=[
+        {"name": "Batch_Revived", "phone_number": phone},
+        {"name": "Batch_Parent_3", "phone_number": random_phone()},
+    ])
+    assert again.json()[0] == {"index": 0, "status": "error", "id": parents[0]["id"], "detail": "Parent is deleted"}
+    assert again.json()[1]["status"] == "created"
+    deleted = await auth_client.get("/parents/", params={"is_deleted": True})
+    assert [(p["id"], p["name"]) for p in deleted.json()] == [(parents[0]["id"], "Batch_Renamed")]
+
+
+@pytest.mark.asyncio
+async def test_17_export_streams_ndjson_and_csv(auth_client: AsyncClient):
+    """تست خروجی استریم دانش‌آموزان در دو فرمت NDJSON و CSV همراه با تاریخ شمسی"""
+    c_res = await auth_client.post("/classes/", json={"name": "Export_Class", "teacher_name": "Teacher_E"})
+    class_id = c_res.json()["id"]
+    for i in range(3):
+        await auth_client.post("/students/", json={"name": f"Export_{i}", "age": 10, "grade": 4,
+                                                   "class_id": class_id})
+
+    ndjson = await auth_client.get("/students/export", params={"class_id": class_id})
+    assert ndjson.status_code == 200
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [r["name"] for r in rows] == ["Export_0", "Export_1", "Export_2"]
+    assert rows[0]["created_at_fa"] != "-"
+    assert rows[0]["deleted_at_fa"] == "-"
+
+    csv_res = await auth_client.get("/students/export", params={"class_id": class_id, "format": "csv"})
+    lines = csv_res.text.splitlines()
+    assert lines[0].startswith("id,name,age,grade,parent_id,class_id")
+    assert len(lines) == 4
+
+    classes = await auth_client.get("/classes/export", params={"format": "csv", "is_deleted": False})
+    assert "Export_Class" in classes.text
+
+
+@pytest.mark.asyncio
+async def test_18_response_cache_hits_and_invalidation(auth_client: AsyncClient):
+    """
+    تست کش پاسخ‌ها:
+    درخواست تکراری از کش خوانده می‌شود و آپدیت یا حذف آبشاری والد، پاسخ‌های وابسته را باطل می‌کند.
+    """
+    p_res = await auth_client.post("/parents/", json={"name": "Cache_Parent", "phone_number": random_phone()})
+    parent_id = p_res.json()["id"]
+    s_res = await auth_client.post("/students/", json={"name": "Cache_Student", "age": 10, "grade": 4,
+                                                       "parent_id": parent_id})
+    student_id = s_res.json()["id"]
+
+    before = (await auth_client.get("/internal/cache")).json()
+    first = await auth_client.get(f"/students/{student_id}")
+    second = await auth_client.get(f"/students/{student_id}")
+    assert first.content == second.content
+    after = (await auth_client.get("/internal/cache")).json()
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+    await auth_client.patch(f"/parents/{parent_id}", json={"name": "Cache_Renamed"})
+    assert (await auth_client.get(f"/students/{student_id}")).json()["parent"]["name"] == "Cache_Renamed"
+
+    await auth_client.get("/students/", params={"parent_id": parent_id})
+    await auth_client.delete(f"/parents/{parent_id}")
+    assert (await auth_client.get("/students/", params={"parent_id": parent_id})).json() == []
+    assert (await auth_client.get(f"/students/{student_id}")).json()["is_deleted"] is True
+
+
+@pytest.mark.asyncio
+async def test_19_redis_cache_backend_with_fake(fake_redis):
+    """تست بک‌اند Redis کش با یک Redis جعلی محلی"""
+    from utils.cache import RedisCacheBackend
+
+    backend = RedisCacheBackend(fake_redis, ttl=30)
+    await backend.set("/students/1?", {"body": b"{}", "headers": {}}, {"students:1", "parents:2"})
+    await backend.set("/parents/2?", {"body": b"{}", "headers": {}}, {"parents:2"})
+    assert await backend.get("/students/1?") == {"body": b"{}", "headers": {}}
+
+    await backend.invalidate({"parents:2"})
+    assert await backend.get("/students/1?") is None
+    assert await backend.get("/parents/2?") is None
+
+
+def test_20_fast_jalali_matches_jdatetime():
+    """تست صحت مسیر سریع تاریخ شمسی در برابر پیاده‌سازی قبلی (بازه وسیع، سال کبیسه و تاریخ naive)"""
+    from datetime import datetime, timedelta, timezone
+    from Benchmark.bench_jalali import legacy_to_jalali_tehran
+    from utils.base_model import to_jalali_tehran
+
+    rng = random.Random(8)
+    start = datetime(1950, 1, 1, tzinfo=timezone.utc)
+    values = [start + timedelta(seconds=rng.randrange(150 * 365 * 86400)) for _ in range(5000)]
+    values += [datetime(2025, 3, 20, 20, 29), datetime(2025, 3, 20, 20, 30), datetime(1969, 12, 31, 23, 59), None]
+
+    for value in values:
+        assert to_jalali_tehran(value) == legacy_to_jalali_tehran(value)
+
+
+@pytest.mark.asyncio
+async def test_21_verified_token_cache(auth_client: AsyncClient):
+    """
+    تست کش توکن‌های تایید شده:
+    توکن تکراری بدون decode دوباره پذیرفته می‌شود و توکن منقضی (حتی اگر قبلاً کش شده) رد می‌شود.
+    """
+    import hashlib
+    import time
+    from jose import jwt
+    from utils.auth import ALGORITHM, SECRET_KEY, token_cache, _decode_pyjwt, create_access_token
+
+    before = (await auth_client.get("/internal/auth")).json()
+    await auth_client.get("/students/")
+    after = (await auth_client.get("/internal/auth")).json()
+    assert after["cache_hits"] >= before["cache_hits"] + 2
+    assert after["requests"] == before["requests"] + 2
+
+    assert _decode_pyjwt(create_access_token({"sub": "admin"}))["sub"] == "admin"
+
+    expired_token = jwt.encode({"sub": "admin", "exp": int(time.time()) - 1}, SECRET_KEY, algorithm=ALGORITHM)
+    token_cache.set(hashlib.sha256(expired_token.encode()).digest(), "admin", time.time() - 1)
+    expired = await auth_client.get("/students/", headers={"Authorization": f"Bearer {expired_token}"})
+    assert expired.status_code == 401
+    assert expired.json()["detail"] == "invalid token or expired"
+
+
+@pytest.mark.asyncio
+async def test_22_prometheus_metrics(auth_client: AsyncClient):
+    """تست endpoint متریک‌ها: هیستوگرام زمان پاسخ و شمارش وضعیت به تفکیک الگوی مسیر"""
+    await auth_client.get("/students/999999")
+    await auth_client.get("/students/")
+
+    response = await auth_client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/students/{student_id}",le="+Inf"}' in body
+    assert 'http_requests_total{method="GET",route="/students/{student_id}",status="404"}' in body
+    assert 'http_response_size_bytes_total{method="GET",route="/students/"}' in body
+    assert "school_api_db_pool_connects" in body
+
+
+@pytest.mark.asyncio
+async def test_23_query_profiler_server_timing(auth_client: AsyncClient, profiled_engine):
+    """تست پروفایل کوئری‌ها: هدر Server-Timing و ثبت کوئری‌های کند همراه با EXPLAIN"""
+    parent = (await auth_client.post("/parents/", json={"name": "Profiled Parent", "phone_number": "09120000023"})).json()
+
+    response = await auth_client.get(f"/parents/{parent['id']}")
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert '"2 queries"' in timing
+    assert "auth;dur=" in timing and "app;dur=" in timing
+
+    stats = (await auth_client.get("/internal/db/queries")).json()
+    assert stats["enabled"] is True
+    assert stats["slow_queries"] >= 2
+    selects = [q for q in stats["recent_slow"] if q["statement"].startswith("SELECT")]
+    assert selects and selects[-1]["plan"]
+
+
+@pytest.mark.asyncio
+async def test_24_replica_router_health_and_stickiness(replica_engines):
+    """تست مسیریابی خواندن: Round-Robin بین Replicaهای سالم، کنار گذاشتن Replica خراب و خواندن از Primary پس از نوشتن"""
+    from Database.database import ReplicaRouter
+
+    healthy, broken = replica_engines
+    primary = object()
+    router = ReplicaRouter(primary, [healthy, broken], sticky_seconds=60)
+
+    assert {router.choose(), router.choose()} == {healthy, broken}
+
+    await router.check()
+    assert router.healthy() == [healthy]
+    assert [router.choose() for _ in range(3)] == [healthy] * 3
+
+    await router.record_write("client-a")
+    assert await router.recent_writes("client-a") == (True, True)
+    assert await router.recent_writes("client-b") == (False, True)
+    assert router.choose(sticky=True) is primary
+    assert router.choose() is healthy
+
+    router.mark_down(healthy)
+    assert router.choose() is primary
+    assert router.stats()["healthy"] == 0
+
+
+async def seed_stats_data(auth_client: AsyncClient):
+    c1 = (await auth_client.post("/classes/", json={"name": "Stats A", "teacher_name": "Teacher"})).json()
+    c2 = (await auth_client.post("/classes/", json={"name": "Stats B", "teacher_name": "Teacher"})).json()
+    p1 = (await auth_client.post("/parents/", json={"name": "Stats Parent", "phone_number": "09120000025"})).json()
+    students = [
+        {"name": "Student 1", "age": 7, "grade": 1, "parent_id": p1["id"], "class_id": c1["id"]},
+        {"name": "Student 2", "age": 7, "grade": 1, "parent_id": p1["id"], "class_id": c1["id"]},
+        {"name": "Student 3", "age": 8, "grade": 2, "parent_id": None, "class_id": c1["id"]},
+        {"name": "Student 4", "age": 9, "grade": 3, "parent_id": None, "class_id": None},
+    ]
+    ids = [(await auth_client.post("/students/", json=s)).json()["id"] for s in students]
+    await auth_client.delete(f"/students/{ids[3]}")
+    return c1, c2, p1, ids
+
+
+@pytest.mark.asyncio
+async def test_25_stats_group_by(auth_client: AsyncClient):
+    """تست endpointهای آماری: شمارش با GROUP BY و باطل شدن کش آمار بعد از نوشتن"""
+    c1, c2, p1, ids = await seed_stats_data(auth_client)
+
+    overview = (await auth_client.get("/stats/overview")).json()
+    assert overview["students"] == {"active": 3, "inactive": 0, "deleted": 1, "total": 4}
+    assert overview["classes"]["active"] == 2 and overview["parents"]["total"] == 1
+
+    by_class = (await auth_client.get("/stats/students/by-class")).json()
+    assert by_class == [
+        {"id": c2["id"], "name": "Stats B", "students": 0},
+        {"id": c1["id"], "name": "Stats A", "students": 3},
+    ]
+    assert (await auth_client.get("/stats/students/by-parent")).json() == [
+        {"id": p1["id"], "name": "Stats Parent", "students": 2}
+    ]
+    assert (await auth_client.get("/stats/students/by-grade")).json() == [
+        {"grade": 1, "students": 2}, {"grade": 2, "students": 1}
+    ]
+    by_age = (await auth_client.get(f"/stats/students/by-age?class_id={c1['id']}")).json()
+    assert by_age == [{"age": 7, "students": 2}, {"age": 8, "students": 1}]
+
+    # نوشتن روی دانش‌آموزان کش آمار را باطل می‌کند
+    await auth_client.patch(f"/students/{ids[2]}", json={"class_id": c2["id"]})
+    by_class = (await auth_client.get("/stats/students/by-class")).json()
+    assert [item["students"] for item in by_class] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_26_stats_materialized_views(auth_client: AsyncClient, materialized_stats):
+    """تست حالت materialized: بازسازی view بعد از نوشتن‌ها و یکسان بودن نتیجه با GROUP BY مستقیم"""
+    c1, c2, p1, ids = await seed_stats_data(auth_client)
+    await materialized_stats.wait()
+    assert materialized_stats.refreshes >= 1 and not materialized_stats.stale
+
+    overview = (await auth_client.get("/stats/overview")).json()
+    assert overview["students"] == {"active": 3, "inactive": 0, "deleted": 1, "total": 4}
+    assert (await auth_client.get("/stats/students/by-grade")).json() == [
+        {"grade": 1, "students": 2}, {"grade": 2, "students": 1}
+    ]
+
+    await auth_client.post(f"/students/{ids[3]}/restore")
+    await materialized_stats.wait()
+    by_grade = (await auth_client.get("/stats/students/by-grade")).json()
+    assert by_grade[-1] == {"grade": 3, "students": 1}
+
+
+@pytest.mark.asyncio
+async def test_27_sparse_fieldsets(auth_client: AsyncClient, query_counter):
+    """تست fields/include: فقط فیلدهای خواسته شده سریالایز و فقط روابط خواسته شده لود می‌شوند"""
+    klass = (await auth_client.post("/classes/", json={"name": "Fields", "teacher_name": "Teacher"})).json()
+    parent = (await auth_client.post("/parents/", json={"name": "Fields Parent", "phone_number": "09120000027"})).json()
+    student = (await auth_client.post("/students/", json={
+        "name": "Fields Student", "age": 9, "grade": 3, "parent_id": parent["id"], "class_id": klass["id"],
+    })).json()
+
+    query_counter.reset()
+    response = await auth_client.get("/students/?fields=name")
+    assert response.status_code == 200
+    assert response.json() == [{"id": student["id"], "name": "Fields Student"}]
+    assert query_counter.queries == 1 and query_counter.rows == 1
+
+    response = await auth_client.get(f"/students/{student['id']}?fields=name,created_at_fa&include=parent")
+    body = response.json()
+    assert set(body) == {"id", "name", "created_at_fa", "parent"}
+    assert body["parent"]["id"] == parent["id"] and body["created_at_fa"] == student["created_at_fa"]
+
+    # بدون students کوئری selectinload اجرا نمی‌شود
+    query_counter.reset()
+    classes = (await auth_client.get("/classes/?fields=id,name")).json()
+    assert classes == [{"id": klass["id"], "name": "Fields"}]
+    assert query_counter.queries == 1
+
+    parents = (await auth_client.get("/parents/?include=students")).json()
+    assert parents[0]["students"][0]["id"] == student["id"] and "phone_number" in parents[0]
+
+    response = await auth_client.get("/students/?fields=name,password")
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"]
+
+    # بدون پارامتر، پاسخ کامل مثل قبل است
+    assert (await auth_client.get(f"/students/{student['id']}")).json() == student
+
+
+@pytest.mark.asyncio
+async def test_28_fast_serializer_byte_identical(auth_client: AsyncClient, monkeypatch):
+    """تست سریالایزر سریع: خروجی بایت به بایت با مسیر Pydantic یکسان است (شامل رشته‌های خاص و تاریخ‌ها)"""
+    from utils import fast_json
+    from utils.cache import response_cache
+
+    odd = 'کلاس "ویژه" \\ \t/ 😀 é'
+    klass = (await auth_client.post("/classes/", json={"name": odd[:50], "teacher_name": "Teacher\nName"})).json()
+    parent = (await auth_client.post("/parents/", json={"name": odd, "phone_number": "09120000028"})).json()
+    for i in range(3):
+        await auth_client.post("/students/", json={
+            "name": f"{odd} {i}", "age": 9, "grade": 3, "parent_id": parent["id"], "class_id": klass["id"],
+        })
+    await auth_client.post("/students/", json={"name": "Orphan", "age": 8, "grade": 2})
+
+    paths = ["/students/", "/students/?fields=name,deleted_at_fa&include=class_", "/classes/", "/parents/",
+             f"/classes/{klass['id']}", f"/parents/{parent['id']}", "/stats/students/by-class", "/stats/overview"]
+    bodies = {}
+    for mode in ("pydantic", "fast"):
+        monkeypatch.setattr(fast_json, "SERIALIZER", mode)
+        await response_cache.clear()
+        bodies[mode] = [(await auth_client.get(path)).content for path in paths]
+
+    assert bodies["fast"] == bodies["pydantic"]
+    assert b"\\u00" not in bodies["fast"][0] and "😀".encode() in bodies["fast"][0]
+
+
+@pytest.mark.asyncio
+async def test_29_conditional_get(auth_client: AsyncClient, query_counter):
+    """تست ETag / Last-Modified: پاسخ 304 بدون لود و سریالایز و تغییر ETag با هر تغییر داده"""
+    from utils.cache import response_cache
+
+    klass = (await auth_client.post("/classes/", json={"name": "ETag", "teacher_name": "Teacher"})).json()
+    other = (await auth_client.post("/classes/", json={"name": "Other", "teacher_name": "Teacher"})).json()
+    url = f"/classes/{klass['id']}"
+
+    response = await auth_client.get(url)
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache" and response.headers["last-modified"]
+
+    # از کش: بدون هیچ کوئری
+    query_counter.reset()
+    response = await auth_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.content == b"" and query_counter.queries == 0
+
+    # بدون کش: بار اول بدنه ساخته و با ETag مقایسه می‌شود، بعد از آن فقط کوئری نسخه اجرا می‌شود
+    for expected_queries in (3, 1):
+        await response_cache.backend.clear()
+        query_counter.reset()
+        response = await auth_client.get(url, headers={"If-None-Match": f'W/"other", {etag}'})
+        assert response.status_code == 304 and response.headers["etag"] == etag
+        assert query_counter.queries == expected_queries
+    assert query_counter.rows == 0
+
+    student = (await auth_client.post("/students/", json={
+        "name": "ETag Student", "age": 9, "grade": 3, "class_id": klass["id"],
+    })).json()
+    response = await auth_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
+    etag = response.headers["etag"]
+
+    # خارج شدن دانش‌آموز از کلاس هم (با وجود ثابت ماندن زمان‌های کلاس) ETag را تغییر می‌دهد
+    await auth_client.patch(f"/students/{student['id']}", json={"class_id": other["id"]})
+    response = await auth_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["students"] == []
+
+    # If-Modified-Since روی جزئیات دانش‌آموز
+    response = await auth_client.get(f"/students/{student['id']}")
+    last_modified = response.headers["last-modified"]
+    await response_cache.backend.clear()
+    response = await auth_client.get(f"/students/{student['id']}", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    response = await auth_client.get(f"/students/{student['id']}", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"})
+    assert response.status_code == 200
+
+    # لیست‌ها
+    response = await auth_client.get("/students/", params={"class_id": other["id"]})
+    etag = response.headers["etag"]
+    await response_cache.backend.clear()
+    headers = {"If-None-Match": etag}
+    assert (await auth_client.get("/students/", params={"class_id": other["id"]}, headers=headers)).status_code == 304
+    await auth_client.delete(f"/students/{student['id']}")
+    response = await auth_client.get("/students/", params={"class_id": other["id"]}, headers=headers)
+    assert response.status_code == 200 and response.json() == []
+    assert response_cache.stats()["not_modified"] >= 5
+
+
+@pytest.mark.asyncio
+async def test_30_delta_sync(auth_client: AsyncClient, monkeypatch):
+    """تست فید /sync: فقط ردیف‌های ساخته، ویرایش، حذف یا بازیابی شده بعد از توکن برگردانده می‌شوند"""
+    from Sync import feed
+
+    monkeypatch.setattr(feed, "SYNC_OVERLAP_SECONDS", 0)
+    klass = (await auth_client.post("/classes/", json={"name": "Sync", "teacher_name": "Teacher"})).json()
+    parent = (await auth_client.post("/parents/", json={"name": "Sync Parent", "phone_number": "09120000030"})).json()
+    students = [(await auth_client.post("/students/", json={
+        "name": f"Sync Student {i}", "age": 9, "grade": 3, "parent_id": parent["id"], "class_id": klass["id"],
+    })).json() for i in range(3)]
+
+    # همگام‌سازی اولیه با صفحه‌بندی
+    response = await auth_client.get("/sync", params={"limit": 2})
+    assert response.status_code == 200
+    first = response.json()
+    assert first["has_more"] is True and len(first["students"]) == 2
+    second = (await auth_client.get("/sync", params={"since": first["next"], "limit": 2})).json()
+    assert second["has_more"] is False
+    assert [s["id"] for s in first["students"] + second["students"]] == [s["id"] for s in students]
+    assert second["classes"] == [] and second["parents"] == []
+
+    # بدون تغییر: پاسخ خالی
+    idle = (await auth_client.get("/sync", params={"since": second["next"]})).json()
+    assert idle["students"] == idle["classes"] == idle["parents"] == []
+
+    await auth_client.patch(f"/students/{students[0]['id']}", json={"grade": 4})
+    await auth_client.delete(f"/students/{students[1]['id']}")
+    changes = (await auth_client.get("/sync", params={"since": idle["next"]})).json()
+    assert {s["id"]: (s["grade"], s["is_deleted"]) for s in changes["students"]} == {
+        students[0]["id"]: (4, False), students[1]["id"]: (3, True),
+    }
+    assert changes["students"][1]["deleted_at"] is not None
+
+    # بازیابی (حتی از طریق cascade کلاس) در فید دیده می‌شود و deleted_at پاک می‌شود
+    await auth_client.delete(f"/classes/{klass['id']}")
+    deleted = (await auth_client.get("/sync", params={"since": changes["next"]})).json()
+    assert [c["is_deleted"] for c in deleted["classes"]] == [True]
+    assert {s["id"] for s in deleted["students"]} == {students[0]["id"], students[2]["id"]}
+    await auth_client.post(f"/classes/{klass['id']}/restore")
+    restored = (await auth_client.get("/sync", params={"since": deleted["next"]})).json()
+    assert [(c["is_deleted"], c["deleted_at"]) for c in restored["classes"]] == [(False, None)]
+    assert {s["id"] for s in restored["students"]} == {s["id"] for s in students}
+
+    assert (await auth_client.get("/sync", params={"since": "garbage"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_31_search_persian_normalization(auth_client: AsyncClient):
+    """تست /search: نرمال‌سازی ی/ک عربی، نیم‌فاصله و ارقام فارسی، رتبه‌بندی و صفحه‌بندی"""
+    klass = (await auth_client.post("/classes/", json={"name": "ریاضی ۱", "teacher_name": "آقای كريمي"})).json()
+    parent = (await auth_client.post("/parents/", json={"name": "رضا احمدی", "phone_number": "09121234567"})).json()
+    exact, prefixed, joined = [(await auth_client.post("/students/", json={
+        "name": name, "age": 9, "grade": 3, "parent_id": parent["id"], "class_id": klass["id"],
+    })).json() for name in ("علي", "علیرضا رضايي", "محمد‌علی کاظمی")]
+    deleted = (await auth_client.post("/students/", json={"name": "علی حذفی", "age": 9, "grade": 3})).json()
+    await auth_client.delete(f"/students/{deleted['id']}")
+
+    async def search(q, **params):
+        response = await auth_client.get("/search", params={"q": q, **params})
+        assert response.status_code == 200
+        return response.json()
+
+    # «علی» با ی فارسی، «علي» با ی عربی و «محمد‌علی» با نیم‌فاصله را پیدا می‌کند؛ تطابق کامل اول است
+    hits = await search("علی", type="student")
+    assert [hit["id"] for hit in hits] == [exact["id"], joined["id"], prefixed["id"]]
+    assert hits[0]["score"] == 1.0 and hits[0]["type"] == "student"
+
+    hits = await search("کریمی")
+    assert [(hit["type"], hit["id"], hit["matched"]) for hit in hits] == [("class", klass["id"], "teacher_name")]
+    hits = await search("۰۹۱۲")
+    assert [(hit["type"], hit["detail"]) for hit in hits] == [("parent", "09121234567")]
+    assert {hit["id"] for hit in await search("رضا")} == {parent["id"], prefixed["id"]}
+    assert [hit["id"] for hit in await search("علی کاظ")] == [joined["id"]]
+
+    page = await auth_client.get("/search", params={"q": "عل", "type": "student", "limit": 2})
+    rest = await search("عل", type="student", cursor=page.headers["x-next-cursor"])
+    assert len(page.json()) == 2 and len(rest) == 1 and "x-next-cursor" not in (await auth_client.get(
+        "/search", params={"q": "عل", "type": "student", "limit": 3})).headers
+    assert (await auth_client.get("/search", params={"q": ""})).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_32_rate_limit_and_admission(auth_client: AsyncClient, monkeypatch):
+    """تست محدودیت نرخ (هزینه بیشتر لیست‌ها)، سقف همزمانی هر کلاینت و 503 با پر بودن صف سراسری"""
+    from utils import rate_limit
+    from utils.rate_limit import AdmissionControl, MemoryRateLimitBackend
+
+    control = AdmissionControl(MemoryRateLimitBackend(100), rate=0.5, burst=12, client_concurrency=1,
+                               max_in_flight=1, max_queue=0, queue_timeout=0.1)
+    monkeypatch.setattr(rate_limit, "admission_control", control)
+    parent = (await auth_client.post("/parents/", json={"name": "Rate", "phone_number": "09120000032"})).json()
+
+    # لیست 5 توکن و جزئیات 1 توکن مصرف می‌کند: 1 + 5 + 5 + 1 = 12
+    assert (await auth_client.get("/parents/")).status_code == 200
+    assert (await auth_client.get("/parents/")).status_code == 200
+    assert (await auth_client.get(f"/parents/{parent['id']}")).status_code == 200
+    throttled = await auth_client.get("/parents/")
+    assert throttled.status_code == 429
+    assert int(throttled.headers["Retry-After"]) >= 1
+    assert control.stats()["throttled"] == 1
+
+    # هر IP سطل جداگانه خودش را دارد و ورود (عمومی) هنوز مجاز است
+    assert (await auth_client.post("/auth/login", data={"username": "admin", "password": "admin123"})).status_code == 200
+
+    await control.reset()
+    async with control.slot("user:admin:127.0.0.1"):
+        busy = await auth_client.get(f"/parents/{parent['id']}")
+    assert busy.status_code == 429 and busy.headers["Retry-After"] == "1"
+
+    async with control.slot("user:someone-else"):
+        shed = await auth_client.get(f"/parents/{parent['id']}")
+    assert shed.status_code == 503 and "Retry-After" in shed.headers
+    assert (await auth_client.get(f"/parents/{parent['id']}")).status_code == 200
+
+    stats = control.stats()
+    assert stats["client_rejections"] == 1 and stats["shed"] == 1
+    assert stats["in_flight"] == 0 and stats["active_clients"] == 0
+
+
+@pytest.mark.asyncio
+async def test_33_single_flight_coalescing(auth_client: AsyncClient, query_counter):
+    """تست Single-Flight: درخواست‌های یکسان همزمان یک بار از دیتابیس خوانده می‌شوند و بایت‌های یکسان می‌گیرند"""
+    import asyncio
+    from utils.cache import response_cache
+
+    klass = (await auth_client.post("/classes/", json={"name": "Flight", "teacher_name": "Teacher"})).json()
+    parent = (await auth_client.post("/parents/", json={"name": "Flight", "phone_number": "09120000033"})).json()
+    await auth_client.post("/students/", json={
+        "name": "Flight", "age": 10, "grade": 4, "parent_id": parent["id"], "class_id": klass["id"],
+    })
+
+    # بار تکی برای شمارش کوئری‌ها
+    await response_cache.clear()
+    query_counter.reset()
+    single = await auth_client.get(f"/classes/{klass['id']}")
+    single_queries = query_counter.queries
+
+    await response_cache.clear()
+    before = response_cache.stats()
+    query_counter.reset()
+    responses = await asyncio.gather(*[auth_client.get(f"/classes/{klass['id']}") for _ in range(8)])
+    assert all(response.status_code == 200 for response in responses)
+    assert {response.content for response in responses} == {single.content}
+    assert len({response.headers["etag"] for response in responses}) == 1
+    assert query_counter.queries == single_queries
+
+    stats = response_cache.stats()
+    assert stats["coalesced"] - before["coalesced"] == 7
+    assert stats["single_flight_loads"] - before["single_flight_loads"] == 1
+    assert stats["in_flight"] == 0
+
+    # خطای leader (404) به همه منتظرها می‌رسد و کلید آزاد می‌شود
+    missing = await asyncio.gather(*[auth_client.get("/classes/999999") for _ in range(3)])
+    assert [response.status_code for response in missing] == [404] * 3
+    assert response_cache.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_34_student_write_round_trips(auth_client: AsyncClient, query_counter):
+    """تست نوشتن دانش‌آموز: UPDATE ... RETURNING و یک خواندن JOIN شده، و پیام 404 درست برای هر کلید خارجی"""
+    klass = (await auth_client.post("/classes/", json={"name": "Writes", "teacher_name": "Teacher"})).json()
+    other = (await auth_client.post("/classes/", json={"name": "Writes 2", "teacher_name": "Teacher"})).json()
+    parent = (await auth_client.post("/parents/", json={"name": "Writes", "phone_number": "09120000034"})).json()
+    student = (await auth_client.post("/students/", json={
+        "name": "Writer", "age": 10, "grade": 4, "parent_id": parent["id"], "class_id": klass["id"],
+    })).json()
+    path = f"/students/{student['id']}"
+
+    query_counter.reset()
+    response = await auth_client.patch(path, json={"grade": 5, "class_id": other["id"]})
+    assert response.status_code == 200
+    assert query_counter.queries == 2
+    data = response.json()
+    assert data["grade"] == 5 and data["class_"]["id"] == other["id"] and data["parent"]["id"] == parent["id"]
+    assert data["updated_at_fa"] != "-"
+
+    query_counter.reset()
+    response = await auth_client.put(path, json={"name": "Writer 2", "age": 11, "grade": 6})
+    assert response.status_code == 200 and query_counter.queries == 2
+    assert response.json()["parent"] is None and response.json()["class_"] is None
+
+    assert (await auth_client.patch(path, json={"parent_id": 999999})).json()["detail"] == "Parent not found"
+    assert (await auth_client.patch(path, json={"class_id": 999999})).json()["detail"] == "Class not found"
+    assert (await auth_client.patch("/students/999999", json={"grade": 3})).json()["detail"] == "Student not found"
+    await auth_client.delete(f"/classes/{other['id']}")
+    assert (await auth_client.patch(path, json={"class_id": other["id"]})).status_code == 404
+
+    # بدنه خالی چیزی را تغییر نمی‌دهد و فقط وجود دانش‌آموز بررسی می‌شود
+    response = await auth_client.patch(path, json={})
+    assert response.status_code == 200 and response.json()["name"] == "Writer 2"
+    await auth_client.delete(path)
+    assert (await auth_client.patch(path, json={})).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_35_background_jobs(auth_client: AsyncClient, jobs, monkeypatch, tmp_path):
+    """تست کارهای پس‌زمینه: 202 بالای آستانه، پیشرفت در chunkها، ورود گروهی، خروجی فایل و تلاش مجدد"""
+    from Class.api import ClassApi
+    from Jobs import tasks
+    from Student.api import StudentApi
+
+    monkeypatch.setattr(tasks, "JOBS_CASCADE_THRESHOLD", 2)
+    monkeypatch.setattr(tasks, "JOBS_CHUNK_SIZE", 2)
+    monkeypatch.setattr(tasks, "JOBS_EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(ClassApi, "JOBS_BATCH_THRESHOLD", 3)
+    monkeypatch.setattr(StudentApi, "JOBS_EXPORT_THRESHOLD", 3)
+
+    # ورود گروهی بزرگ: 202 و اجرای کار
+    classes = [{"name": f"Job {i}", "teacher_name": "Teacher"} for i in range(4)] + [{"name": "x"}]
+    response = await auth_client.post("/classes/batch", json=classes)
+    assert response.status_code == 202 and response.json()["status"] == "queued"
+    location = response.headers["location"]
+    assert await jobs.drain() == 1
+    job = (await auth_client.get(location)).json()
+    assert job["status"] == "succeeded" and job["progress_done"] == job["progress_total"] == 5
+    assert [item["status"] for item in job["result"]] == ["created"] * 4 + ["error"]
+    class_id = job["result"][0]["id"]
+    # زیر آستانه همچنان پاسخ درجا
+    assert (await auth_client.post("/classes/batch", json=classes[:2])).status_code == 200
+
+    for i in range(5):
+        await auth_client.post("/students/", json={"name": f"Pupil {i}", "age": 10, "grade": 4, "class_id": class_id})
+
+    # حذف آبشاری بزرگ در chunkها
+    response = await auth_client.delete(f"/classes/{class_id}")
+    assert response.status_code == 202
+    await jobs.drain()
+    assert (await auth_client.get(f"/classes/{class_id}")).json()["is_deleted"] is True
+    job = (await auth_client.get(response.headers["location"])).json()
+    assert job["status"] == "succeeded" and job["progress_done"] == job["progress_total"] == 5
+    assert job["result"]["students"] == 5
+    deleted = await auth_client.get("/students/", params={"class_id": class_id, "is_deleted": True})
+    assert len(deleted.json()) == 5
+    assert (await auth_client.delete("/classes/999999")).status_code == 404
+
+    response = await auth_client.post(f"/classes/{class_id}/restore")
+    assert response.status_code == 202
+    await jobs.drain()
+    assert (await auth_client.get(response.headers["location"])).json()["result"]["students"] == 5
+    assert len((await auth_client.get("/students/", params={"class_id": class_id})).json()) == 5
+
+    # خروجی بزرگ در فایل و دانلود آن
+    response = await auth_client.get("/students/export", params={"format": "csv", "class_id": class_id})
+    assert response.status_code == 202
+    location = response.headers["location"]
+    assert (await auth_client.get(f"{location}/download")).status_code == 409
+    await jobs.drain()
+    job = (await auth_client.get(location)).json()
+    assert job["status"] == "succeeded" and job["result"]["rows"] == 5 and job["progress_done"] == 5
+    download = await auth_client.get(job["result"]["download"])
+    assert download.status_code == 200 and download.headers["content-type"].startswith("text/csv")
+    lines = download.text.splitlines()
+    assert len(lines) == 6 and lines[0].startswith("id,name,age")
+
+    # خطا: تلاش مجدد تا max_attempts و سپس failed
+    calls = []
+
+    @jobs.handler("test.fail")
+    async def fail(ctx):
+        calls.append(ctx.attempt)
+        raise RuntimeError("boom")
+
+    try:
+        async with tasks.job_runner.session_factory() as db:
+            job = await jobs.enqueue(db, "test.fail", {})
+        await jobs.drain()
+    finally:
+        jobs.handlers.pop("test.fail")
+    assert calls == [1, 2, 3]
+    job = (await auth_client.get(f"/jobs/{job.id}")).json()
+    assert job["status"] == "failed" and job["attempts"] == 3 and "boom" in job["error"]
+    assert (await auth_client.get("/jobs/999999")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_36_health_and_readiness(client: AsyncClient, monkeypatch, caplog):
+    """تست /healthz (بدون دیتابیس) و /readyz (پایان startup و اتصال دیتابیس) بدون نیاز به توکن"""
+    import logging
+    from main import app
+    from serve import check_settings
+    from Database.database import get_db
+
+    assert (await client.get("/healthz")).json() == {"status": "ok"}
+
+    # ASGITransport lifespan را اجرا نمی‌کند، پس startup هنوز تمام نشده است
+    monkeypatch.setattr(app.state, "ready", False, raising=False)
+    response = await client.get("/readyz")
+    assert response.status_code == 503 and response.json()["checks"]["startup"] == "pending"
+
+    monkeypatch.setattr(app.state, "ready", True)
+    response = await client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json()["checks"]["database"] == "ok"
+
+    # متن خطای driver (آدرس و کاربر دیتابیس) در پاسخ بدون احراز هویت نمی‌آید و فقط لاگ می‌شود
+    class BrokenSession:
+        async def execute(self, *args, **kwargs):
+            raise OSError("connection to 10.1.2.3 as user school_admin refused")
+
+    override = app.dependency_overrides[get_db]
+    app.dependency_overrides[get_db] = lambda: BrokenSession()
+    try:
+        with caplog.at_level(logging.WARNING, logger="school_api.health"):
+            response = await client.get("/readyz")
+    finally:
+        app.dependency_overrides[get_db] = override
+    assert response.status_code == 503 and response.json()["checks"]["database"] == "OSError"
+    assert "10.1.2.3" not in response.text and "10.1.2.3" in caplog.text
+
+    warnings = check_settings(workers=4)
+    assert any(warning.startswith("CACHE_BACKEND=memory") for warning in warnings)
+    assert check_settings(workers=1) == []
+
+
+@pytest.mark.asyncio
+async def test_37_rate_limit_shared_account(auth_client: AsyncClient, auth_token, monkeypatch):
+    """چند کلاینت با توکن مشترک admin از IPهای مختلف سطل و سقف همزمانی جداگانه دارند"""
+    from httpx import ASGITransport
+    from main import app
+    from utils import rate_limit
+    from utils.rate_limit import AdmissionControl, MemoryRateLimitBackend
+
+    control = AdmissionControl(MemoryRateLimitBackend(100), rate=0.5, burst=10, client_concurrency=1)
+    monkeypatch.setattr(rate_limit, "admission_control", control)
+    headers = {"Authorization": f"Bearer {auth_token}"}
+
+    clients = [
+        AsyncClient(transport=ASGITransport(app=app, client=(f"10.0.0.{i}", 5000)), base_url="http://test",
+                    headers=headers)
+        for i in range(1, 4)
+    ]
+    try:
+        # هر کلاینت دو لیست (2 × 5 توکن) از سطل خودش می‌گیرد
+        for client in clients:
+            assert (await client.get("/students/")).status_code == 200
+            assert (await client.get("/students/")).status_code == 200
+        for client in clients:
+            assert (await client.get("/students/")).status_code == 429
+
+        # درخواست در حال اجرای یک کلاینت سقف همزمانی بقیه را پر نمی‌کند
+        await control.reset()
+        async with control.slot("user:admin:10.0.0.1"):
+            assert (await clients[0].get("/students/1")).status_code == 429
+            assert (await clients[1].get("/students/1")).status_code == 404
+    finally:
+        for client in clients:
+            await client.aclose()
+
+    # با کلید فقط بر اساس sub همه کلاینت‌ها یک سطل مشترک داشتند
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_KEY_BY_IP", False)
+    await control.reset()
+    assert (await auth_client.get("/students/")).status_code == 200
+    assert (await auth_client.get("/students/")).status_code == 200
+    assert (await auth_client.get("/students/")).status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_38_cache_with_lagging_replica(auth_client: AsyncClient, lagging_replica):
+    """
+    کش پاسخ با Replica عقب مانده: خواندن از Replica بعد از یک نوشتن کش نمی‌شود
+    و نویسنده (sticky) کش را دور می‌زند و داده تازه را از Primary می‌گیرد.
+    """
+    from sqlalchemy import insert, update
+    from utils.auth import create_access_token
+    from utils.cache import response_cache
+
+    replica, router = lagging_replica
+    row = {"id": 1, "name": "Old", "teacher_name": "Teacher", "is_active": True, "is_deleted": False}
+    for engine in (router.primary, replica):
+        async with engine.begin() as conn:
+            await conn.execute(insert(Class).values(**row))
+
+    writer = auth_client
+    reader_headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin', 'device': 'reader'})}"}
+
+    async def read(client, headers=None):
+        return (await client.get("/classes/1", headers=headers)).json()["name"]
+
+    # بدون نوشتن اخیر، خواندن از Replica کش می‌شود
+    assert await read(writer, reader_headers) == "Old"
+    hits = response_cache.hits
+    assert await read(writer, reader_headers) == "Old" and response_cache.hits == hits + 1
+
+    # نوشتن روی Primary؛ Replica هنوز به آن نرسیده است
+    assert (await writer.patch("/classes/1", json={"name": "New"})).status_code == 200
+    assert await read(writer, reader_headers) == "Old"
+    assert router.stats()["replica_reads"] == 3
+
+    # نویسنده از Primary می‌خواند و پاسخ قدیمی Replica را از کش نمی‌گیرد
+    assert await read(writer) == "New"
+
+    # بعد از رسیدن Replica، خواننده داده جدید را می‌بیند (پاسخ قدیمی کش نشده بود)
+    async with replica.begin() as conn:
+        await conn.execute(update(Class).where(Class.id == 1).values(name="New"))
+    assert await read(writer, reader_headers) == "New"
+
+
+@pytest.mark.asyncio
+async def test_39_sync_horizon_uses_database_clock(auth_client: AsyncClient, monkeypatch):
+    """ساعت جلوتر سرور برنامه horizon فید /sync را از ردیف‌های بعدی جلو نمی‌برد"""
+    from datetime import datetime, timedelta
+    from Sync import feed
+
+    class SkewedClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(hours=1)
+
+    monkeypatch.setattr(feed, "datetime", SkewedClock)
+    first = (await auth_client.get("/sync")).json()
+    klass = (await auth_client.post("/classes/", json={"name": "Skew", "teacher_name": "Teacher"})).json()
+    changes = (await auth_client.get("/sync", params={"since": first["next"]})).json()
+    assert [c["id"] for c in changes["classes"]] == [klass["id"]]
+
+
+@pytest.mark.asyncio
+async def test_40_search_candidates_ordered_before_limit(auth_client: AsyncClient):
+    """بهترین نتیجه بعد از 200 ردیف منطبق اول هم پیدا می‌شود و بریده شدن نتایج گزارش می‌شود"""
+    from Search.query import SEARCH_CANDIDATES
+
+    others = [{"name": f"علیرضا {i}", "age": 9, "grade": 3} for i in range(SEARCH_CANDIDATES + 5)]
+    assert (await auth_client.post("/students/batch", json=others)).status_code == 200
+    exact = (await auth_client.post("/students/", json={"name": "علی", "age": 9, "grade": 3})).json()
+
+    first = await auth_client.get("/search", params={"q": "علی", "type": "student", "limit": 100})
+    assert first.json()[0]["id"] == exact["id"] and first.json()[0]["score"] == 1.0
+    assert "x-search-truncated" not in first.headers
+
+    last = await auth_client.get("/search", params={
+        "q": "علی", "type": "student", "limit": 100, "cursor": first.headers["x-next-cursor"],
+    })
+    assert len(last.json()) == SEARCH_CANDIDATES - 100
+    assert "x-next-cursor" not in last.headers and last.headers["x-search-truncated"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_41_migrate_detects_create_all_schema(async_db):
+    """دیتابیس ساخته شده با create_all بدون alembic_version روی revision معادل stamp می‌شود"""
+    from sqlalchemy import text
+    from Database.migrate import REVISION_MARKERS, _existing_revision
+
+    conn = await async_db.connection()
+    assert await conn.run_sync(_existing_revision) == (False, REVISION_MARKERS[-1][0])
+
+    # schema قبل از migration جدول jobs
+    await conn.execute(text("DROP TABLE jobs"))
+    assert await conn.run_sync(_existing_revision) == (False, "b7a1e5f3c820")
+
+    await conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+    assert await conn.run_sync(_existing_revision) == (True, None)
+    await async_db.rollback()
+
+
+def test_42_serve_sets_up_schema_once(monkeypatch):
+    """schema یک بار در پروسه اصلی و قبل از ساخت workerها ساخته می‌شود و workerها آن را رد می‌کنند"""
+    import os
+    import serve
+
+    calls = []
+
+    async def check_database():
+        calls.append("check")
+
+    monkeypatch.setenv("DB_SCHEMA_SETUP", "true")
+    monkeypatch.setattr(serve, "check_database", check_database)
+    monkeypatch.setattr(serve, "setup_schema", lambda migrate: calls.append(("schema", migrate)))
+    monkeypatch.setattr(serve.uvicorn, "run", lambda *args, **kwargs: calls.append(
+        ("run", kwargs["workers"], os.environ["DB_SCHEMA_SETUP"])))
+
+    assert serve.main(["--workers", "4"]) == 0
+    assert calls == ["check", ("schema", True), ("run", 4, "false")]
+
+    calls.clear()
+    serve.main(["--workers", "2", "--skip-migrate"])
+    assert calls[1] == ("schema", False)
+
+
+@pytest.mark.asyncio
+async def test_43_replica_write_marks_shared_between_workers(fake_redis, replica_engines, monkeypatch):
+    """با DB_REPLICA_STICKY_BACKEND=redis نوشتن روی یک worker در worker دیگر هم دیده می‌شود"""
+    from Database import database
+    from Database.database import ReplicaRouter, RedisWriteMarks
+    from serve import check_settings
+
+    primary, replica = object(), replica_engines[0]
+    worker_a = ReplicaRouter(primary, [replica], sticky_seconds=60, marks=RedisWriteMarks(fake_redis))
+    worker_b = ReplicaRouter(primary, [replica], sticky_seconds=60, marks=RedisWriteMarks(fake_redis))
+
+    assert await worker_b.recent_writes("client-a") == (False, False)
+    await worker_a.record_write("client-a")
+    assert await worker_b.recent_writes("client-a") == (True, True)
+    assert await worker_b.recent_writes("client-b") == (False, True)
+
+    monkeypatch.setattr(database, "DATABASE_REPLICA_URLS", ["postgresql+asyncpg://replica/school"])
+    assert any(w.startswith("DB_REPLICA_STICKY_BACKEND=memory") for w in check_settings(workers=4))
+    monkeypatch.setattr(database, "DB_REPLICA_STICKY_BACKEND", "redis")
+    assert not any(w.startswith("DB_REPLICA_STICKY_BACKEND") for w in check_settings(workers=4))
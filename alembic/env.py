@@ -1,9 +1,15 @@
+import os
 from logging.config import fileConfig
 from sqlalchemy import pool
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 from Database.database import Base
+# مدل‌ها باید import شوند تا جداول‌شان در Base.metadata ثبت شود (برای autogenerate)
+from Parent.model import Parent  # noqa: F401
+from Class.model import Class  # noqa: F401
+from Student.model import Student  # noqa: F401
+from Jobs.model import Job  # noqa: F401
 
 # متغیر برای دسترسی به مدل‌ها
 target_metadata = Base.metadata
@@ -11,7 +17,12 @@ target_metadata = Base.metadata
 # تنظیمات استاندارد Alembic
 config = context.config
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    # لاگرهای برنامه (وقتی از Database.migrate یا serve.py اجرا می‌شود) غیرفعال نشوند
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+# آدرس دیتابیس: آدرس صریح Database.migrate، سپس متغیر محیطی (مثل خود برنامه) و در آخر alembic.ini
+if config.attributes.get("database_url") or os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", config.attributes.get("database_url") or os.environ["DATABASE_URL"])
 
 
 def run_migrations_offline() -> None:
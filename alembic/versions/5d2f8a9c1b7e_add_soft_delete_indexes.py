@@ -0,0 +1,52 @@
+"""add foreign key and soft-delete partial indexes
+
+Revision ID: 5d2f8a9c1b7e
+Revises: c46db45642cf
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f8a9c1b7e'
+down_revision: Union[str, Sequence[str], None] = 'c46db45642cf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# باید با utils.base_model.NOT_DELETED یکی باشد
+NOT_DELETED = sa.text("is_deleted IS FALSE")
+
+# PostgreSQL برای کلیدهای خارجی ایندکس نمی‌سازد
+FK_INDEXES = [
+    ('ix_students_parent_id', ['parent_id']),
+    ('ix_students_class_id', ['class_id']),
+    ('ix_students_grade', ['grade']),
+]
+
+PARTIAL_INDEXES = [
+    ('ix_students_class_id_not_deleted', ['class_id', 'id']),
+    ('ix_students_parent_id_not_deleted', ['parent_id', 'id']),
+    ('ix_students_grade_not_deleted', ['grade', 'id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY جدول را در حین ساخت ایندکس قفل نمی‌کند، اما داخل تراکنش قابل اجرا نیست
+    with op.get_context().autocommit_block():
+        for name, columns in FK_INDEXES:
+            op.create_index(name, 'students', columns, unique=False, postgresql_concurrently=True)
+        for name, columns in PARTIAL_INDEXES:
+            op.create_index(name, 'students', columns, unique=False,
+                            postgresql_where=NOT_DELETED, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _ in PARTIAL_INDEXES + FK_INDEXES:
+            op.drop_index(name, table_name='students', postgresql_concurrently=True)
@@ -0,0 +1,38 @@
+"""add changed_at expression indexes for the sync feed
+
+Revision ID: 8e4b7c2d9a13
+Revises: 5d2f8a9c1b7e
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4b7c2d9a13'
+down_revision: Union[str, Sequence[str], None] = '5d2f8a9c1b7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# باید با utils.base_model.changed_at یکی باشد
+CHANGED_AT = sa.text("coalesce(updated_at, created_at)")
+
+TABLES = ['classes', 'parents', 'students']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(f'ix_{table}_changed_at', table, [CHANGED_AT, 'id'], unique=False,
+                            postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index(f'ix_{table}_changed_at', table_name=table, postgresql_concurrently=True)
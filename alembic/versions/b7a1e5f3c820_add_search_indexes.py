@@ -0,0 +1,69 @@
+"""add GIN search indexes over normalized names
+
+Revision ID: b7a1e5f3c820
+Revises: 8e4b7c2d9a13
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7a1e5f3c820'
+down_revision: Union[str, Sequence[str], None] = '8e4b7c2d9a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# باید با utils.text_search (CHAR_MAP، SEPARATORS و search_document) یکی باشد؛
+# در غیر این صورت planner ایندکس را برای کوئری‌های /search انتخاب نمی‌کند
+CHAR_MAP = {
+    "ي": "ی", "ى": "ی", "ئ": "ی",
+    "ك": "ک",
+    "ة": "ه", "ۀ": "ه",
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ؤ": "و",
+    "\u200c": " ",
+    "\u200d": "",
+    "\u0640": "",
+    "،": " ", "؛": " ", "؟": " ", "«": " ", "»": " ",
+    **{chr(code): "" for code in range(0x064B, 0x0653)},
+    "\u0670": "",
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+}
+SEPARATORS = r"[\t\n\v\f\r !-/:-@\[-`{-~]+"
+
+SEARCH_COLUMNS = {
+    'classes': ['name', 'teacher_name'],
+    'parents': ['name', 'phone_number'],
+    'students': ['name'],
+}
+
+
+def search_document(columns) -> sa.TextClause:
+    sql = columns[0]
+    for column in columns[1:]:
+        sql = f"({sql} || ' ') || {column}"
+    sql = f"lower({sql})"
+    for source, target in CHAR_MAP.items():
+        sql = f"replace({sql}, '{source}', '{target}')"
+    sql = f"regexp_replace({sql}, '{SEPARATORS}', ' ', 'g')"
+    return sa.text(f"array_to_tsvector(array_remove(string_to_array({sql}, ' '), ''))")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for table, columns in SEARCH_COLUMNS.items():
+            op.create_index(f'ix_{table}_search', table, [search_document(columns)], unique=False,
+                            postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in SEARCH_COLUMNS:
+            op.drop_index(f'ix_{table}_search', table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,81 @@
+"""create initial tables
+
+Revision ID: c46db45642cf
+Revises:
+Create Date: 2025-11-28 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c46db45642cf'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def timestamp_columns() -> list:
+    # ستون‌های TimestampMixin و SoftDeleteMixin
+    return [
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('is_deleted', sa.Boolean(), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'parents',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('phone_number', sa.String(length=11), nullable=False),
+        *timestamp_columns(),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_parents_id'), 'parents', ['id'], unique=False)
+    op.create_index(op.f('ix_parents_phone_number'), 'parents', ['phone_number'], unique=True)
+
+    op.create_table(
+        'classes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('teacher_name', sa.String(length=100), nullable=False),
+        *timestamp_columns(),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_classes_id'), 'classes', ['id'], unique=False)
+    op.create_index(op.f('ix_classes_name'), 'classes', ['name'], unique=False)
+
+    op.create_table(
+        'students',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('age', sa.Integer(), nullable=False),
+        sa.Column('grade', sa.Integer(), nullable=False),
+        sa.Column('parent_id', sa.Integer(), nullable=True),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        *timestamp_columns(),
+        sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['parent_id'], ['parents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_students_id'), 'students', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_students_id'), table_name='students')
+    op.drop_table('students')
+    op.drop_index(op.f('ix_classes_name'), table_name='classes')
+    op.drop_index(op.f('ix_classes_id'), table_name='classes')
+    op.drop_table('classes')
+    op.drop_index(op.f('ix_parents_phone_number'), table_name='parents')
+    op.drop_index(op.f('ix_parents_id'), table_name='parents')
+    op.drop_table('parents')
@@ -1,19 +1,44 @@
+import asyncio
 import uvicorn
 from fastapi import FastAPI, Depends
 from contextlib import asynccontextmanager
-from Database.database import engine, Base
+from Database.database import DB_CREATE_ALL, DB_SCHEMA_SETUP, engine, Base, dispose_engines, replica_router
 from utils.auth import auth_router, get_current_user_oauth2
+from utils.internal import health_router, internal_router, metrics_router
+from utils.rate_limit import admission, public_admission
 from Class.api.ClassApi import router as class_router
 from Parent.api.ParentApi import router as parent_router
 from Student.api.StudentApi import router as student_router
+from Stats.api.StatsApi import router as stats_router
+from Stats.summary import stats_summary
+from Sync.api.SyncApi import router as sync_router
+from Search.api.SearchApi import router as search_router
+from Jobs.api.JobApi import router as job_router
+from Jobs.runner import job_runner
 from Middlewares.middlewares import setup_middlewares
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if DB_SCHEMA_SETUP:
+        async with engine.begin() as conn:
+            if DB_CREATE_ALL:
+                await conn.run_sync(Base.metadata.create_all)
+            if stats_summary.enabled:
+                await stats_summary.create(conn)
+    health_checks = asyncio.create_task(replica_router.run_health_checks()) if replica_router.replicas else None
+    # workerهای کارهای پس‌زمینه (کارهای نیمه‌کاره پروسه‌های قبلی دوباره صف می‌شوند)
+    await job_runner.start()
+    # از این به بعد /readyz پاسخ 200 می‌دهد
+    app.state.ready = True
     yield
+    app.state.ready = False
+    await job_runner.stop()
+    if health_checks:
+        health_checks.cancel()
+    stats_summary.close()
+    # بستن اتصال‌های باز Pool (Primary و Replicaها) هنگام خاموش شدن سرور
+    await dispose_engines()
 
 
 app = FastAPI(
@@ -25,13 +50,22 @@ app = FastAPI(
 
 setup_middlewares(app)
 
-# 1. احراز هویت (عمومی)
-app.include_router(auth_router)
+# 1. احراز هویت (عمومی، محدودیت نرخ بر اساس IP)
+app.include_router(auth_router, dependencies=[Depends(public_admission)])
 
-# 2. ماژول‌ها (محافظت شده)
-app.include_router(class_router, dependencies=[Depends(get_current_user_oauth2)])
-app.include_router(parent_router, dependencies=[Depends(get_current_user_oauth2)])
-app.include_router(student_router, dependencies=[Depends(get_current_user_oauth2)])
+# 2. ماژول‌ها (محافظت شده، محدودیت نرخ و همزمانی بر اساس کاربر)
+app.include_router(class_router, dependencies=[Depends(get_current_user_oauth2), Depends(admission)])
+app.include_router(parent_router, dependencies=[Depends(get_current_user_oauth2), Depends(admission)])
+app.include_router(student_router, dependencies=[Depends(get_current_user_oauth2), Depends(admission)])
+app.include_router(stats_router, dependencies=[Depends(get_current_user_oauth2), Depends(admission)])
+app.include_router(sync_router, dependencies=[Depends(get_current_user_oauth2), Depends(admission)])
+app.include_router(search_router, dependencies=[Depends(get_current_user_oauth2), Depends(admission)])
+app.include_router(job_router, dependencies=[Depends(get_current_user_oauth2), Depends(admission)])
+
+# 3. مانیتورینگ داخلی (محافظت شده)
+app.include_router(internal_router, dependencies=[Depends(get_current_user_oauth2)])
+app.include_router(metrics_router)
+app.include_router(health_router)
 
 
 @app.get("/")
@@ -40,4 +74,5 @@ async def root():
 
 
 if __name__ == "__main__":
+    # اجرای توسعه؛ برای production از serve.py استفاده کنید
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
@@ -0,0 +1,201 @@
+"""
+اجرای production سرور: چند پروسه worker با uvloop/httptools (در صورت نصب بودن).
+
+هر worker یک پروسه جدا با event loop، Pool اتصال دیتابیس و صف کارهای پس‌زمینه خودش است.
+قبل از ساخت workerها اتصال دیتابیس یک بار بررسی می‌شود تا پیکربندی اشتباه همان ابتدا و با
+پیام روشن شکست بخورد، و schema (migrationهای alembic و materialized viewهای آمار) هم فقط یک بار
+همین‌جا ساخته می‌شود؛ workerها با DB_SCHEMA_SETUP=false این مرحله را در lifespan رد می‌کنند تا
+چند پروسه همزمان DDL اجرا نکنند. با SIGTERM/SIGINT اتصال جدید پذیرفته نمی‌شود، درخواست‌های در حال اجرا تا
+SERVER_GRACEFUL_TIMEOUT ثانیه کامل می‌شوند و سپس lifespan workerها صف کارها را متوقف و Pool را خالی می‌کند.
+آمادگی هر worker از /readyz و زنده بودنش از /healthz قابل بررسی است.
+
+اجرا:
+    python serve.py
+    python serve.py --workers 4 --port 8080 --limit-concurrency 200
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+
+import uvicorn
+
+from utils.config import env_int, env_float, env_bool
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = env_int("SERVER_PORT", 8000)
+# 0 یعنی به تعداد هسته‌های در دسترس این پروسه
+SERVER_WORKERS = env_int("SERVER_WORKERS", 0)
+# نگه داشتن اتصال بیکار HTTP (ثانیه)؛ باید از timeout بیکاری Load Balancer جلوی سرور کمتر باشد
+SERVER_KEEP_ALIVE = env_int("SERVER_KEEP_ALIVE", 5)
+# صف اتصال‌های پذیرفته نشده سوکت (listen backlog)
+SERVER_BACKLOG = env_int("SERVER_BACKLOG", 2048)
+# بیشترین اتصال/درخواست همزمان هر worker؛ بیشتر از آن پاسخ 503 می‌گیرد (0 یعنی بدون سقف).
+# صف پذیرش درخواست‌ها (RATE_LIMIT_MAX_IN_FLIGHT + RATE_LIMIT_MAX_QUEUE) جلوتر از این سقف عمل می‌کند.
+SERVER_LIMIT_CONCURRENCY = env_int("SERVER_LIMIT_CONCURRENCY", 0)
+# بازنشانی worker بعد از این تعداد درخواست (0 یعنی هرگز)
+SERVER_LIMIT_MAX_REQUESTS = env_int("SERVER_LIMIT_MAX_REQUESTS", 0)
+SERVER_GRACEFUL_TIMEOUT = env_int("SERVER_GRACEFUL_TIMEOUT", 30)
+SERVER_PROXY_HEADERS = env_bool("SERVER_PROXY_HEADERS", True)
+SERVER_FORWARDED_ALLOW_IPS = os.getenv("SERVER_FORWARDED_ALLOW_IPS", "127.0.0.1")
+SERVER_DB_CHECK_TIMEOUT = env_float("SERVER_DB_CHECK_TIMEOUT", 10.0)
+
+logger = logging.getLogger("school_api.serve")
+
+
+def available_cpus() -> int:
+    # در Container یا با taskset فقط هسته‌های مجاز شمرده می‌شوند
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Production server for the school API")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS or available_cpus(),
+                        help="worker processes (default: available CPU cores)")
+    parser.add_argument("--keep-alive", type=int, default=SERVER_KEEP_ALIVE, help="idle keep-alive timeout (s)")
+    parser.add_argument("--backlog", type=int, default=SERVER_BACKLOG)
+    parser.add_argument("--limit-concurrency", type=int, default=SERVER_LIMIT_CONCURRENCY,
+                        help="max concurrent connections per worker before 503 (0 = unlimited)")
+    parser.add_argument("--limit-max-requests", type=int, default=SERVER_LIMIT_MAX_REQUESTS,
+                        help="restart a worker after this many requests (0 = never)")
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT,
+                        help="seconds to finish in-flight requests on shutdown")
+    parser.add_argument("--skip-db-check", action="store_true", help="start without checking the database first")
+    parser.add_argument("--skip-migrate", action="store_true",
+                        help="do not run alembic migrations before starting (schema is managed elsewhere)")
+    return parser.parse_args(argv)
+
+
+async def check_database(timeout: float = SERVER_DB_CHECK_TIMEOUT):
+    """یک SELECT 1 روی Primary با engine موقت (Pool اصلی در workerها ساخته می‌شود)"""
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+    from Database.database import DATABASE_URL
+
+    engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout)
+    finally:
+        await engine.dispose()
+
+
+async def create_views():
+    """materialized viewهای آمار با engine موقت (CREATE ... IF NOT EXISTS)"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+    from Database.database import Base, DATABASE_URL, DB_CREATE_ALL
+    from Stats.summary import stats_summary
+
+    engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+    try:
+        async with engine.begin() as conn:
+            if DB_CREATE_ALL:
+                await conn.run_sync(Base.metadata.create_all)
+            if stats_summary.enabled:
+                await stats_summary.create(conn)
+    finally:
+        await engine.dispose()
+
+
+def setup_schema(migrate: bool = True):
+    """ساخت schema یک بار در پروسه اصلی، قبل از ساخت workerها"""
+    from Database.database import DB_CREATE_ALL
+    from Database.migrate import upgrade
+
+    if migrate and not DB_CREATE_ALL:
+        upgrade()
+    asyncio.run(create_views())
+
+
+def check_settings(workers: int) -> list:
+    """هشدار برای تنظیماتی که با چند worker رفتار متفاوتی دارند"""
+    from Database.database import (
+        DATABASE_REPLICA_URLS, DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_REPLICA_STICKY_BACKEND, DB_USE_NULLPOOL,
+    )
+    from utils.cache import CACHE_BACKEND
+    from utils.rate_limit import RATE_LIMIT_BACKEND, RATE_LIMIT_ENABLED
+
+    warnings = []
+    if workers > 1 and CACHE_BACKEND == "memory":
+        warnings.append("CACHE_BACKEND=memory: each worker has its own cache and writes only invalidate the "
+                        "worker that served them; use CACHE_BACKEND=redis or expect stale reads up to "
+                        "CACHE_TTL_SECONDS")
+    if workers > 1 and RATE_LIMIT_ENABLED and RATE_LIMIT_BACKEND == "memory":
+        warnings.append(f"RATE_LIMIT_BACKEND=memory: each worker keeps its own token buckets, so clients get up "
+                        f"to {workers}x the configured rate; use RATE_LIMIT_BACKEND=redis")
+    if workers > 1 and DATABASE_REPLICA_URLS and DB_REPLICA_STICKY_BACKEND == "memory":
+        warnings.append("DB_REPLICA_STICKY_BACKEND=memory: each worker only sees its own recent writes, so a "
+                        "client can read stale data from a replica through another worker, and another worker "
+                        "can cache a stale replica read; use DB_REPLICA_STICKY_BACKEND=redis")
+    if not DB_USE_NULLPOOL:
+        logger.info("database connections: up to %d (%d workers x (%d pool + %d overflow))",
+                    workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW), workers, DB_POOL_SIZE, DB_MAX_OVERFLOW)
+    return warnings
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    args = parse_args(argv)
+
+    for warning in check_settings(args.workers):
+        logger.warning(warning)
+
+    if not args.skip_db_check:
+        try:
+            asyncio.run(check_database())
+        except Exception as exc:
+            logger.error("database is not reachable, not starting: %s: %s", type(exc).__name__, exc)
+            return 1
+
+    try:
+        setup_schema(migrate=not args.skip_migrate)
+    except Exception as exc:
+        logger.error("schema setup failed, not starting: %s: %s", type(exc).__name__, exc)
+        return 1
+    # workerها (که محیط این پروسه را به ارث می‌برند) دوباره DDL اجرا نکنند
+    os.environ["DB_SCHEMA_SETUP"] = "false"
+
+    loop, http = event_loop(), http_protocol()
+    logger.info("starting %d worker(s) on %s:%d (loop=%s, http=%s)", args.workers, args.host, args.port, loop, http)
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        # API فقط HTTP دارد؛ خطای startup (مثلاً شروع صف کارها) worker را متوقف می‌کند
+        ws="none",
+        lifespan="on",
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        limit_concurrency=args.limit_concurrency or None,
+        limit_max_requests=args.limit_max_requests or None,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=SERVER_PROXY_HEADERS,
+        forwarded_allow_ips=SERVER_FORWARDED_ALLOW_IPS,
+        # لاگ هر درخواست را middleware برنامه ثبت می‌کند
+        access_log=False,
+        server_header=False,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
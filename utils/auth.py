@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from datetime import datetime, timedelta, UTC
 from jose import jwt, JWTError
+from utils.config import env_int
 
 SECRET_KEY = ""
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 
+# jose (پیش‌فرض) یا pyjwt برای بررسی امضای توکن
+JWT_BACKEND = os.getenv("JWT_BACKEND", "jose")
+# تعداد توکن‌های تایید شده‌ای که تا زمان انقضا در حافظه نگه داشته می‌شوند
+AUTH_TOKEN_CACHE_SIZE = env_int("AUTH_TOKEN_CACHE_SIZE", 10000)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -26,12 +36,113 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     raise HTTPException(status_code=401, detail="incorrect username or password")
 
 
-async def get_current_user_oauth2(token: str = Depends(oauth2_scheme)):
+def _decode_jose(token: str) -> dict:
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+def _decode_pyjwt(token: str) -> dict:
+    import jwt as pyjwt
+
+    try:
+        return pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except pyjwt.PyJWTError as exc:
+        raise JWTError(str(exc))
+
+
+decode_token = _decode_pyjwt if JWT_BACKEND == "pyjwt" else _decode_jose
+
+
+class TokenCache:
+    """
+    کش LRU توکن‌های تایید شده بر اساس digest توکن (خود توکن ذخیره نمی‌شود).
+    هر مدخل تا زمان exp توکن معتبر است.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # digest -> (username, exp)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, digest: bytes):
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            del self._entries[digest]
+            return None
+        self._entries.move_to_end(digest)
+        return entry[0]
+
+    def set(self, digest: bytes, username: str, exp):
+        self._entries[digest] = (username, exp)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class AuthStats:
+    def __init__(self):
+        self.requests = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float):
+        self.requests += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+
+token_cache = TokenCache(AUTH_TOKEN_CACHE_SIZE)
+auth_stats = AuthStats()
+
+
+def verify_token(token: str) -> str:
+    digest = hashlib.sha256(token.encode()).digest()
+    username = token_cache.get(digest)
+    if username is not None:
+        token_cache.hits += 1
+        return username
+
+    token_cache.misses += 1
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="invalid token")
-        return username
     except JWTError:
-        raise HTTPException(status_code=401, detail="invalid token or expired")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="invalid token or expired")
+
+    token_cache.set(digest, username, payload.get("exp"))
+    return username
+
+
+async def get_current_user_oauth2(request: Request, token: str = Depends(oauth2_scheme)):
+    # FastAPI نتیجه این dependency را در طول یک درخواست کش می‌کند،
+    # پس dependencyهای دیگر (مثل rate limit) می‌توانند بدون بررسی دوباره از آن استفاده کنند
+    start = time.perf_counter()
+    try:
+        return verify_token(token)
+    finally:
+        elapsed = time.perf_counter() - start
+        auth_stats.record(elapsed)
+        request.state.auth_time = elapsed
+
+
+def get_auth_stats() -> dict:
+    lookups = token_cache.hits + token_cache.misses
+    return {
+        "backend": JWT_BACKEND,
+        "requests": auth_stats.requests,
+        "avg_time_us": round(auth_stats.total_time / auth_stats.requests * 1e6, 2) if auth_stats.requests else 0.0,
+        "max_time_us": round(auth_stats.max_time * 1e6, 2),
+        "cache_hits": token_cache.hits,
+        "cache_misses": token_cache.misses,
+        "cache_hit_ratio": round(token_cache.hits / lookups, 4) if lookups else 0.0,
+        "cache_size": len(token_cache),
+    }
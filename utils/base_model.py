@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Boolean, DateTime, func
+from sqlalchemy import Column, Boolean, DateTime, Index, func, text, update
 from sqlalchemy.orm import DeclarativeBase
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone
+from functools import lru_cache
 from sqlalchemy.ext.asyncio import AsyncSession
 import jdatetime
 
@@ -9,6 +10,58 @@ class Base(DeclarativeBase):
     pass
 
 
+# اختلاف ثابت منطقه زمانی تهران با UTC (بدون ساعت تابستانی)
+TEHRAN_OFFSET_MINUTES = 3 * 60 + 30
+# شماره روز (ordinal) تاریخ 1970/01/01 میلادی
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=8192)
+def _jalali_date(day_ordinal: int) -> str:
+    # تبدیل تقویم فقط یک بار برای هر روز انجام می‌شود (حدود ۲۲ سال در کش)
+    jdate = jdatetime.date.fromgregorian(date=date.fromordinal(day_ordinal))
+    return jdate.strftime("%Y/%m/%d")
+
+
+def to_jalali_tehran(dt: datetime | None) -> str:
+    """
+    تاریخ و ساعت شمسی به وقت تهران با فرمت YYYY/MM/DD HH:MM.
+    تاریخ شمسی بر اساس روز کش می‌شود و ساعت و دقیقه با محاسبه عددی به دست می‌آید.
+    """
+    if not dt:
+        return "-"
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+
+    minutes = int(dt.timestamp() // 60) + TEHRAN_OFFSET_MINUTES
+    days, minute_of_day = divmod(minutes, 1440)
+    hour, minute = divmod(minute_of_day, 60)
+    return f"{_jalali_date(days + EPOCH_ORDINAL)} {hour:02d}:{minute:02d}"
+
+
+# شرط ایندکس‌های جزئی؛ باید دقیقاً با فیلتر کوئری‌ها (is_deleted.is_(False)) یکی باشد،
+# وگرنه PostgreSQL نمی‌تواند از ایندکس استفاده کند (NOT is_deleted با IS FALSE تطبیق داده نمی‌شود)
+NOT_DELETED = "is_deleted IS FALSE"
+
+
+def not_deleted_index(name: str, *columns) -> Index:
+    """ایندکس جزئی روی ردیف‌های حذف نشده (در SQLite ایندکس کامل ساخته می‌شود)"""
+    return Index(name, *columns, postgresql_where=text(NOT_DELETED))
+
+
+def changed_at(model):
+    """
+    زمان آخرین تغییر ردیف (ساخت، ویرایش، حذف نرم یا بازیابی).
+    updated_at در ساخت خالی است و هر نوشتن دیگری (شامل حذف نرم و بازیابی) آن را به‌روز می‌کند.
+    """
+    return func.coalesce(model.updated_at, model.created_at)
+
+
+def changed_at_index(model) -> Index:
+    """ایندکس عبارتی (changed_at, id) برای فید تغییرات /sync"""
+    return Index(f"ix_{model.__tablename__}_changed_at", changed_at(model), model.id)
+
+
 class TimestampMixin:
     is_active = Column(Boolean, default=True, nullable=False)
 
@@ -23,15 +76,7 @@ class TimestampMixin:
     )
 
     def _to_jalali_tehran(self, dt: datetime | None) -> str:
-        if not dt:
-            return "-"
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-
-        tehran_tz = timezone(timedelta(hours=3, minutes=30))
-        dt_tehran = dt.astimezone(tehran_tz)
-        jdt = jdatetime.datetime.fromgregorian(datetime=dt_tehran)
-        return jdt.strftime("%Y/%m/%d %H:%M")
+        return to_jalali_tehran(dt)
 
     @property
     def created_at_fa(self) -> str:
@@ -52,7 +97,7 @@ class SoftDeleteMixin:
         self.deleted_at = datetime.now(timezone.utc)
 
         if hasattr(self, 'updated_at'):
-            self.updated_at = self.updated_at
+            self.updated_at = func.now()
 
         db.add(self)
         await db.commit()
@@ -61,24 +106,46 @@ class SoftDeleteMixin:
     async def restore(self, db: AsyncSession):
 
         self.is_deleted = False
+        self.deleted_at = None
 
         if hasattr(self, 'updated_at'):
-            self.updated_at = self.updated_at
+            self.updated_at = func.now()
 
         db.add(self)
         await db.commit()
         await db.refresh(self)
 
+    @classmethod
+    async def bulk_soft_delete(cls, db: AsyncSession, *criteria) -> list[int]:
+        """
+        حذف نرم گروهی با یک دستور UPDATE ... RETURNING.
+        commit بر عهده فراخواننده است تا کل Cascade در یک تراکنش انجام شود.
+        شناسه ردیف‌های تغییر کرده برگردانده می‌شود.
+        """
+        result = await db.execute(
+            update(cls)
+            .where(cls.is_deleted.is_(False), *criteria)
+            .values(is_deleted=True, deleted_at=datetime.now(timezone.utc), updated_at=func.now())
+            .returning(cls.id)
+            .execution_options(synchronize_session="fetch")
+        )
+        return list(result.scalars().all())
+
+    @classmethod
+    async def bulk_restore(cls, db: AsyncSession, *criteria) -> list[int]:
+        """
+        بازیابی گروهی با یک دستور UPDATE ... RETURNING (بدون commit).
+        updated_at به‌روز و deleted_at پاک می‌شود تا بازیابی در فید تغییرات (/sync) دیده شود.
+        """
+        result = await db.execute(
+            update(cls)
+            .where(cls.is_deleted.is_(True), *criteria)
+            .values(is_deleted=False, deleted_at=None, updated_at=func.now())
+            .returning(cls.id)
+            .execution_options(synchronize_session="fetch")
+        )
+        return list(result.scalars().all())
+
     @property
     def deleted_at_fa(self) -> str:
-        if not self.deleted_at:
-            return "-"
-
-        dt = self.deleted_at
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-
-        tehran_tz = timezone(timedelta(hours=3, minutes=30))
-        dt_tehran = dt.astimezone(tehran_tz)
-        jdt = jdatetime.datetime.fromgregorian(datetime=dt_tehran)
-        return jdt.strftime("%Y/%m/%d %H:%M")
+        return to_jalali_tehran(self.deleted_at)
@@ -0,0 +1,130 @@
+import json
+from typing import Any, List, Optional, Type
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.cache import list_tag, response_cache, tags_for
+
+MAX_BATCH_SIZE = 50000
+BATCH_CHUNK_SIZE = 1000
+
+# بدنه درخواست‌های batch می‌تواند آرایه JSON یا NDJSON (هر خط یک آبجکت) باشد
+BATCH_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": {"type": "object"}}},
+            "application/x-ndjson": {"schema": {"type": "string"}},
+        },
+    }
+}
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[Any] = None
+
+
+class BatchDelete(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+async def read_batch_items(request: Request) -> list:
+    body = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid JSON body")
+
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="batch body must be a JSON array or NDJSON")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"batch size is limited to {MAX_BATCH_SIZE} items")
+    return items
+
+
+def validate_items(items: list, schema: Type[BaseModel], results: list) -> list:
+    """
+    اعتبارسنجی هر آیتم با اسکیمای Create/Update موجود.
+    آیتم‌های نامعتبر به صورت خطا در results ثبت و بقیه برگردانده می‌شوند.
+    """
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.model_validate(item)))
+        except ValidationError as exc:
+            results[index] = BatchItemResult(
+                index=index, status="error", detail=exc.errors(include_url=False, include_context=False)
+            )
+    return valid
+
+
+def resume_items(valid: list, results: list, start: int) -> list:
+    """آیتم‌هایی که تلاش قبلی یک کار پس‌زمینه ثبت کرده دوباره اجرا نمی‌شوند"""
+    for index, _ in valid:
+        if index < start:
+            results[index] = BatchItemResult(index=index, status="skipped", detail="processed by an earlier attempt")
+    return [(index, item) for index, item in valid if index >= start]
+
+
+def chunked(seq: list, size: int = BATCH_CHUNK_SIZE):
+    for start in range(0, len(seq), size):
+        yield seq[start:start + size]
+
+
+def dialect_insert(db: AsyncSession, model):
+    """insert مخصوص دیالکت برای پشتیبانی از ON CONFLICT (PostgreSQL یا SQLite)"""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    return insert(model)
+
+
+async def existing_ids(db: AsyncSession, model, ids) -> set:
+    """یک کوئری برای بررسی وجود (و حذف نشدن) همه شناسه‌های یک chunk"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return set()
+    result = await db.execute(
+        select(model.id).where(model.id.in_(ids), model.is_deleted.is_(False))
+    )
+    return set(result.scalars().all())
+
+
+async def batch_soft_delete(db: AsyncSession, model, ids: List[int], cascades=()) -> List[BatchItemResult]:
+    """
+    حذف نرم گروهی شناسه‌ها به همراه Cascade روی جداول فرزند، در یک تراکنش.
+    cascades: لیستی از (مدل فرزند, ستون کلید خارجی)
+    """
+    deleted = set()
+    tags = [list_tag(model)]
+    for chunk in chunked(ids):
+        chunk_deleted = await model.bulk_soft_delete(db, model.id.in_(chunk))
+        for child, fk_column in cascades:
+            if chunk_deleted:
+                child_deleted = await child.bulk_soft_delete(db, fk_column.in_(chunk_deleted))
+                tags += [list_tag(child), *tags_for(child, *child_deleted)]
+        deleted.update(chunk_deleted)
+    await db.commit()
+    await response_cache.invalidate(*tags, *tags_for(model, *deleted))
+
+    return [
+        BatchItemResult(index=index, status="deleted" if item_id in deleted else "not_found", id=item_id)
+        for index, item_id in enumerate(ids)
+    ]
+
+
+def null_required_fields(data: dict, fields) -> list:
+    """فیلدهای NOT NULL که در آیتم آپدیت صراحتاً null ارسال شده‌اند"""
+    return [field for field in fields if field in data and data[field] is None]
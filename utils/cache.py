@@ -0,0 +1,347 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from utils.config import env_bool, env_int
+from utils.etag import (
+    CACHE_CONTROL, body_etag, etag_index, etag_matches, http_date, is_conditional, loaded_last_modified,
+    not_modified_response, not_modified_since,
+)
+from utils.fast_json import serialize
+
+# memory: کش داخل پروسه (LRU + TTL) | redis: کش مشترک بین workerها | none: غیرفعال
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = env_int("CACHE_TTL_SECONDS", 30)
+CACHE_MAX_ENTRIES = env_int("CACHE_MAX_ENTRIES", 10000)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# درخواست‌های یکسان همزمان منتظر یک بار لود و سریالایز می‌مانند (مستقل از بک‌اند کش)
+CACHE_SINGLE_FLIGHT = env_bool("CACHE_SINGLE_FLIGHT", True)
+
+# کلیدهای روابط تو در تو در پاسخ‌ها و جدول متناظر آن‌ها (برای برچسب‌گذاری)
+NESTED_TABLES = {"parent": "parents", "class_": "classes", "students": "students"}
+
+
+def list_tag(model) -> str:
+    return f"{model.__tablename__}:list"
+
+
+def tags_for(model, *ids) -> list:
+    return [f"{model.__tablename__}:{item_id}" for item_id in ids if item_id is not None]
+
+
+def collect_tags(table: str, data) -> set:
+    """
+    برچسب همه موجودیت‌هایی که در پاسخ آمده‌اند (خود آیتم و روابط تو در تو).
+    با تغییر هر کدام از این موجودیت‌ها، پاسخ کش شده باطل می‌شود.
+    """
+    items = data if isinstance(data, list) else [data]
+    tags = {f"{table}:list"} if isinstance(data, list) else set()
+    for item in items:
+        tags.add(f"{table}:{item['id']}")
+        for key, nested_table in NESTED_TABLES.items():
+            nested = item.get(key)
+            for entry in nested if isinstance(nested, list) else [nested]:
+                if entry:
+                    tags.add(f"{nested_table}:{entry['id']}")
+    return tags
+
+
+def cache_key(request: Request) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+class MemoryCacheBackend:
+    """کش LRU با TTL داخل پروسه؛ هر مدخل برچسب‌هایش را برای ابطال دقیق نگه می‌دارد"""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = defaultdict(set)  # tag -> keys
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            for tag in entry[2]:
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: dict, tags: set):
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._tags[tag].add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def invalidate(self, tags):
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._drop(key)
+
+    async def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+
+class RedisCacheBackend:
+    """
+    کش مشترک روی Redis (یا هر کلاینت سازگار با redis.asyncio).
+    برای هر برچسب یک SET از کلیدها نگه داشته می‌شود؛ Eviction بر عهده خود Redis است.
+    """
+
+    def __init__(self, client, ttl: int, prefix: str = "school_api:cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str):
+        raw = await self.client.get(self.prefix + key)
+        if not raw:
+            return None
+        value = json.loads(raw)
+        value["body"] = value["body"].encode()
+        return value
+
+    async def set(self, key: str, value: dict, tags: set):
+        stored = {**value, "body": value["body"].decode()}
+        await self.client.set(self.prefix + key, json.dumps(stored, ensure_ascii=False), ex=self.ttl)
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            await self.client.sadd(tag_key, key)
+            await self.client.expire(tag_key, self.ttl)
+
+    async def invalidate(self, tags):
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys = await self.client.smembers(tag_key)
+            keys = [k.decode() if isinstance(k, bytes) else k for k in keys]
+            await self.client.delete(tag_key, *[self.prefix + k for k in keys])
+
+    async def clear(self):
+        keys = [k async for k in self.client.scan_iter(match=self.prefix + "*")]
+        if keys:
+            await self.client.delete(*keys)
+
+
+class SingleFlight:
+    """
+    اجرای یکباره کارهای همزمان با کلید یکسان: اولین درخواست (leader) کار را انجام می‌دهد و
+    بقیه منتظر همان نتیجه (یا همان خطا) می‌مانند. کار در task خود leader اجرا می‌شود تا از Session
+    دیتابیس همان درخواست استفاده کند؛ اگر leader لغو شود، منتظرها خودشان دوباره تلاش می‌کنند.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls = {}  # key -> Future
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key, func: Callable[[], Awaitable]):
+        """(نتیجه، آیا نتیجه از کار درخواست دیگری گرفته شد؟)"""
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            return await self.do(key, func)
+
+        future = asyncio.get_running_loop().create_future()
+        # خطای leader بدون منتظر هم «بازیابی شده» علامت می‌خورد (بدون هشدار asyncio)
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+
+def render(adapter: TypeAdapter, result, response: Response):
+    """
+    سریالایز نتیجه با adapter؛ خروجی (داده JSON، بدنه بایتی، هدرها).
+    هدرها شامل هدرهای تنظیم شده روی response (مثل کرسر صفحه بعد) و ETag بدنه هستند
+    و برای پاسخ‌های تکی، Last-Modified از زمان‌های لود شده ساخته می‌شود.
+    """
+    data, body = serialize(adapter, result)
+    headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+    headers["ETag"] = body_etag(body)
+    headers["Cache-Control"] = CACHE_CONTROL
+    last_modified = loaded_last_modified(result)
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return data, body, headers
+
+
+class ResponseCache:
+    """
+    کش Read-Through پاسخ‌های GET.
+    پاسخ سریالایز شده (بایت‌های JSON به همراه هدرها) بر اساس مسیر و پارامترها ذخیره می‌شود
+    و handlerهای نوشتن با برچسب موجودیت‌ها آن را باطل می‌کنند.
+    درخواست‌های شرطی (If-None-Match) در صورت تطابق ETag پاسخ 304 می‌گیرند.
+    درخواست‌های یکسانی که همزمان به کش نرسیده‌اند یک بار لود و سریالایز می‌شوند (SingleFlight).
+    """
+
+    def __init__(self, backend=None, single_flight: bool = CACHE_SINGLE_FLIGHT):
+        self.backend = backend
+        self.flights = SingleFlight() if single_flight else None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.not_modified = 0
+        self._listeners = []
+
+    def on_invalidate(self, listener: Callable[[set], None]):
+        """ثبت تابعی که با برچسب‌های هر ابطال (یعنی هر نوشتن) فراخوانی می‌شود"""
+        self._listeners.append(listener)
+
+    def _not_modified(self, headers: dict) -> Response:
+        self.not_modified += 1
+        return not_modified_response(headers)
+
+    async def serve(
+            self,
+            request: Request,
+            response: Response,
+            adapter: TypeAdapter,
+            load: Callable[[], Awaitable],
+            tags: Optional[set] = None,
+            version: Optional[Callable[[], Awaitable]] = None,
+    ):
+        """
+        version: تابع کوئری سبک نسخه داده‌ها (RowVersion) که فقط برای درخواست‌های شرطی اجرا می‌شود
+        تا در صورت یکسان بودن نسخه، 304 بدون لود و سریالایز برگردانده شود.
+        """
+        key = cache_key(request)
+        # تنظیم شده در Database.database.get_read_db (فقط با وجود Replica)
+        bypass = getattr(request.state, "cache_bypass", False)
+        store = not getattr(request.state, "cache_no_store", False)
+        if self.backend is not None and not bypass:
+            entry = await self.backend.get(key)
+            if entry is not None:
+                self.hits += 1
+                if etag_matches(request, entry["headers"].get("ETag")):
+                    return self._not_modified(entry["headers"])
+                return Response(entry["body"], media_type="application/json", headers=entry["headers"])
+            self.misses += 1
+
+        current = await version() if version is not None and is_conditional(request) else None
+        if current is not None and not bypass:
+            etag = etag_index.get(key, current)
+            if etag_matches(request, etag):
+                return self._not_modified({"ETag": etag, "Cache-Control": CACHE_CONTROL})
+            if not_modified_since(request, current):
+                return self._not_modified({"Last-Modified": http_date(current.last_modified),
+                                           "Cache-Control": CACHE_CONTROL})
+
+        invalidations = self.invalidations
+
+        async def produce():
+            # بدون کش هم خروجی با همان adapter (که ممکن است فقط شامل فیلدهای انتخابی باشد) ساخته می‌شود
+            return render(adapter, await load(), response)
+
+        if self.flights is not None:
+            # شماره ابطال جزء کلید است: درخواستی که بعد از یک نوشتن رسیده به لود قدیمی‌تر ملحق نمی‌شود؛
+            # کلاینت تازه نوشته (خواندن از Primary) هم به لود دیگران از Replica ملحق نمی‌شود
+            (data, body, headers), coalesced = await self.flights.do((key, invalidations, bypass), produce)
+        else:
+            (data, body, headers), coalesced = await produce(), False
+        if coalesced or not store:
+            # لود مال درخواست دیگری بوده و ممکن است قبل از خواندن نسخه این درخواست شروع شده باشد،
+            # پس نه در etag_index ثبت می‌شود و نه (دوباره) در کش. خواندن از Replica عقب مانده هم همین‌طور
+            current = None
+        if current is not None:
+            # نسخه قبل از لود خوانده شده؛ نوشتن همزمان فقط باعث یک 200 اضافه می‌شود نه 304 اشتباه
+            etag_index.set(key, current, headers["ETag"])
+
+        # اگر در حین خواندن، نوشتنی انجام شده باشد، نتیجه (احتمالاً قدیمی) کش نمی‌شود
+        if self.backend is not None and store and not coalesced and invalidations == self.invalidations:
+            table = request.url.path.strip("/").split("/")[0]
+            await self.backend.set(key, {"body": body, "headers": headers}, tags or collect_tags(table, data))
+        if etag_matches(request, headers["ETag"]):
+            return self._not_modified(headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def invalidate(self, *tags):
+        self.invalidations += 1
+        tags = set(tags)
+        for listener in self._listeners:
+            listener(tags)
+        if self.backend is not None:
+            await self.backend.invalidate(tags)
+
+    async def clear(self):
+        etag_index.clear()
+        if self.backend is not None:
+            await self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "not_modified": self.not_modified,
+            "etag_versions": len(etag_index),
+            "single_flight_loads": self.flights.leaders if self.flights is not None else None,
+            "coalesced": self.flights.coalesced if self.flights is not None else None,
+            "in_flight": len(self.flights) if self.flights is not None else None,
+            "evictions": getattr(self.backend, "evictions", None),
+            "entries": len(self.backend) if isinstance(self.backend, MemoryCacheBackend) else None,
+        }
+
+
+def build_backend(name: str = CACHE_BACKEND) -> Optional[object]:
+    if name == "memory":
+        return MemoryCacheBackend(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+    if name == "redis":
+        import redis.asyncio as redis  # وابستگی اختیاری
+
+        return RedisCacheBackend(redis.from_url(REDIS_URL), CACHE_TTL_SECONDS)
+    return None
+
+
+response_cache = ResponseCache(build_backend())
@@ -0,0 +1,176 @@
+"""
+ETag و درخواست‌های شرطی (If-None-Match / If-Modified-Since) برای GETهای قابل کش.
+
+ETag هر پاسخ هش بدنه آن است (Strong). برای درخواست‌های شرطی یک کوئری تجمیعی سبک
+(تعداد، مجموع idها و بیشترین created_at/updated_at/deleted_at ردیف‌ها و روابطشان) نسخه داده را
+بدون خواندن خود ردیف‌ها مشخص می‌کند؛ اگر ETag همین نسخه قبلاً ساخته شده و با ETag کلاینت یکی باشد،
+پاسخ 304 بدون لود و سریالایز برگردانده می‌شود. درخواست‌های بدون هدر شرطی کوئری اضافه‌ای ندارند.
+"""
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import distinct, func, inspect, select
+from sqlalchemy.orm import InstanceState, aliased
+
+from utils.config import env_int
+from utils.pagination import PageParams, page_query
+
+# تعداد نگاشت‌های «نسخه داده -> ETag» نگه داشته شده در هر پروسه
+ETAG_INDEX_SIZE = env_int("ETAG_INDEX_SIZE", 10000)
+
+TIMESTAMP_COLUMNS = ("created_at", "updated_at", "deleted_at")
+# کلاینت باید همیشه اعتبارسنجی کند (مرورگر بر اساس Last-Modified کش ابتکاری نسازد)
+CACHE_CONTROL = "private, no-cache"
+VALIDATOR_HEADERS = ("ETag", "Last-Modified", "Cache-Control")
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_entity(value) -> bool:
+    return isinstance(inspect(value, raiseerr=False), InstanceState)
+
+
+def loaded_last_modified(obj) -> Optional[datetime]:
+    """
+    جدیدترین زمان ثبت شده در یک آبجکت ORM و روابط لود شده‌اش.
+    فقط مقادیر از قبل لود شده خوانده می‌شوند (بدون Lazy Load)؛ ستون‌هایی که با fields حذف شده‌اند
+    نادیده گرفته می‌شوند و نتیجه در بدترین حالت قدیمی‌تر از مقدار واقعی است.
+    """
+    if not is_entity(obj):
+        return None
+    items = [obj]
+    for value in vars(obj).values():
+        if is_entity(value):
+            items.append(value)
+        elif isinstance(value, list):
+            items.extend(item for item in value if is_entity(item))
+    stamps = [vars(item).get(name) for item in items for name in TIMESTAMP_COLUMNS]
+    return max((stamp for stamp in stamps if stamp is not None), default=None)
+
+
+class Version:
+    """نسخه داده‌های یک پاسخ؛ parts برای مقایسه و last_modified برای If-Modified-Since"""
+
+    def __init__(self, parts: tuple, last_modified: Optional[datetime], exact: bool):
+        self.parts = parts
+        self.last_modified = last_modified
+        # با روابط یک به چند، خارج شدن یک ردیف از رابطه زمان هیچ ردیف باقیمانده‌ای را تغییر نمی‌دهد،
+        # پس فقط ETag (که تعداد و idها را هم در بر دارد) قابل اعتماد است
+        self.exact = exact
+
+
+class RowVersion:
+    """کوئری نسخه ردیف‌های یک مدل به همراه روابطی که در پاسخ آمده‌اند"""
+
+    def __init__(self, model, relations=()):
+        self.model = model
+        self.relations = [getattr(model, name) for name in relations]
+        self.exact = not any(relation.property.uselist for relation in self.relations)
+
+    def _statement(self, criteria):
+        model = self.model
+        columns = [func.count(distinct(model.id)), func.sum(distinct(model.id))]
+        columns += [func.max(getattr(model, name)) for name in TIMESTAMP_COLUMNS]
+        stmt = select().select_from(model)
+        for relation in self.relations:
+            target = aliased(relation.property.mapper.class_)
+            stmt = stmt.outerjoin(relation.of_type(target))
+            columns += [func.count(target.id), func.sum(target.id)]
+            columns += [func.max(getattr(target, name)) for name in TIMESTAMP_COLUMNS]
+        return stmt.add_columns(*columns).where(criteria)
+
+    async def _fetch(self, db, criteria, exact: bool) -> Optional[Version]:
+        row = tuple((await db.execute(self._statement(criteria))).one())
+        if not row[0]:
+            return None
+        stamps = [value for value in row if isinstance(value, datetime)]
+        return Version(row, max(stamps, default=None), exact)
+
+    async def page(self, db, stmt, page: PageParams) -> Optional[Version]:
+        """
+        نسخه همان صفحه‌ای که paginate برمی‌گرداند (شامل ردیف اضافه تعیین کننده کرسر بعدی).
+        خارج شدن یک ردیف از فیلتر لیست زمان ردیف‌های باقیمانده را تغییر نمی‌دهد، پس نسخه لیست دقیق نیست.
+        """
+        ids = page_query(stmt.with_only_columns(self.model.id), self.model.id, page)
+        return await self._fetch(db, self.model.id.in_(ids), exact=False)
+
+    async def item(self, db, item_id: int) -> Optional[Version]:
+        return await self._fetch(db, self.model.id == item_id, exact=self.exact)
+
+
+class ETagIndex:
+    """نگاشت LRU از (کلید درخواست، نسخه داده) به ETag بدنه‌ای که برای همان نسخه ساخته شده است"""
+
+    def __init__(self, max_entries: int = ETAG_INDEX_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str, version: Version) -> Optional[str]:
+        etag = self._entries.get((key, version.parts))
+        if etag is not None:
+            self._entries.move_to_end((key, version.parts))
+        return etag
+
+    def set(self, key: str, version: Version, etag: str):
+        self._entries[(key, version.parts)] = etag
+        self._entries.move_to_end((key, version.parts))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+etag_index = ETagIndex()
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """مقایسه ضعیف If-None-Match (RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if header is None or etag is None:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def not_modified_since(request: Request, version: Version) -> bool:
+    """If-Modified-Since فقط وقتی If-None-Match نیامده و نسخه دقیق است بررسی می‌شود"""
+    header = request.headers.get("if-modified-since")
+    if header is None or "if-none-match" in request.headers:
+        return False
+    if not version.exact or version.last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    last_modified = version.last_modified
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # دقت هدرهای HTTP ثانیه است
+    return last_modified.replace(microsecond=0) <= since
+
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers={k: v for k, v in headers.items() if k in VALIDATOR_HEADERS})
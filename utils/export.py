@@ -0,0 +1,115 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.base_model import to_jalali_tehran
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv; charset=utf-8",
+}
+
+
+def export_columns(columns) -> list:
+    """نام ستون‌های خروجی؛ برای هر ستون زمانی یک ستون _fa (شمسی، وقت تهران) هم اضافه می‌شود"""
+    names = []
+    for column in columns:
+        names.append(column.key)
+        if column.key.endswith("_at"):
+            names.append(f"{column.key}_fa")
+    return names
+
+
+def _export_row(row) -> dict:
+    data = {}
+    for key, value in row._mapping.items():
+        if key.endswith("_at"):
+            data[key] = value.isoformat() if value else None
+            data[f"{key}_fa"] = to_jalali_tehran(value)
+        else:
+            data[key] = value
+    return data
+
+
+async def _stream_partitions(db: AsyncSession, stmt):
+    # Server-side cursor: ردیف‌ها به صورت دسته‌ای از دیتابیس خوانده می‌شوند و
+    # چون ستون‌ها (نه آبجکت ORM) انتخاب شده‌اند، چیزی در identity map نگه داشته نمی‌شود
+    result = await db.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    async for partition in result.partitions():
+        yield [_export_row(row) for row in partition]
+
+
+async def _ndjson_lines(partitions):
+    async for rows in partitions:
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+async def _csv_lines(partitions, fieldnames: list):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    async for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _lines(partitions, stmt, fmt: ExportFormat):
+    if fmt == ExportFormat.csv:
+        return _csv_lines(partitions, export_columns(stmt.selected_columns))
+    return _ndjson_lines(partitions)
+
+
+def export_filename(name: str, fmt: ExportFormat) -> str:
+    return f"{name}_{datetime.now().strftime('%Y%m%d')}.{fmt.value}"
+
+
+def export_response(db: AsyncSession, stmt, fmt: ExportFormat, filename: str) -> StreamingResponse:
+    """
+    پاسخ استریم برای خروجی کامل جدول (NDJSON یا CSV).
+    stmt باید یک select روی ستون‌ها باشد تا مصرف حافظه مستقل از اندازه جدول بماند.
+    """
+    return StreamingResponse(
+        _lines(_stream_partitions(db, stmt), stmt, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(filename, fmt)}"'},
+    )
+
+
+async def write_export(db: AsyncSession, stmt, fmt: ExportFormat, path: str, on_progress=None) -> int:
+    """
+    همان خروجی استریم، نوشته شده در فایل (برای کار پس‌زمینه)؛ تعداد ردیف‌ها برگردانده می‌شود.
+    on_progress بعد از هر دسته با تعداد ردیف‌های نوشته شده فراخوانی می‌شود.
+    """
+    written = 0
+
+    async def counted():
+        nonlocal written
+        async for rows in _stream_partitions(db, stmt):
+            yield rows
+            written += len(rows)
+            if on_progress is not None:
+                await on_progress(written)
+
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        async for text in _lines(counted(), stmt, fmt):
+            # نوشتن دیسک event loop را مسدود نکند
+            await asyncio.to_thread(file.write, text)
+    return written
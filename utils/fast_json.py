@@ -0,0 +1,145 @@
+"""
+سریالایزر سریع پاسخ‌ها (اختیاری، SERIALIZER=fast).
+
+به جای ساختن نمونه Pydantic برای هر ردیف (validate_python با from_attributes) و سپس dump،
+برای هر مدل پاسخ یک بار لیست فیلدها و مبدل‌هایشان ساخته می‌شود و مقادیر مستقیماً از آبجکت ORM
+(یا ردیف) خوانده و با orjson کدگذاری می‌شوند. خروجی بایت به بایت با مسیر Pydantic یکسان است.
+اعتبارسنجی انجام نمی‌شود، پس داده باید از قبل با schema سازگار باشد (مثل ردیف‌های دیتابیس).
+"""
+import json
+import os
+import types
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Callable, List, Optional, Union, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import PydanticUndefined
+
+try:
+    import orjson  # وابستگی اختیاری
+except ImportError:
+    orjson = None
+
+# pydantic: مسیر فعلی (validate + dump) | fast: مبدل‌های از پیش ساخته شده + orjson
+SERIALIZER = os.getenv("SERIALIZER", "pydantic")
+
+# فرمت تاریخ‌ها در نبود orjson دقیقاً مثل Pydantic ساخته می‌شود
+_TEMPORAL_ADAPTERS = {kind: TypeAdapter(kind) for kind in (datetime, date, time)}
+
+
+def _temporal_converter(kind) -> Optional[Callable]:
+    if orjson is not None:
+        # orjson با OPT_UTC_Z همان فرمت ISO پایدانتیک (Z برای UTC) را تولید می‌کند
+        return None
+    adapter = _TEMPORAL_ADAPTERS[kind]
+    return lambda value: adapter.dump_python(value, mode="json")
+
+
+def _strip_optional(annotation):
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def compile_type(annotation) -> Optional[Callable]:
+    """مبدل یک نوع فیلد؛ None یعنی مقدار بدون تغییر قابل کدگذاری است"""
+    annotation = _strip_optional(annotation)
+    origin = get_origin(annotation)
+    if origin in (list, List):
+        (item,) = get_args(annotation) or (None,)
+        convert = compile_type(item) if item is not None else None
+        if convert is None:
+            return list
+        return lambda values: [convert(value) for value in values]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return compile_model(annotation)
+    if annotation in _TEMPORAL_ADAPTERS:
+        return _temporal_converter(annotation)
+    return None
+
+
+class UnsupportedModel(Exception):
+    """مدل‌هایی که خروجی‌شان به تنظیمات خاص Pydantic وابسته است از مسیر عادی سریالایز می‌شوند"""
+
+
+@lru_cache(maxsize=512)
+def compile_model(model) -> Callable:
+    """تابع تبدیل یک آبجکت (ORM، ردیف یا مدل) به dict با ترتیب و نام فیلدهای مدل پاسخ"""
+    decorators = model.__pydantic_decorators__
+    if model.model_computed_fields or decorators.field_serializers or decorators.model_serializers:
+        raise UnsupportedModel(model)
+
+    plan = []
+    for name, info in model.model_fields.items():
+        if info.alias or info.serialization_alias or info.exclude:
+            raise UnsupportedModel(model)
+        plan.append((name, compile_type(info.annotation), info.default))
+
+    def encode(obj):
+        data = {}
+        for name, convert, default in plan:
+            value = getattr(obj, name) if default is PydanticUndefined else getattr(obj, name, default)
+            if convert is not None and value is not None:
+                value = convert(value)
+            data[name] = value
+        return data
+
+    return encode
+
+
+def adapter_target(adapter: TypeAdapter):
+    """(مدل، لیست است؟) از روی core_schema عمومی TypeAdapter"""
+    schema = adapter.core_schema
+    if schema["type"] == "definitions":
+        schema = schema["schema"]
+    many = schema["type"] == "list"
+    if many:
+        schema = schema["items_schema"]
+    if schema["type"] == "definitions":
+        schema = schema["schema"]
+    if schema["type"] != "model":
+        return None, many
+    return schema["cls"], many
+
+
+@lru_cache(maxsize=512)
+def fast_encoder(adapter: TypeAdapter) -> Optional[Callable]:
+    model, many = adapter_target(adapter)
+    if model is None:
+        return None
+    try:
+        encode = compile_model(model)
+    except UnsupportedModel:
+        return None
+    if many:
+        return lambda items: [encode(item) for item in items]
+    return encode
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_UTC_Z)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def pydantic_render(adapter: TypeAdapter, result):
+    data = adapter.dump_python(adapter.validate_python(result, from_attributes=True), mode="json")
+    return data, json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def fast_render(adapter: TypeAdapter, result):
+    encoder = fast_encoder(adapter)
+    if encoder is None:
+        return pydantic_render(adapter, result)
+    data = encoder(result)
+    return data, dumps(data)
+
+
+def serialize(adapter: TypeAdapter, result):
+    """(داده قابل JSON برای برچسب‌گذاری کش، بدنه بایتی پاسخ)"""
+    if SERIALIZER == "fast":
+        return fast_render(adapter, result)
+    return pydantic_render(adapter, result)
@@ -0,0 +1,109 @@
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import HTTPException, Query
+from pydantic import ConfigDict, TypeAdapter, create_model
+from sqlalchemy.orm import load_only, raiseload
+
+from utils.etag import RowVersion
+
+# پسوند فیلدهای تاریخ شمسی که از ستون زمانی هم‌نام محاسبه می‌شوند (created_at_fa ← created_at)
+JALALI_SUFFIX = "_fa"
+
+
+def split_names(value: Optional[str]) -> Optional[set]:
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class FieldSelection:
+    """
+    پارامترهای Sparse Fieldset:
+    fields=id,name فقط این فیلدها را برمی‌گرداند و include=parent روابط تو در تو را اضافه می‌کند.
+    بدون این پارامترها پاسخ کامل (مثل قبل) برگردانده می‌شود.
+    """
+
+    def __init__(
+            self,
+            fields: Optional[str] = Query(None, description="Comma separated response fields, e.g. id,name"),
+            include: Optional[str] = Query(None, description="Comma separated relations to embed, e.g. students"),
+    ):
+        self.fields = split_names(fields)
+        self.include = split_names(include)
+
+
+@lru_cache(maxsize=256)
+def projected_model(response_model, fields: frozenset):
+    """زیرمجموعه‌ای از مدل پاسخ فقط با فیلدهای انتخاب شده (برای هر ترکیب یک بار ساخته می‌شود)"""
+    definitions = {
+        name: (info.annotation, info) for name, info in response_model.model_fields.items() if name in fields
+    }
+    return create_model(
+        f"{response_model.__name__}Fields", __config__=ConfigDict(from_attributes=True), **definitions
+    )
+
+
+@lru_cache(maxsize=512)
+def projected_adapter(response_model, fields: Optional[frozenset], many: bool) -> TypeAdapter:
+    model = response_model if fields is None else projected_model(response_model, fields)
+    return TypeAdapter(List[model] if many else model)
+
+
+class Projection:
+    """
+    نگاشت فیلدهای انتخاب شده یک مدل پاسخ به گزینه‌های بارگذاری SQL:
+    ستون‌ها با load_only و روابط فقط در صورت درخواست (بقیه با raiseload) لود می‌شوند.
+    """
+
+    def __init__(self, model, response_model, relations: dict):
+        self.model = model
+        self.response_model = response_model
+        # نام فیلد رابطه در پاسخ -> تابع سازنده گزینه بارگذاری آن (مثل selectinload)؛
+        # گزینه‌ها هنگام اجرا ساخته می‌شوند تا mapperها در زمان import پیکربندی نشوند
+        self.relations = relations
+        self.columns = set(model.__table__.columns.keys())
+
+    def select(self, selection: FieldSelection) -> Optional[frozenset]:
+        """فیلدهای نهایی پاسخ؛ None یعنی پاسخ کامل"""
+        if selection.fields is None and selection.include is None:
+            return None
+
+        all_fields = set(self.response_model.model_fields)
+        if selection.fields is None:
+            selected = all_fields - set(self.relations)
+        else:
+            # id همیشه برگردانده می‌شود (برای کرسر صفحه‌بندی و برچسب‌های کش)
+            selected = selection.fields | {"id"}
+        selected |= selection.include or set()
+
+        unknown = selected - all_fields
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"unknown field(s): {', '.join(sorted(unknown))}")
+        return frozenset(selected)
+
+    def column_for(self, field: str) -> Optional[str]:
+        name = field[:-len(JALALI_SUFFIX)] if field.endswith(JALALI_SUFFIX) else field
+        return name if name in self.columns else None
+
+    def included(self, fields: Optional[frozenset]) -> list:
+        """روابطی که در پاسخ آمده‌اند"""
+        return [name for name in self.relations if fields is None or name in fields]
+
+    def options(self, fields: Optional[frozenset]) -> list:
+        if fields is None:
+            return [loader(getattr(self.model, name)) for name, loader in self.relations.items()]
+
+        columns = {"id"} | {self.column_for(field) for field in fields} - {None}
+        options = [load_only(*[getattr(self.model, name) for name in sorted(columns)])]
+        for name, loader in self.relations.items():
+            attribute = getattr(self.model, name)
+            options.append(loader(attribute) if name in fields else raiseload(attribute))
+        return options
+
+    def adapter(self, fields: Optional[frozenset], many: bool = False) -> TypeAdapter:
+        return projected_adapter(self.response_model, fields, many)
+
+    def version(self, fields: Optional[frozenset]) -> RowVersion:
+        """کوئری نسخه (برای ETag) روی همان ردیف‌ها و روابطی که پاسخ از آن‌ها ساخته می‌شود"""
+        return RowVersion(self.model, self.included(fields))
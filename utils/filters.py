@@ -0,0 +1,19 @@
+from typing import Optional
+
+
+class StatusFilter:
+    """
+    فیلترهای وضعیت مشترک (is_deleted / is_active) برای لیست و خروجی والدین و کلاس‌ها.
+    مقدار None یعنی بدون فیلتر.
+    """
+
+    def __init__(self, is_deleted: Optional[bool] = None, is_active: Optional[bool] = None):
+        self.is_deleted = is_deleted
+        self.is_active = is_active
+
+    def apply(self, stmt, model):
+        if self.is_deleted is not None:
+            stmt = stmt.where(model.is_deleted.is_(self.is_deleted))
+        if self.is_active is not None:
+            stmt = stmt.where(model.is_active.is_(self.is_active))
+        return stmt
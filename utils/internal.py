@@ -0,0 +1,123 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from Database.database import get_db, get_pool_stats, replica_router
+from Database.profiling import query_profiler
+from Middlewares.middlewares import http_metrics
+from utils.cache import response_cache
+from utils.auth import get_auth_stats
+from utils.rate_limit import admission_control
+from Stats.summary import stats_summary
+from Jobs.runner import job_runner
+from utils.config import env_float
+
+# بیشترین زمان بررسی اتصال دیتابیس در /readyz (ثانیه)
+HEALTH_DB_TIMEOUT = env_float("HEALTH_DB_TIMEOUT", 2.0)
+
+logger = logging.getLogger("school_api.health")
+
+# endpointهای داخلی برای مانیتورینگ (محافظت شده با احراز هویت در main.py)
+internal_router = APIRouter(prefix="/internal", tags=["internal"])
+
+# endpoint متریک‌های Prometheus (بدون احراز هویت، برای scrape)
+metrics_router = APIRouter(tags=["internal"])
+
+# بررسی سلامت برای Load Balancer و orchestrator (بدون احراز هویت و محدودیت نرخ)
+health_router = APIRouter(tags=["health"])
+
+
+@health_router.get("/healthz")
+async def healthz():
+    """Liveness: پروسه زنده است و event loop پاسخ می‌دهد (بدون وابستگی به دیتابیس)"""
+    return {"status": "ok"}
+
+
+@health_router.get("/readyz")
+async def readyz(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Readiness: startup (lifespan) تمام شده، shutdown شروع نشده و Primary به SELECT 1 پاسخ می‌دهد.
+    تا پیش از آماده شدن و در زمان خاموش شدن 503 برگردانده می‌شود تا ترافیک به پروسه فرستاده نشود.
+    """
+    checks = {"startup": "ok" if getattr(request.app.state, "ready", False) else "pending"}
+    try:
+        await asyncio.wait_for(db.execute(text("SELECT 1")), HEALTH_DB_TIMEOUT)
+        checks["database"] = "ok"
+    except Exception as exc:
+        # /readyz بدون احراز هویت است؛ متن خطای driver (میزبان، کاربر، دیتابیس) فقط در لاگ می‌آید
+        logger.warning("readiness database check failed: %s: %s", type(exc).__name__, exc)
+        checks["database"] = type(exc).__name__
+    # Replica خراب مانع آمادگی نیست (خواندن‌ها به Primary برمی‌گردند) و فقط گزارش می‌شود
+    replicas = replica_router.stats()
+    checks["replicas"] = f"{replicas['healthy']}/{replicas['replicas']} healthy"
+
+    ready = checks["startup"] == "ok" and checks["database"] == "ok"
+    return JSONResponse({"status": "ok" if ready else "unavailable", "checks": checks},
+                        status_code=200 if ready else 503)
+
+
+@internal_router.get("/db/pool")
+async def db_pool_stats():
+    return get_pool_stats()
+
+
+@internal_router.get("/db/replicas")
+async def db_replica_stats():
+    return replica_router.stats()
+
+
+@internal_router.get("/db/queries")
+async def db_query_stats():
+    return {**query_profiler.stats(), "recent_slow": list(query_profiler.recent_slow)}
+
+
+@internal_router.get("/cache")
+async def cache_stats():
+    return response_cache.stats()
+
+
+@internal_router.get("/stats")
+async def stats_summary_stats():
+    return stats_summary.stats()
+
+
+@internal_router.get("/auth")
+async def auth_stats():
+    return get_auth_stats()
+
+
+@internal_router.get("/rate-limit")
+async def rate_limit_stats():
+    return admission_control.stats()
+
+
+@internal_router.get("/jobs")
+async def jobs_stats():
+    return job_runner.stats()
+
+
+def render_gauges(section: str, stats: dict) -> str:
+    # مقادیر عددی آمار داخلی به صورت gauge با پیشوند school_api_<section>_ منتشر می‌شوند
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f"school_api_{section}_{key}"
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    body = http_metrics.render()
+    body += render_gauges("db_pool", get_pool_stats())
+    body += render_gauges("db_replicas", replica_router.stats())
+    body += render_gauges("db_queries", query_profiler.stats())
+    body += render_gauges("cache", response_cache.stats())
+    body += render_gauges("auth", get_auth_stats())
+    body += render_gauges("rate_limit", admission_control.stats())
+    body += render_gauges("stats_summary", stats_summary.stats())
+    body += render_gauges("jobs", job_runner.stats())
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
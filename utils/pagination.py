@@ -0,0 +1,67 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# کرسر صفحه بعد در این هدر برگردانده می‌شود تا بدنه پاسخ همچنان یک لیست ساده بماند
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+        if not isinstance(last_id, int):
+            raise ValueError
+        return last_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+class PageParams:
+    """
+    پارامترهای صفحه‌بندی Keyset بر اساس id (نزولی).
+    کلاینت‌های قدیمی بدون ارسال پارامتر، صفحه اول با اندازه پیش‌فرض را می‌گیرند.
+    """
+
+    def __init__(
+            self,
+            cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.after_id = decode_cursor(cursor) if cursor else None
+
+
+def page_query(stmt, id_column, page: PageParams):
+    """شرط id < cursor، مرتب‌سازی نزولی و LIMIT (با یک ردیف اضافه برای تشخیص صفحه بعد)"""
+    if page.after_id is not None:
+        stmt = stmt.where(id_column < page.after_id)
+    return stmt.order_by(id_column.desc()).limit(page.limit + 1)
+
+
+async def paginate(db: AsyncSession, stmt, id_column, page: PageParams, response: Response, scalars: bool = True):
+    """
+    اجرای کوئری با شرط id < cursor و LIMIT در خود دیتابیس.
+    یک ردیف اضافه خوانده می‌شود تا وجود صفحه بعد بدون COUNT مشخص شود.
+    با scalars=False ردیف‌ها (مثلاً نتایج GROUP BY با ستون id) برگردانده می‌شوند.
+    """
+    result = await db.execute(page_query(stmt, id_column, page))
+    items = result.scalars().all() if scalars else result.all()
+
+    if len(items) > page.limit:
+        items = items[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1].id)
+
+    return items
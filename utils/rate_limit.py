@@ -0,0 +1,276 @@
+"""
+کنترل پذیرش درخواست‌ها: محدودیت نرخ (Token Bucket) و سقف کارهای همزمان.
+
+هر کلاینت (sub توکن JWT همراه با IP) یا در مسیرهای عمومی هر IP یک سطل توکن دارد که با نرخ ثابت پر می‌شود؛
+هزینه هر درخواست به نوع مسیر بستگی دارد (لیست‌ها و عملیات گروهی گران‌تر و خروجی کامل از همه گران‌تر).
+با خالی بودن سطل پاسخ 429 و با رسیدن تعداد درخواست‌های در حال اجرای یک کلاینت به سقفش هم 429 برگردانده می‌شود.
+سقف سراسری کارهای همزمان (به طور پیش‌فرض به اندازه Pool دیتابیس) با یک صف محدود اعمال می‌شود؛
+اگر صف پر باشد یا انتظار طول بکشد پاسخ 503 برگردانده می‌شود تا صف‌ها زیر بار محدود بمانند.
+همه پاسخ‌های رد شده هدر Retry-After دارند.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from typing import Tuple
+
+from fastapi import Depends, HTTPException, Request
+
+from Database.database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+from Middlewares.middlewares import route_label
+from utils.auth import get_current_user_oauth2
+from utils.cache import REDIS_URL
+from utils.config import env_bool, env_float, env_int
+
+RATE_LIMIT_ENABLED = env_bool("RATE_LIMIT_ENABLED", True)
+# کلید محدودیت مسیرهای محافظت شده: user:<sub>:<ip>. تا وقتی همه کلاینت‌ها با یک حساب مشترک (admin)
+# وارد می‌شوند، کلید فقط بر اساس sub همه را در یک سطل و یک سقف همزمانی قرار می‌داد.
+# با حساب جدا برای هر کاربر می‌توان آن را false کرد تا یک کاربر از چند IP یک سطل داشته باشد.
+RATE_LIMIT_KEY_BY_IP = env_bool("RATE_LIMIT_KEY_BY_IP", True)
+# memory: سطل‌ها داخل هر پروسه | redis: سطل‌های مشترک بین workerها
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# نرخ پر شدن سطل (توکن در ثانیه) و ظرفیت آن (بیشترین Burst)
+RATE_LIMIT_RATE = env_float("RATE_LIMIT_RATE", 20.0)
+RATE_LIMIT_BURST = env_int("RATE_LIMIT_BURST", 100)
+# هزینه مسیرها بر حسب توکن؛ بقیه مسیرها هزینه 1 دارند
+RATE_LIMIT_LIST_COST = env_int("RATE_LIMIT_LIST_COST", 5)
+RATE_LIMIT_EXPORT_COST = env_int("RATE_LIMIT_EXPORT_COST", 20)
+# تعداد سطل‌های نگه داشته شده در بک‌اند حافظه (LRU)
+RATE_LIMIT_MAX_KEYS = env_int("RATE_LIMIT_MAX_KEYS", 100000)
+# بیشترین درخواست در حال اجرای هر کلاینت
+RATE_LIMIT_CLIENT_CONCURRENCY = env_int("RATE_LIMIT_CLIENT_CONCURRENCY", 10)
+# سقف درخواست‌های در حال اجرای هر پروسه، طول صف انتظار و بیشترین زمان انتظار در صف
+RATE_LIMIT_MAX_IN_FLIGHT = env_int("RATE_LIMIT_MAX_IN_FLIGHT", DB_POOL_SIZE + DB_MAX_OVERFLOW)
+RATE_LIMIT_MAX_QUEUE = env_int("RATE_LIMIT_MAX_QUEUE", 100)
+RATE_LIMIT_QUEUE_TIMEOUT = env_float("RATE_LIMIT_QUEUE_TIMEOUT", 5.0)
+# Retry-After پاسخ‌های 503 (ثانیه)
+RATE_LIMIT_BUSY_RETRY_AFTER = env_int("RATE_LIMIT_BUSY_RETRY_AFTER", 1)
+
+
+def route_cost(request: Request) -> int:
+    path = route_label(request.scope)
+    if path.endswith("/export"):
+        return RATE_LIMIT_EXPORT_COST
+    if "/batch" in path or (request.method == "GET" and "{" not in path):
+        return RATE_LIMIT_LIST_COST
+    return 1
+
+
+def client_ip(request: Request) -> str:
+    # پشت پروکسی، uvicorn با --proxy-headers آدرس واقعی را در request.client قرار می‌دهد
+    return request.client.host if request.client else "-"
+
+
+class MemoryRateLimitBackend:
+    """سطل‌های توکن داخل پروسه؛ سطل‌های قدیمی با LRU حذف می‌شوند (و دوباره پر شروع می‌شوند)"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    async def take(self, key: str, cost: int, rate: float, burst: int) -> Tuple[bool, float]:
+        """(پذیرفته شد؟، توکن‌های باقیمانده)"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, tokens
+
+    async def clear(self):
+        self._buckets.clear()
+
+
+# بررسی و برداشت توکن به صورت اتمیک روی سرور Redis؛ زمان از ساعت خود Redis خوانده می‌شود
+# تا ساعت workerهای مختلف روی نتیجه اثر نداشته باشد
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimitBackend:
+    """سطل‌های مشترک روی Redis (یا هر کلاینت سازگار با redis.asyncio)؛ سطل پر شده با TTL حذف می‌شود"""
+
+    def __init__(self, client, prefix: str = "school_api:rate:"):
+        self.client = client
+        self.prefix = prefix
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, cost: int, rate: float, burst: int) -> Tuple[bool, float]:
+        allowed, tokens = await self.script(keys=[self.prefix + key], args=[rate, burst, cost])
+        return bool(allowed), float(tokens)
+
+    async def clear(self):
+        keys = [k async for k in self.client.scan_iter(match=self.prefix + "*")]
+        if keys:
+            await self.client.delete(*keys)
+
+
+class AdmissionControl:
+    """
+    محدودیت نرخ هر کلاینت، سقف همزمانی هر کلاینت و سقف همزمانی سراسری (صف محدود) در هر پروسه.
+    شمارنده‌های همزمانی همیشه محلی هستند، چون منبع محدود (Pool اتصال‌ها) هم مال همین پروسه است.
+    """
+
+    def __init__(
+            self,
+            backend,
+            rate: float = RATE_LIMIT_RATE,
+            burst: int = RATE_LIMIT_BURST,
+            client_concurrency: int = RATE_LIMIT_CLIENT_CONCURRENCY,
+            max_in_flight: int = RATE_LIMIT_MAX_IN_FLIGHT,
+            max_queue: int = RATE_LIMIT_MAX_QUEUE,
+            queue_timeout: float = RATE_LIMIT_QUEUE_TIMEOUT,
+    ):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.client_concurrency = client_concurrency
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._clients = defaultdict(int)  # کلاینت -> درخواست‌های در حال اجرا
+        self.in_flight = 0
+        self.waiting = 0
+        self.allowed = 0
+        self.throttled = 0
+        self.client_rejections = 0
+        self.shed = 0
+
+    async def check_rate(self, identity: str, cost: int):
+        # هزینه بیشتر از ظرفیت هرگز پذیرفته نمی‌شد
+        cost = min(cost, self.burst)
+        allowed, tokens = await self.backend.take(identity, cost, self.rate, self.burst)
+        if not allowed:
+            self.throttled += 1
+            retry_after = max(1, math.ceil((cost - tokens) / self.rate))
+            raise HTTPException(status_code=429, detail="rate limit exceeded",
+                                headers={"Retry-After": str(retry_after)})
+
+    def _busy(self) -> HTTPException:
+        self.shed += 1
+        return HTTPException(status_code=503, detail="server busy",
+                             headers={"Retry-After": str(RATE_LIMIT_BUSY_RETRY_AFTER)})
+
+    async def _acquire_slot(self):
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                raise self._busy()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._busy()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+    @asynccontextmanager
+    async def slot(self, identity: str):
+        """یک جای اجرا برای کلاینت؛ تا پایان ارسال پاسخ (مثلاً استریم خروجی) نگه داشته می‌شود"""
+        if self._clients[identity] >= self.client_concurrency:
+            self.client_rejections += 1
+            raise HTTPException(status_code=429, detail="too many concurrent requests",
+                                headers={"Retry-After": str(RATE_LIMIT_BUSY_RETRY_AFTER)})
+        self._clients[identity] += 1
+        try:
+            await self._acquire_slot()
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                self._slots.release()
+        finally:
+            self._clients[identity] -= 1
+            if not self._clients[identity]:
+                del self._clients[identity]
+
+    @asynccontextmanager
+    async def admit(self, request: Request, identity: str):
+        await self.check_rate(identity, route_cost(request))
+        async with self.slot(identity):
+            self.allowed += 1
+            yield
+
+    async def reset(self):
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "backend": type(self.backend).__name__,
+            "rate": self.rate,
+            "burst": self.burst,
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+            "client_rejections": self.client_rejections,
+            "shed": self.shed,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "active_clients": len(self._clients),
+            "buckets": len(self.backend) if isinstance(self.backend, MemoryRateLimitBackend) else None,
+        }
+
+
+def build_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "redis":
+        import redis.asyncio as redis  # وابستگی اختیاری
+
+        return RedisRateLimitBackend(redis.from_url(REDIS_URL))
+    return MemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS)
+
+
+admission_control = AdmissionControl(build_backend())
+
+
+def user_identity(request: Request, user: str) -> str:
+    if RATE_LIMIT_KEY_BY_IP:
+        return f"user:{user}:{client_ip(request)}"
+    return f"user:{user}"
+
+
+async def admission(request: Request, user: str = Depends(get_current_user_oauth2)):
+    """Dependency مسیرهای محافظت شده؛ کلید محدودیت sub توکن (و IP) است (نتیجه احراز هویت از کش FastAPI)"""
+    if not RATE_LIMIT_ENABLED:
+        yield
+        return
+    async with admission_control.admit(request, user_identity(request, user)):
+        yield
+
+
+async def public_admission(request: Request):
+    """Dependency مسیرهای عمومی (مثل ورود)؛ کلید محدودیت IP کلاینت است"""
+    if not RATE_LIMIT_ENABLED:
+        yield
+        return
+    async with admission_control.admit(request, f"ip:{client_ip(request)}"):
+        yield
@@ -0,0 +1,114 @@
+"""
+نرمال‌سازی متن فارسی و سند جستجوی متنی (tsvector) برای /search.
+
+متن ذخیره شده و عبارت جستجو با یک قاعده یکسان نرمال می‌شوند: حروف کوچک، ی و ک عربی به فارسی،
+حذف اعراب و کشیده، نیم‌فاصله و علائم به فاصله و ارقام فارسی/عربی به لاتین.
+در PostgreSQL سند جستجو با array_to_tsvector از همین کلمات ساخته می‌شود (بدون parser متنی
+که رفتارش به locale دیتابیس وابسته است) و با ایندکس GIN جستجوی پیشوندی کلمات را پوشش می‌دهد.
+"""
+import re
+
+from sqlalchemy import Index, String
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+# جایگزینی کاراکترها؛ در SQL با replace تو در تو انجام می‌شود که روی هر encoding دیتابیس
+# (از جمله SQL_ASCII) بایت به بایت درست کار می‌کند
+CHAR_MAP = {
+    "ي": "ی", "ى": "ی", "ئ": "ی",
+    "ك": "ک",
+    "ة": "ه", "ۀ": "ه",
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ؤ": "و",
+    "\u200c": " ",  # نیم‌فاصله
+    "\u200d": "",  # اتصال دهنده
+    "\u0640": "",  # کشیده
+    "،": " ", "؛": " ", "؟": " ", "«": " ", "»": " ",
+    **{chr(code): "" for code in range(0x064B, 0x0653)},  # اعراب
+    "\u0670": "",  # الف کوچک
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},  # ارقام فارسی
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # ارقام عربی
+}
+_TRANSLATION = str.maketrans(CHAR_MAP)
+
+# جداکننده کلمات: فاصله‌ها و علائم ASCII (بازه‌های صریح تا نتیجه به locale وابسته نباشد)
+SEPARATORS = r"[\t\n\v\f\r !-/:-@\[-`{-~]+"
+_SEPARATORS_RE = re.compile(SEPARATORS)
+
+
+def normalize_text(value: str) -> str:
+    return _SEPARATORS_RE.sub(" ", value.lower().translate(_TRANSLATION)).strip()
+
+
+def search_tokens(value: str) -> list:
+    return normalize_text(value).split()
+
+
+def prefix_query(tokens) -> str:
+    """tsquery پیشوندی که همه کلمات باید در سند باشند؛ کلمات نرمال شده کوتیشن و بک‌اسلش ندارند"""
+    return " & ".join(f"'{token}':*" for token in tokens)
+
+
+def _sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def register_sqlite_functions(dbapi_connection, connection_record=None):
+    """ثبت normalize_text به عنوان تابع SQL در هر اتصال SQLite (برای رویداد connect)"""
+    dbapi_connection.create_function(
+        "normalize_text", 1, lambda value: None if value is None else normalize_text(value), deterministic=True
+    )
+
+
+class normalized(FunctionElement):
+    """نسخه SQL تابع normalize_text"""
+    type = String()
+    name = "normalized"
+    inherit_cache = True
+
+
+def _replace_chars(sql: str) -> str:
+    for source, target in CHAR_MAP.items():
+        sql = f"replace({sql}, {_sql_string(source)}, {_sql_string(target)})"
+    return sql
+
+
+def _concat(compiler, clauses, **kw) -> str:
+    # پرانتزگذاری از چپ، به همان شکلی که PostgreSQL عبارت ایندکس را ذخیره می‌کند (برای alembic check)
+    parts = [compiler.process(clause, **kw) for clause in clauses]
+    sql = parts[0]
+    for part in parts[1:]:
+        sql = f"({sql} || ' ') || {part}"
+    return sql
+
+
+@compiles(normalized)
+def _compile_normalized(element, compiler, **kw):
+    # SQLite: همان تابع پایتون (register_sqlite_functions)؛ replace تو در تو از عمق parser آن بیشتر است
+    return f"normalize_text({_concat(compiler, element.clauses, **kw)})"
+
+
+@compiles(normalized, "postgresql")
+def _compile_normalized_pg(element, compiler, **kw):
+    sql = _replace_chars(f"lower({_concat(compiler, element.clauses, **kw)})")
+    return f"regexp_replace({sql}, {_sql_string(SEPARATORS)}, ' ', 'g')"
+
+
+class search_document(FunctionElement):
+    """سند جستجو (فقط PostgreSQL): tsvector کلمات نرمال شده ستون‌ها"""
+    type = TSVECTOR()
+    name = "search_document"
+    inherit_cache = True
+
+
+@compiles(search_document, "postgresql")
+def _compile_search_document(element, compiler, **kw):
+    words = compiler.process(normalized(*element.clauses), **kw)
+    return f"array_to_tsvector(array_remove(string_to_array({words}, ' '), ''))"
+
+
+def search_index(model, *columns) -> Index:
+    """ایندکس GIN روی سند جستجو (در SQLite ساخته نمی‌شود و جستجو با LIKE انجام می‌شود)"""
+    index = Index(f"ix_{model.__tablename__}_search", search_document(*columns), postgresql_using="gin")
+    return index.ddl_if(dialect="postgresql")